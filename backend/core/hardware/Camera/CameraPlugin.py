@@ -1,4 +1,5 @@
 from core.hardware.Camera.USBCamera import USBCamera
+from core.library.EventBusBase import EventBus
 from core.library.PluginBase import PluginBase
 from core.utils.logger import Logger
 
@@ -6,16 +7,19 @@ from core.utils.logger import Logger
 class CameraPlugin(PluginBase):
     __camera = USBCamera()
     camera_view = None  # 摄像头视野
+    camera_ring = None  # 摄像头共享内存帧缓冲区
     plugin_name = 'camera'
+    priority = 2
 
     def __init__(self):
         super().__init__()
-        self.priority = 1
 
     @classmethod
     def start(cls):
         cls.__camera.parent = cls
         cls.__camera.open()
+        cls.update('camera_ring', cls.__camera.ring)
+        EventBus.bind_ring('camera_view', 'camera_ring')
         Logger.info(f'{cls.__camera.name} open.')
 
     @classmethod
@@ -1,10 +1,13 @@
-import queue
 import threading
+import time
 
 import cv2
+import numpy as np
 
 from core.library.CameraBase import Camera
 from core.library.EasyImportBase import ROOT
+from core.library.FrameRingBuffer import FrameRingBuffer
+from core.library.Tracer import Tracer
 
 
 class USBCamera(Camera):
@@ -16,39 +19,68 @@ class USBCamera(Camera):
         self.cap = None
         self.thread = None
         self.is_pause = False
-        self.img_queue = queue.Queue(maxsize=10)
+        self.ring = None  # 共享内存帧环形缓冲区
         self.parent = None
 
     def open(self):
         self.cap = cv2.VideoCapture(ROOT('video2.mp4'))
         # self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
         if self.cap.isOpened():
+            # 用第一帧确定缓冲区尺寸
+            ret, img = self.cap.read()
+            if not ret or img is None:
+                raise RuntimeError('No camera available.')
+            self.ring = FrameRingBuffer(img.shape, img.dtype, slots=4)
+            if self.ring.write(img) >= 0:
+                self.__publish()
             self.thread = threading.Thread(target=self.__camera_thread, daemon=False)
             self.thread.start()
         else:
             raise RuntimeError('No camera available.')
 
     def read(self):
-        return self.img_queue.get()
+        return None if self.ring is None else self.ring.latest()
 
     def close(self):
         self.is_pause = True
+        if self.thread is not None:
+            self.thread.join()
         self.cap.release()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
 
     def __camera_thread(self):
         while self.cap.isOpened():
             if self.is_pause:
                 break
-            ret, img = self.cap.read()
+            slot, buf = self.ring.acquire_write()
+            if slot is None:
+                # 所有槽位都被占用，丢弃本帧
+                self.cap.grab()
+                continue
+            # 直接解码到共享内存槽位中
+            start = time.time_ns()
+            ret, img = self.cap.read(buf)
             if ret and img is not None:
-                # img = cv2.resize(img, dsize=(1000, 600))
-                self.parent.update('camera_view', img)
-                if self.img_queue.full():
-                    self.img_queue.get()
-                self.img_queue.put(img)
+                if not np.shares_memory(img, buf):
+                    np.copyto(buf, img)
+                frame_id = self.ring.commit(slot)
+                Tracer.record('camera', start, time.time_ns(), frame_id)
+                self.__publish()
+                if self.parent:
+                    self.parent.tick()
             else:
+                self.ring.abort(slot)
                 break
             cv2.waitKey(100)
 
+    def __publish(self):
+        """
+        向总线发布最新帧的只读视图，不拷贝图像；视图不持有引用，读取方需通过EventBus.acquire_frame获取
+        """
+        if self.parent:
+            self.parent.update('camera_view', self.ring.latest())
+
     def load_config(self, file: str):
         pass
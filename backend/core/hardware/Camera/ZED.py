@@ -1,8 +1,11 @@
 import threading
+import time
 
 import numpy as np
 
 from core.library.CameraBase import Camera
+from core.library.FrameRingBuffer import FrameRingBuffer
+from core.library.Tracer import Tracer
 import pyzed.sl as sl
 import cv2
 from core.utils.logger import Logger
@@ -19,6 +22,7 @@ class ZED(Camera):
         self.__zed = sl.Camera()
         self.__init_params = sl.InitParameters()
         self.grab_image = None
+        self.ring = FrameRingBuffer((600, 1000, 3), np.uint8, slots=4)  # 共享内存帧环形缓冲区
         self.thread = None
         self.parent = None
         self.__r_gain = 131
@@ -43,24 +47,35 @@ class ZED(Camera):
             self.thread.start()
 
     def read(self):
-        pass
+        return self.ring.latest()
 
     def close(self):
         self.__zed.close()
+        self.ring.close()
+        self.ring.unlink()
         Logger.info("ZED closed.")
 
     def __camera_thread(self):
         image = sl.Mat()
         runtime_parameters = sl.RuntimeParameters()
         while True:
+            start = time.time_ns()
             if self.__zed.grab(runtime_parameters) == sl.ERROR_CODE.SUCCESS:
                 self.__zed.retrieve_image(image, sl.VIEW.RIGHT)
                 grab_image = cv2.cvtColor(src=image.get_data(), code=1)
                 if grab_image is not None:
-                    grab_image = cv2.resize(grab_image, dsize=(1000, 600))
                     if self.parent:
-                        self.parent.update('camera_view', grab_image)
+                        slot, buf = self.ring.acquire_write()
+                        if slot is None:
+                            continue
+                        # 缩放结果直接写入共享内存槽位
+                        cv2.resize(grab_image, dsize=(1000, 600), dst=buf)
+                        frame_id = self.ring.commit(slot)
+                        Tracer.record('camera', start, time.time_ns(), frame_id)
+                        # 视图不持有引用，读取方需通过EventBus.acquire_frame获取
+                        self.parent.update('camera_view', self.ring.view(slot))
                     else:
+                        grab_image = cv2.resize(grab_image, dsize=(1000, 600))
                         grab_image = self.__img_change(grab_image)
                         cv2.imshow("zed_view", grab_image)
                         cv2.waitKey(1)
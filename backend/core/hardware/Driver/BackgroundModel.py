@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+
+from core.hardware.Driver.PointFilter import voxel_encode
+from core.utils.logger import Logger
+
+"""
+雷达静态背景模型
+雷达站固定不动，场地中的墙体、地面与障碍物在每一帧中都落在同样的位置。预热阶段把点云按体素统计出现次数，
+出现次数足够的体素作为背景；之后每批点按体素编码在有序的背景编码中二分查找，整批分为静态点与动态点，
+只有动态点与按比例抽样的静态点投影到深度图。
+"""
+
+_AXIS_BITS = 21  # 每个坐标轴的体素编号占用的位数，与voxel_encode一致
+# 相邻6个体素的编码差
+_NEIGHBORS = np.array([0, 1, -1, 1 << _AXIS_BITS, -(1 << _AXIS_BITS), 1 << (2 * _AXIS_BITS),
+                       -(1 << (2 * _AXIS_BITS))], dtype=np.int64)
+
+
+class BackgroundModel(object):
+    """
+    体素占据栅格背景模型 \n
+    体素编号按每轴21位打包为一个int64编码，背景为有序的编码数组，分类为一次向量化的二分查找。
+    """
+
+    def __init__(self, voxel=0.1, warmup=5., min_hits=2, static_stride=10, dilate=True, path=""):
+        """
+        :param voxel: 体素边长(m)
+        :param warmup: 预热时长(s)，期间的点全部投影
+        :param min_hits: 体素在预热期间至少在多少批点中出现才作为背景
+        :param static_stride: 静态点的抽样间隔，每static_stride个静态点投影1个，为0时不投影静态点
+        :param dilate: 是否把背景向相邻6个体素扩展一格，吸收测距噪声
+        :param path: 背景文件路径，存在时直接加载，不存在时预热结束后保存，为空则不保存
+        """
+        self.voxel = float(voxel)
+        self.warmup = warmup
+        self.min_hits = min_hits
+        self.static_stride = static_stride
+        self.dilate = dilate
+        self.path = path
+        self.static_points = 0  # 预热结束后分为静态的点数
+        self.dynamic_points = 0  # 预热结束后分为动态的点数
+        self.__background = None  # 有序的背景体素编码
+        self.__hits = []  # 预热期间每批点的体素编码
+        self.__start = None
+        self.__static_seen = 0
+        if path and os.path.isfile(path):
+            self.load(path)
+
+    @property
+    def ready(self):
+        """
+        预热是否结束
+        """
+        return self.__background is not None
+
+    @property
+    def size(self):
+        """
+        背景体素数
+        """
+        return 0 if self.__background is None else len(self.__background)
+
+    def encode(self, xyz):
+        """
+        :param xyz: (n, 3)的坐标(单位：m)
+        :return: (n,)的int64体素编码
+        """
+        return voxel_encode(xyz, self.voxel)
+
+    def update(self, xyz, timestamp):
+        """
+        预热期间累计一批点，到达预热时长后生成背景 \n
+        :param xyz: (n, 3)的坐标(单位：m)
+        :param timestamp: 该批点的主机时间戳(s)
+        """
+        if self.ready:
+            return
+        if self.__start is None:
+            self.__start = timestamp
+        if len(xyz):
+            self.__hits.append(np.unique(self.encode(xyz)))
+        if timestamp - self.__start >= self.warmup:
+            self.__finish()
+
+    def __finish(self):
+        keys = np.concatenate(self.__hits) if self.__hits else np.zeros(0, dtype=np.int64)
+        self.__hits = []
+        keys, counts = np.unique(keys, return_counts=True)
+        background = keys[counts >= self.min_hits]
+        if self.dilate and len(background):
+            background = np.unique((background[:, None] + _NEIGHBORS).reshape(-1))
+        self.__background = background
+        Logger.info(f'Background model ready, {len(background)} voxels of {self.voxel}m')
+        if self.path:
+            self.save(self.path)
+
+    def classify(self, xyz):
+        """
+        :param xyz: (n, 3)的坐标(单位：m)
+        :return: (n,)的布尔数组，True为静态点；预热未结束时全部为False
+        """
+        if not self.size:
+            return np.zeros(len(xyz), dtype=bool)
+        keys = self.encode(xyz)
+        position = np.searchsorted(self.__background, keys)
+        position[position == len(self.__background)] = 0
+        return self.__background[position] == keys
+
+    def select(self, xyz, timestamp):
+        """
+        选出需要投影的点：动态点与抽样的静态点，预热期间累计并选出全部点 \n
+        :param xyz: (n, 3)的坐标(单位：m)
+        :param timestamp: 该批点的主机时间戳(s)
+        :return: (n,)的布尔掩码，预热期间为None
+        """
+        if not self.ready:
+            self.update(xyz, timestamp)
+            return None
+        static = self.classify(xyz)
+        keep = ~static
+        index = np.flatnonzero(static)
+        if self.static_stride and len(index):
+            # 抽样位置跨批连续，静态层均匀覆盖整个场地
+            keep[index[(-self.__static_seen) % self.static_stride::self.static_stride]] = True
+        self.__static_seen += len(index)
+        self.static_points += len(index)
+        self.dynamic_points += len(xyz) - len(index)
+        return keep
+
+    def reset(self):
+        """
+        丢弃背景，重新预热
+        """
+        self.__background = None
+        self.__hits = []
+        self.__start = None
+        self.__static_seen = 0
+        self.static_points = self.dynamic_points = 0
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, voxel=self.voxel, background=self.__background)
+
+    def load(self, path):
+        data = np.load(path)
+        if float(data['voxel']) != self.voxel:
+            Logger.warn(f'Background voxel size {float(data["voxel"])} in {path} differs from {self.voxel}, ignored')
+            return
+        self.__background = data['background'].astype(np.int64)
+        Logger.info(f'Background model loaded from {path}, {len(self.__background)} voxels')
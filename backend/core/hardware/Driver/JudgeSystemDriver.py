@@ -65,8 +65,12 @@ class JudgeSystemDriver(Singleton):
         """
         循环发送串口信息
         """
+        subscriber = EventBus.subscribe('bev_points')
         while True:
-            robots = EventBus.get('bev_points')['data']
+            item = subscriber.wait(timeout=1)
+            if item is None or item['data'] is None:
+                continue
+            robots = item['data']
             for k, _ in robots.items():
                 cls.bev_transmission(14, robots[k])
 
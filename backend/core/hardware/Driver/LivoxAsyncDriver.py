@@ -0,0 +1,538 @@
+import asyncio
+import os
+import socket
+import threading
+
+import numpy as np
+
+from core.hardware.Driver.LivoxCapture import CHANNEL_BROADCAST, CHANNEL_CMD_RECV, CHANNEL_CMD_SEND, CHANNEL_DATA, \
+    CaptureWriter
+from core.hardware.Driver.LivoxDecoder import LIVOX_DEVICE_TYPES
+from core.hardware.Driver.LivoxLidarDriver import LivoxLidarDriver, _LivoxPointCloudRecorder
+from core.hardware.Driver.LivoxProtocol import CMD_ABNORMAL, CMD_DISCONNECT, CMD_HEARTBEAT, CMD_QUERY, CMD_SAMPLING, \
+    FRAME_CMD, FRAME_MSG, build_frame, handshake_frame, parse_broadcast, parse_frame
+from core.library.EventBusBase import EventBus
+from core.utils.logger import Logger
+
+"""
+基于asyncio的Livox雷达驱动
+所有雷达的广播发现、指令应答、心跳与点云数据流都运行在同一个事件循环中，事件循环运行在一个后台线程里，
+对外提供与LivoxLidarDriver相同的同步接口。
+多个雷达时各自按配置文件lidars中的外参把点变换到相机坐标系，写入同一个合并点云存储并投影到同一个深度队列，
+所有雷达的数据都在事件循环线程中处理，合并存储与深度队列不会被并发写入。
+"""
+
+_LIDAR_PORT = 65000  # 雷达指令端口
+_BROADCAST_PORT = 55000  # 主机接收雷达广播的端口
+
+
+class _LivoxBroadcastProtocol(asyncio.DatagramProtocol):
+    """
+    雷达广播接收，记录发现的雷达，设备类型不在LIVOX_DEVICE_TYPES中的忽略
+    """
+
+    def __init__(self, capture=None):
+        self.devices = {}  # IP到(序列号, 设备类型)
+        self.ignored = set()  # 已忽略的不支持的雷达IP
+        self.found = asyncio.Event()
+        self.capture = capture
+
+    def datagram_received(self, data, addr):
+        if addr[1] != _LIDAR_PORT:
+            return
+        if self.capture is not None:
+            self.capture.write(CHANNEL_BROADCAST, data)
+        info = parse_broadcast(data)
+        if info is None or addr[0] in self.devices or addr[0] in self.ignored:
+            return
+        if info[1] not in LIVOX_DEVICE_TYPES:
+            self.ignored.add(addr[0])
+            Logger.warn(f"Ignore unsupported Livox device type {info[1]} w. serial #{info[0]} at IP: {addr[0]}")
+            return
+        self.devices[addr[0]] = (info[0], info[1])
+        self.found.set()
+
+
+class _LivoxCommandProtocol(asyncio.DatagramProtocol):
+    """
+    指令通道，按(指令集, 指令ID)把应答交给等待中的请求
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.transport = None
+        self.pending = {}  # (指令集, 指令ID)到等待应答的Future
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.device.capture(CHANNEL_CMD_RECV, data)
+        frame = parse_frame(data)
+        if frame is None:
+            Logger.danger(f"{self.device.ip} checksum error in command response")
+            return
+        frame_type, cmd_set, cmd_id, payload = frame
+        if frame_type == FRAME_MSG and cmd_set == 0 and cmd_id == CMD_ABNORMAL:
+            Logger.danger(f"{self.device.ip} is ABNORMAL STATUS MESSAGE RECEIVED")
+            return
+        future = self.pending.pop((cmd_set, cmd_id), None)
+        if future is not None and not future.done():
+            future.set_result(payload)
+
+    def error_received(self, exc):
+        Logger.warn(f"{self.device.ip} command socket error: {exc}")
+
+    async def request(self, frame, cmd_set, cmd_id, timeout, retries):
+        """
+        发送指令并等待应答 \n
+        :return: 应答的数据段，超时返回None
+        """
+        key = (cmd_set, cmd_id)
+        for _ in range(retries):
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = future
+            self.device.capture(CHANNEL_CMD_SEND, frame)
+            self.transport.sendto(frame, (self.device.ip, _LIDAR_PORT))
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                if self.pending.get(key) is future:
+                    del self.pending[key]
+        return None
+
+
+class _LivoxDataProtocol(asyncio.DatagramProtocol):
+    """
+    点云数据通道。\n
+    数据包按固定间隔写入预分配的缓冲区，一次事件循环迭代内到达的数据包在迭代结束后整批交给录制器，攒满一批时立即处理。
+    """
+
+    def __init__(self, device, packet_size=1500, batch=64, pool=4):
+        self.device = device
+        self.packet_size = packet_size
+        self.batch = batch
+        self.__views = [memoryview(bytearray(packet_size * batch)) for _ in range(pool)]
+        self.__sizes = [np.zeros(batch, dtype=np.int32) for _ in range(pool)]
+        self.__index = 0
+        self.__count = 0
+
+    def datagram_received(self, data, addr):
+        size = len(data)
+        if size > self.packet_size:
+            return
+        self.device.capture(CHANNEL_DATA, data)
+        offset = self.__count * self.packet_size
+        self.__views[self.__index][offset:offset + size] = data
+        self.__sizes[self.__index][self.__count] = size
+        self.__count += 1
+        if self.__count == 1:
+            asyncio.get_running_loop().call_soon(self.flush)
+        elif self.__count == self.batch:
+            self.flush()
+
+    def error_received(self, exc):
+        Logger.warn(f"{self.device.ip} data socket error: {exc}")
+
+    def flush(self):
+        count = self.__count
+        if not count:
+            return
+        view, sizes = self.__views[self.__index], self.__sizes[self.__index]
+        self.__index = (self.__index + 1) % len(self.__views)
+        self.__count = 0
+        self.device.on_batch(view, sizes[:count], count, self.packet_size)
+
+
+class _LivoxDevice(object):
+    """
+    单个Livox雷达的连接状态
+    """
+
+    def __init__(self, driver, ip, serial, device_type=6):
+        self.driver = driver
+        self.ip = ip
+        self.serial = serial
+        self.device_type = device_type  # 广播中的设备类型
+        self.name = LIVOX_DEVICE_TYPES[device_type].name if device_type in LIVOX_DEVICE_TYPES else 'Livox'
+        self.firmware = "UNKNOWN"
+        self.connected = False
+        self.recording = False
+        self.work_state = -1
+        self.recorder = None
+        self.point_store = None
+        self.__cmd = None
+        self.__data = None
+        self.__heartbeat = None
+        self.__start_time = None  # 录制开始时的设备时间戳(s)
+        self.__capturing = False  # 是否已过等待时间、开始解码
+
+    def capture(self, channel, data):
+        if self.driver.capture_writer is not None:
+            self.driver.capture_writer.write(channel, data)
+
+    async def request(self, frame, cmd_id, cmd_set=0):
+        return await self.__cmd.request(frame, cmd_set, cmd_id, self.driver.timeout, self.driver.retries)
+
+    async def connect(self, host_ip):
+        loop = asyncio.get_running_loop()
+        data_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        data_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        data_sock.bind((host_ip, 0))
+        _, self.__cmd = await loop.create_datagram_endpoint(lambda: _LivoxCommandProtocol(self),
+                                                            local_addr=(host_ip, 0))
+        data_transport, _ = await loop.create_datagram_endpoint(lambda: _LivoxDataProtocol(self), sock=data_sock)
+        self.__data = data_transport
+        data_port = data_sock.getsockname()[1]
+        cmd_port = self.__cmd.transport.get_extra_info('sockname')[1]
+        ack = await self.request(handshake_frame(host_ip, data_port, cmd_port), 1)
+        if ack is None or ack[0] != 0:
+            Logger.danger(f"FAILED to connect to {self.name} at IP: {self.ip}")
+            self.close()
+            return False
+        self.connected = True
+        self.__heartbeat = loop.create_task(self.heartbeat())
+        ack = await self.request(build_frame(FRAME_CMD, 0, CMD_QUERY), CMD_QUERY)
+        if ack is not None and ack[0] == 0 and len(ack) >= 5:
+            self.firmware = f'{ack[1]:02d}.{ack[2]:02d}.{ack[3]:02d}{ack[4]:02d}'
+        else:
+            Logger.danger(f"{self.ip} is FAILED to receive query results")
+        firmware_type = LivoxLidarDriver._SPECIAL_FIRMWARE_TYPE_DICT.get(self.firmware, 0)
+        if self.point_store is None:
+            self.point_store = LivoxLidarDriver.create_point_store()
+        self.recorder = _LivoxPointCloudRecorder(self.ip, self.driver.wait_seconds, self.driver.duration,
+                                                 firmware_type, self.driver.show_log, self.point_store,
+                                                 self.driver.get_extrinsic(self.ip))
+        if self.device_type in LIVOX_DEVICE_TYPES:
+            # 数据包头部不含设备类型，按广播中的设备类型确定点的采样间隔
+            self.recorder.point_interval = LIVOX_DEVICE_TYPES[self.device_type].interval
+        if self.driver.show_log:
+            Logger.info(f"Connected to {self.name} at IP: {self.ip}, F/W: {self.firmware}")
+        return True
+
+    async def heartbeat(self):
+        """
+        心跳，连续3次没有应答时报错，雷达工作状态为4（错误）时停止
+        """
+        missed = 0
+        frame = build_frame(FRAME_CMD, 0, CMD_HEARTBEAT)
+        while self.connected:
+            ack = await self.__cmd.request(frame, 0, CMD_HEARTBEAT, self.driver.heartbeat_interval, 1)
+            if ack is None or ack[0] != 0:
+                missed += 1
+                if missed == 3:
+                    Logger.danger(f"{self.ip} heartbeat lost")
+                continue
+            missed = 0
+            self.work_state = ack[1]
+            if self.work_state == 4:
+                Logger.danger(f"{self.ip} is HEARTBEAT ERROR MESSAGE RECEIVED")
+                break
+            await asyncio.sleep(self.driver.heartbeat_interval)
+
+    async def sampling(self, start):
+        ack = await self.request(build_frame(FRAME_CMD, 0, CMD_SAMPLING, bytes([1 if start else 0])), CMD_SAMPLING)
+        if ack is None or ack[0] != 0:
+            Logger.danger(f"{self.ip} FAILED to {'start' if start else 'stop'} data stream")
+            return False
+        return True
+
+    async def start_record(self):
+        if self.recording:
+            Logger.danger(f"{self.ip} data stream already started")
+            return False
+        self.__start_time = None
+        self.__capturing = False
+        self.recorder.duration = self.driver.duration
+        self.recorder.adjust_duration()
+        self.recorder.is_recording = True
+        self.recording = await self.sampling(True)
+        self.recorder.is_recording = self.recording
+        if self.recording and self.driver.show_log:
+            Logger.info(f"{self.ip} sent start data stream request")
+        return self.recording
+
+    async def stop_record(self, save=True):
+        if not self.recording:
+            return
+        self.recorder.is_recording = False
+        self.recording = False
+        if await self.sampling(False):
+            self.recorder.close()
+            if save:
+                Logger.info('Start to save to PCD')
+                await asyncio.get_running_loop().run_in_executor(None, self.recorder.save_to_pcd)
+                Logger.info('Stop to save to PCD')
+
+    def on_batch(self, view, sizes, count, stride):
+        recorder = self.recorder
+        if recorder is None:
+            return
+        if not recorder.is_recording:
+            recorder._parse_header(view[(count - 1) * stride:count * stride])
+            return
+        if not self.__capturing:
+            # 等待wait_seconds后开始解码
+            timestamp = recorder._parse_header(view[(count - 1) * stride:count * stride])
+            if self.__start_time is None:
+                self.__start_time = timestamp
+            elif recorder.version == 5 and timestamp - self.__start_time > recorder.wait_seconds:
+                self.__start_time = timestamp
+                self.__capturing = True
+                if self.driver.show_log:
+                    Logger.info(f"{self.ip} CAPTURING DATA")
+            return
+        timestamp = recorder.handle_batch(view, sizes, count, stride)
+        if timestamp - self.__start_time > recorder.duration:
+            recorder.is_recording = False
+            asyncio.get_running_loop().create_task(self.stop_record())
+
+    async def disconnect(self):
+        if not self.connected:
+            return
+        await self.stop_record(save=False)
+        self.connected = False
+        if self.__heartbeat is not None:
+            self.__heartbeat.cancel()
+        ack = await self.request(build_frame(FRAME_CMD, 0, CMD_DISCONNECT), CMD_DISCONNECT)
+        if ack is None or ack[0] != 0:
+            Logger.danger(f"{self.ip} FAILED to disconnect")
+        self.close()
+        if self.driver.show_log:
+            Logger.info(f"Disconnected from {self.name} sensor at IP: {self.ip}")
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+        for transport in (self.__data, self.__cmd.transport if self.__cmd is not None else None):
+            if transport is not None:
+                transport.close()
+
+
+class LivoxAsyncDriver(object):
+    """
+    基于asyncio的Livox雷达驱动类 \n
+    所有雷达共用一个事件循环线程，指令请求带超时与重试，不再为每个雷达创建心跳与录制线程，连接时多个雷达的握手并发进行。
+    接口与LivoxLidarDriver一致，多个雷达时可通过lidar_ip指定，不指定则作用于所有已连接的雷达。
+    """
+
+    def __init__(self, show_log=True, duration=20, wait_seconds=0.1, without_lidar=False, timeout=0.2, retries=3,
+                 heartbeat_interval=1.):
+        """
+        :param duration: 积分时间(s)
+        :param wait_seconds: 开始录制后等待的时间(s)
+        :param without_lidar: 是否使用点云文件
+        :param timeout: 单次指令等待应答的超时时间(s)
+        :param retries: 指令的最大发送次数
+        :param heartbeat_interval: 心跳间隔(s)
+        """
+        self.show_log = show_log
+        self.duration = duration
+        self.wait_seconds = wait_seconds
+        self.timeout = timeout
+        self.retries = retries
+        self.heartbeat_interval = heartbeat_interval
+        self.capture_writer = None  # 数据包抓取文件
+        self.devices = {}  # 雷达IP到连接状态
+        self._without_lidar = without_lidar
+        self._point_store = None
+        self.merged_store = None  # 多个雷达的合并点云存储，相机坐标系
+        self._ip = ""
+        self.__loop = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def __run(self, coro):
+        """
+        在事件循环线程中执行协程并等待结果
+        """
+        with self.__lock:
+            if self.__loop is None:
+                self.__loop = asyncio.new_event_loop()
+                self.__thread = threading.Thread(target=self.__loop.run_forever, daemon=True)
+                self.__thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+    @staticmethod
+    async def __gather(coros):
+        return await asyncio.gather(*coros)
+
+    def __select(self, lidar_ip):
+        if lidar_ip is None:
+            return [d for d in self.devices.values() if d.connected]
+        device = self.devices.get(lidar_ip)
+        if device is None or not device.connected:
+            Logger.danger(f"Not connected to Mid-70 sensor at IP: {lidar_ip}")
+            return []
+        return [device]
+
+    def capture(self, path):
+        """
+        把之后收发的所有数据包写入抓取文件，需在connect之前调用，disconnect时关闭文件 \n
+        :param path: 抓取文件路径
+        """
+        self.capture_writer = CaptureWriter(path)
+
+    def connect(self, ip="", count=1, search=1.):
+        """
+        :param ip: 主机IP，若不填则自动获取
+        :param count: 需要连接的雷达数量，发现足够数量后立即开始握手
+        :param search: 搜索雷达广播的最长时间(s)
+        :return: 连接成功的雷达数量
+        """
+        if not ip:
+            try:
+                ip = socket.gethostbyname(socket.gethostname())
+            except OSError:
+                ip = ""
+        if not ip:
+            Logger.danger(f"No lidar device available")
+            return 0
+        self._ip = ip
+        if self.show_log:
+            Logger.info(f"Using IP address:{ip}.")
+        return self.__run(self.__connect(ip, count, search))
+
+    async def __connect(self, host_ip, count, search):
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _LivoxBroadcastProtocol(self.capture_writer), local_addr=('0.0.0.0', _BROADCAST_PORT),
+            reuse_port=hasattr(socket, 'SO_REUSEPORT'))
+        try:
+            deadline = loop.time() + search
+            while len(protocol.devices) < count and loop.time() < deadline:
+                protocol.found.clear()
+                try:
+                    await asyncio.wait_for(protocol.found.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            transport.close()
+        if not protocol.devices:
+            Logger.danger(f"No lidar ip(s) available")
+            return 0
+        for lidar_ip, (serial, device_type) in protocol.devices.items():
+            if self.show_log:
+                Logger.info(f"Found {LIVOX_DEVICE_TYPES[device_type].name} w. serial #{serial} at IP: {lidar_ip}")
+            if lidar_ip not in self.devices:
+                self.devices[lidar_ip] = _LivoxDevice(self, lidar_ip, serial, device_type)
+        pending = [d for d in self.devices.values() if not d.connected][:count]
+        results = await asyncio.gather(*(d.connect(host_ip) for d in pending))
+        connected = [d for d in self.devices.values() if d.connected]
+        if len(connected) > 1:
+            if self.merged_store is None:
+                self.merged_store = LivoxLidarDriver.create_point_store()
+            for device in connected:
+                device.recorder.merged_store = self.merged_store
+        return sum(results)
+
+    def start_record(self, lidar_ip=None):
+        """
+        开启点云录制
+        """
+        for device in self.__select(lidar_ip):
+            self.__run(device.start_record())
+
+    def stop_record(self, lidar_ip=None):
+        """
+        关闭点云录制，并把点云存储中保留的点写入PCD文件
+        """
+        for device in self.__select(lidar_ip):
+            self.__run(device.stop_record())
+
+    def disconnect(self, lidar_ip=None):
+        """
+        关闭设备
+        """
+        devices = self.__select(lidar_ip)
+        if devices:
+            self.__run(self.__gather(d.disconnect() for d in devices))
+        if self.capture_writer is not None and not any(d.connected for d in self.devices.values()):
+            self.capture_writer.close()
+            Logger.info(f"Capture saved to {self.capture_writer.path}, {self.capture_writer.count} packets")
+            self.capture_writer = None
+
+    def save_point_cloud_to_pcd(self, path, lidar_ip=None):
+        """
+        开始把录制的点云流式保存到PCD文件，直到调用stop_point_cloud_to_pcd \n
+        :param path: PCD文件路径，多个雷达时文件名前加雷达IP
+        """
+        devices = self.__select(lidar_ip)
+        for device in devices:
+            directory, name = os.path.split(path)
+            device.recorder.saved_path = path if len(devices) == 1 else os.path.join(directory, f'{device.ip}_{name}')
+            device.recorder.is_saved = True
+
+    def stop_point_cloud_to_pcd(self, lidar_ip=None):
+        """
+        停止保存点云
+        """
+        for device in self.__select(lidar_ip):
+            device.recorder.is_saved = False
+
+    def get_point_store(self, lidar_ip=None):
+        """
+        获取雷达的点云存储，不指定雷达时返回第一个雷达的存储
+        """
+        device = self.devices.get(lidar_ip) if lidar_ip is not None else next(iter(self.devices.values()), None)
+        if device is None:
+            # 使用点云文件时没有雷达，点云写入驱动自身的存储
+            if self._point_store is None:
+                self._point_store = LivoxLidarDriver.create_point_store()
+            return self._point_store
+        if device.point_store is None:
+            device.point_store = LivoxLidarDriver.create_point_store()
+        return device.point_store
+
+    @staticmethod
+    def get_extrinsic(lidar_ip):
+        """
+        获取雷达相对左相机的外参，配置文件lidars中没有该雷达时使用lidar_extrinsic \n
+        :return: 4x4外参
+        """
+        lidars = EventBus.get('lidars')
+        for lidar in ([] if lidars is None else lidars['data']):
+            if lidar.get('ip') == lidar_ip and lidar.get('extrinsic') is not None:
+                return lidar['extrinsic']
+        if lidars is not None and len(lidars['data']) > 1:
+            Logger.warn(f"No extrinsic of {lidar_ip} in lidars, using lidar_extrinsic")
+        return EventBus.get('lidar_extrinsic')['data']
+
+    @staticmethod
+    def get_lidar_count():
+        """
+        配置文件lidars中的雷达数量，至少为1
+        """
+        lidars = EventBus.get('lidars')
+        return max(1, 0 if lidars is None else len(lidars['data']))
+
+    def get_merged_cloud(self, ms=None):
+        """
+        获取相机坐标系下所有雷达的合并点云，单个雷达时把该雷达的点变换到相机坐标系 \n
+        :param ms: 时间窗口(ms)，为空则读取全部保留的点
+        :return: (xyz, reflectivity, timestamp)
+        """
+        if self.merged_store is not None:
+            return self.merged_store.latest() if ms is None else self.merged_store.window(ms)
+        device = next((d for d in self.devices.values() if d.recorder is not None), None)
+        if device is None:
+            return np.zeros((0, 3), np.float32), np.zeros(0, np.uint8), np.zeros(0, np.uint64)
+        xyz, reflectivity, timestamp = device.point_store.latest() if ms is None else device.point_store.window(ms)
+        return device.recorder.to_camera(xyz), reflectivity, timestamp
+
+    def get_depth_image(self, ms=100):
+        """
+        把最近一段积分时间内所有雷达的合并点云一次投影为深度图 \n
+        :param ms: 积分时间(ms)
+        :return: (height, width)的深度图(单位：m)，没有点的像素为nan，未连接雷达时返回None
+        """
+        device = next((d for d in self.devices.values() if d.recorder is not None), None)
+        if device is None:
+            return None
+        return device.recorder.projector.render(self.get_merged_cloud(ms)[0])
+
+    def load_pcd_file(self):
+        recorder = _LivoxPointCloudRecorder(wait_seconds=0.1, point_store=self.get_point_store())
+        recorder.read_pcd(EventBus.get('read_pcd_path')['data'])
@@ -0,0 +1,169 @@
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+"""
+Livox雷达数据包抓取文件
+文件结构：魔数 | 数据包1 | 数据包2 | ... | 索引 | 尾部
+数据包按接收顺序直接拼接，索引为每个数据包的(接收时间戳, 通道, 长度, 偏移)，尾部记录索引的偏移与数据包数量。
+读取时内存映射整个文件，按索引取出数据包的视图。
+"""
+
+CAPTURE_MAGIC = b'ZLVXCAP1'
+# 通道
+CHANNEL_DATA = 0  # 点云数据
+CHANNEL_CMD_RECV = 1  # 雷达发来的指令应答与消息
+CHANNEL_CMD_SEND = 2  # 主机发出的指令
+CHANNEL_BROADCAST = 3  # 雷达广播
+CAPTURE_INDEX_DTYPE = np.dtype([
+    ('timestamp', '<u8'),  # 接收时刻(单位：ns)
+    ('channel', 'u1'),
+    ('length', '<u2'),
+    ('offset', '<u8')
+])
+_FOOTER = struct.Struct('<QQ8s')
+
+
+class CaptureWriter(object):
+    """
+    数据包抓取文件写入器，线程安全，可同时记录数据与指令套接字
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 抓取文件路径
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__file = open(path, 'wb')
+        self.__file.write(CAPTURE_MAGIC)
+        self.__offset = len(CAPTURE_MAGIC)
+        self.__index = []
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    @property
+    def count(self):
+        return len(self.__index)
+
+    def write(self, channel, data, timestamp=None):
+        """
+        :param channel: 通道，CHANNEL_*
+        :param data: 数据包
+        :param timestamp: 接收时刻(单位：ns)，为空则取当前时间
+        """
+        timestamp = time.time_ns() if timestamp is None else timestamp
+        with self.__lock:
+            if self.__file is None:
+                return
+            self.__file.write(data)
+            self.__index.append((timestamp, channel, len(data), self.__offset))
+            self.__offset += len(data)
+
+    def close(self):
+        with self.__lock:
+            if self.__file is None:
+                return
+            index = np.array(self.__index, dtype=CAPTURE_INDEX_DTYPE)
+            self.__file.write(index.tobytes())
+            self.__file.write(_FOOTER.pack(self.__offset, len(index), CAPTURE_MAGIC))
+            self.__file.close()
+            self.__file = None
+
+
+class CaptureReader(object):
+    """
+    数据包抓取文件读取器
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 抓取文件路径
+        """
+        self.path = path
+        self.__buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        index_offset, count, magic = _FOOTER.unpack(self.__buffer[-_FOOTER.size:].tobytes())
+        if magic != CAPTURE_MAGIC or self.__buffer[:len(CAPTURE_MAGIC)].tobytes() != CAPTURE_MAGIC:
+            raise ValueError(f'{path} is not a lidar capture file.')
+        self.index = np.frombuffer(self.__buffer, dtype=CAPTURE_INDEX_DTYPE, count=count, offset=index_offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        """
+        抓取时长(s)
+        """
+        if not len(self.index):
+            return 0.
+        return (int(self.index['timestamp'][-1]) - int(self.index['timestamp'][0])) / 1e9
+
+    def select(self, channel=None):
+        """
+        :param channel: 通道，为空则选择全部
+        :return: 该通道数据包的索引
+        """
+        if channel is None:
+            return self.index
+        return self.index[self.index['channel'] == channel]
+
+    def packet(self, entry):
+        """
+        :param entry: 索引中的一项
+        :return: 数据包的视图
+        """
+        offset = int(entry['offset'])
+        return memoryview(self.__buffer[offset:offset + int(entry['length'])])
+
+    def packets(self, channel=None):
+        """
+        按接收顺序产生(接收时刻(ns), 通道, 数据包)
+        """
+        for entry in self.select(channel):
+            yield int(entry['timestamp']), int(entry['channel']), self.packet(entry)
+
+
+class CaptureSocket(object):
+    """
+    套接字包装，收发的数据包在转交调用方的同时写入抓取文件，其余属性直接访问原套接字，可直接用于select
+    """
+
+    def __init__(self, sock, writer, channel):
+        """
+        :param sock: UDP套接字
+        :param writer: 抓取文件写入器
+        :param channel: 接收的数据包记录的通道，发出的数据包记录为CHANNEL_CMD_SEND
+        """
+        self.__sock = sock
+        self.__writer = writer
+        self.__channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self.__sock, name)
+
+    def fileno(self):
+        return self.__sock.fileno()
+
+    def sendto(self, data, address):
+        self.__writer.write(CHANNEL_CMD_SEND, data)
+        return self.__sock.sendto(data, address)
+
+    def recvfrom(self, size):
+        data, address = self.__sock.recvfrom(size)
+        self.__writer.write(self.__channel, data)
+        return data, address
+
+    def recv_into(self, buffer, size=0):
+        n = self.__sock.recv_into(buffer, size)
+        self.__writer.write(self.__channel, buffer[:n])
+        return n
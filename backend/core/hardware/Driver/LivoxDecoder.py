@@ -0,0 +1,330 @@
+import numpy as np
+
+"""
+Livox点云数据包解码
+数据包按协议定义为numpy结构化类型，整包（或整批数据包）通过np.frombuffer映射后一次性转换，不逐点解析。
+各数据类型按(协议版本, 数据类型)注册在LIVOX_DATA_TYPES中，新增类型只需注册一个转换函数。
+支持的雷达按广播中的设备类型注册在LIVOX_DEVICE_TYPES中。
+协议见：https://github.com/Livox-SDK/Livox-SDK/wiki/Livox-SDK-Communication-Protocol-Cn
+"""
+
+# 数据包头部，18字节
+LIVOX_HEADER_DTYPE = np.dtype([
+    ('version', 'u1'),
+    ('slot_id', 'u1'),
+    ('lidar_id', 'u1'),
+    ('reserved', 'u1'),
+    ('status_code', '<u4'),
+    ('timestamp_type', 'u1'),
+    ('data_type', 'u1'),
+    ('timestamp', 'V8')
+])
+# 直角坐标点（data_type为2），14字节，坐标单位为mm
+LIVOX_CARTESIAN_DTYPE = np.dtype([
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('z', '<i4'),
+    ('reflectivity', 'u1'),
+    ('tag', 'u1')
+])
+LIVOX_CARTESIAN_POINTS = 96  # Mid-70每个数据包的点数
+# Mid-70直角坐标数据包，1362字节
+LIVOX_CARTESIAN_PACKET_DTYPE = np.dtype([
+    ('header', LIVOX_HEADER_DTYPE),
+    ('points', LIVOX_CARTESIAN_DTYPE, (LIVOX_CARTESIAN_POINTS,))
+])
+
+
+# 各数据类型的点结构，坐标单位为mm，角度单位为0.01°
+LIVOX_RAW_CARTESIAN_DTYPE = np.dtype([('x', '<i4'), ('y', '<i4'), ('z', '<i4'), ('reflectivity', 'u1')])
+LIVOX_RAW_SPHERICAL_DTYPE = np.dtype([('depth', '<u4'), ('theta', '<u2'), ('phi', '<u2'), ('reflectivity', 'u1')])
+LIVOX_SPHERICAL_DTYPE = np.dtype([('depth', '<u4'), ('theta', '<u2'), ('phi', '<u2'), ('reflectivity', 'u1'),
+                                  ('tag', 'u1')])
+LIVOX_DUAL_CARTESIAN_DTYPE = np.dtype([('returns', LIVOX_CARTESIAN_DTYPE, (2,))])
+LIVOX_TRIPLE_CARTESIAN_DTYPE = np.dtype([('returns', LIVOX_CARTESIAN_DTYPE, (3,))])
+_RETURN_DTYPE = np.dtype([('depth', '<u4'), ('reflectivity', 'u1'), ('tag', 'u1')])
+LIVOX_DUAL_SPHERICAL_DTYPE = np.dtype([('theta', '<u2'), ('phi', '<u2'), ('returns', _RETURN_DTYPE, (2,))])
+LIVOX_TRIPLE_SPHERICAL_DTYPE = np.dtype([('theta', '<u2'), ('phi', '<u2'), ('returns', _RETURN_DTYPE, (3,))])
+LIVOX_IMU_DTYPE = np.dtype([('gyro', '<f4', (3,)), ('acc', '<f4', (3,))])
+
+
+class LivoxDataType(object):
+    """
+    数据类型解码表中的一项
+    """
+    __slots__ = ('version', 'data_type', 'name', 'point_dtype', 'groups', 'returns', 'interval', 'convert',
+                 'packet_size')
+
+    def __init__(self, version, data_type, name, point_dtype, groups, returns, interval, convert):
+        self.version = version
+        self.data_type = data_type
+        self.name = name
+        self.point_dtype = point_dtype
+        self.groups = groups  # 每个数据包的采样次数，多回波时每次采样有多个点
+        self.returns = returns  # 每次采样的回波数，IMU为0
+        self.interval = interval  # 相邻两次采样的时间间隔(单位：ns)
+        self.convert = convert  # (packets, groups)的点数组到(xyz, reflectivity, tag)的转换函数
+        self.packet_size = LIVOX_HEADER_DTYPE.itemsize + point_dtype.itemsize * groups
+
+    @property
+    def points(self):
+        """
+        每个数据包的点数
+        """
+        return self.groups * self.returns
+
+    def packet_dtype(self, stride=None):
+        """
+        按固定间隔存放的数据包类型，用于直接映射接收缓冲区 \n
+        :param stride: 相邻数据包的间隔字节数，为空则为连续存放
+        """
+        return np.dtype({'names': ['header', 'points'],
+                         'formats': [LIVOX_HEADER_DTYPE, (self.point_dtype, (self.groups,))],
+                         'offsets': [0, LIVOX_HEADER_DTYPE.itemsize],
+                         'itemsize': self.packet_size if stride is None else stride})
+
+
+# (协议版本, 数据类型)到解码方式的表
+LIVOX_DATA_TYPES = {}
+
+
+def register_data_type(version, data_type, name, point_dtype, groups, returns=1, interval=10000):
+    """
+    注册一种数据类型的解码函数，用作装饰器 \n
+    :param version: 数据包头部的协议版本
+    :param data_type: 数据包头部的数据类型
+    :param point_dtype: 每次采样的结构化类型
+    :param groups: 每个数据包的采样次数
+    :param returns: 每次采样的回波数
+    :param interval: 相邻两次采样的默认时间间隔(单位：ns)
+    """
+
+    def decorator(convert):
+        LIVOX_DATA_TYPES[(version, data_type)] = LivoxDataType(version, data_type, name, point_dtype, groups,
+                                                               returns, interval, convert)
+        return convert
+
+    return decorator
+
+
+class LivoxDeviceType(object):
+    """
+    支持的雷达表中的一项
+    """
+    __slots__ = ('device_type', 'name', 'interval')
+
+    def __init__(self, device_type, name, interval):
+        self.device_type = device_type
+        self.name = name
+        self.interval = interval  # 相邻两次采样的时间间隔(单位：ns)
+
+
+# 广播中的设备类型到雷达，Hub转发多个雷达的数据，不支持直接连接
+LIVOX_DEVICE_TYPES = {}
+
+
+def register_device_type(device_type, name, interval):
+    """
+    注册一种支持的雷达 \n
+    :param device_type: 广播中的设备类型
+    :param name: 雷达名称
+    :param interval: 相邻两次采样的时间间隔(单位：ns)，解码该雷达的数据包时代替数据类型的默认值
+    """
+    LIVOX_DEVICE_TYPES[device_type] = LivoxDeviceType(device_type, name, interval)
+
+
+# Mid-40、Mid-70每秒10万次采样，Tele-15、Horizon、Avia每秒24万次采样
+register_device_type(1, 'Mid-40', 10000)
+register_device_type(2, 'Tele-15', 4167)
+register_device_type(3, 'Horizon', 4167)
+register_device_type(6, 'Mid-70', 10000)
+register_device_type(7, 'Avia', 4167)
+
+
+def _cartesian(points):
+    """
+    :param points: 任意形状的直角坐标点数组，不展开结构化数组，避免复制整个数据包
+    :return: (n, 3)的float32(单位：m)
+    """
+    xyz = np.empty(points.shape + (3,), dtype=np.float32)
+    xyz[..., 0] = points['x']
+    xyz[..., 1] = points['y']
+    xyz[..., 2] = points['z']
+    xyz *= np.float32(0.001)
+    return xyz.reshape(-1, 3)
+
+
+def _spherical(depth, theta, phi):
+    """
+    整批把球坐标转换为直角坐标，theta为天顶角，phi为方位角，各参数形状相同或可广播 \n
+    :return: (n, 3)的float32(单位：m)
+    """
+    theta = theta.astype(np.float32) * np.float32(np.pi / 18000.)
+    phi = phi.astype(np.float32) * np.float32(np.pi / 18000.)
+    r = depth.astype(np.float32) * np.float32(0.001)
+    sin_theta = np.sin(theta) * r
+    xyz = np.empty(np.broadcast(sin_theta, phi).shape + (3,), dtype=np.float32)
+    xyz[..., 0] = sin_theta * np.cos(phi)
+    xyz[..., 1] = sin_theta * np.sin(phi)
+    xyz[..., 2] = np.cos(theta) * r
+    return xyz.reshape(-1, 3)
+
+
+def _fields(points, *names):
+    return tuple(points[name].flatten() for name in names)
+
+
+def _no_tag(points):
+    return np.zeros(points.size, dtype=np.uint8)
+
+
+@register_data_type(5, 0, 'cartesian', LIVOX_RAW_CARTESIAN_DTYPE, 100)
+def _convert_raw_cartesian(points):
+    return (_cartesian(points),) + _fields(points, 'reflectivity') + (_no_tag(points),)
+
+
+@register_data_type(5, 1, 'spherical', LIVOX_RAW_SPHERICAL_DTYPE, 100)
+def _convert_raw_spherical(points):
+    return ((_spherical(points['depth'], points['theta'], points['phi']),) + _fields(points, 'reflectivity') +
+            (_no_tag(points),))
+
+
+@register_data_type(5, 2, 'extend cartesian', LIVOX_CARTESIAN_DTYPE, LIVOX_CARTESIAN_POINTS)
+def _convert_cartesian(points):
+    return (_cartesian(points),) + _fields(points, 'reflectivity', 'tag')
+
+
+@register_data_type(5, 3, 'extend spherical', LIVOX_SPHERICAL_DTYPE, LIVOX_CARTESIAN_POINTS)
+def _convert_spherical(points):
+    return (_spherical(points['depth'], points['theta'], points['phi']),) + _fields(points, 'reflectivity', 'tag')
+
+
+@register_data_type(5, 4, 'dual extend cartesian', LIVOX_DUAL_CARTESIAN_DTYPE, 48, returns=2)
+@register_data_type(5, 7, 'triple extend cartesian', LIVOX_TRIPLE_CARTESIAN_DTYPE, 30, returns=3)
+def _convert_multi_cartesian(points):
+    # 同一次采样的各回波相邻排列
+    returns = points['returns']
+    return (_cartesian(returns),) + _fields(returns, 'reflectivity', 'tag')
+
+
+@register_data_type(5, 5, 'dual extend spherical', LIVOX_DUAL_SPHERICAL_DTYPE, 48, returns=2)
+@register_data_type(5, 8, 'triple extend spherical', LIVOX_TRIPLE_SPHERICAL_DTYPE, 30, returns=3)
+def _convert_multi_spherical(points):
+    returns = points['returns']
+    # 各回波共用采样的角度
+    xyz = _spherical(returns['depth'], points['theta'][..., None], points['phi'][..., None])
+    return (xyz,) + _fields(returns, 'reflectivity', 'tag')
+
+
+@register_data_type(5, 6, 'imu', LIVOX_IMU_DTYPE, 1, returns=0, interval=0)
+def _convert_imu(points):
+    return np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8)
+
+
+def header_timestamps(headers):
+    """
+    整批解析数据包头部的设备时间戳 \n
+    :param headers: LIVOX_HEADER_DTYPE数组
+    :return: (n,)的int64设备时间戳(单位：ns)，时间戳类型为UTC时只取小时内的时刻，与LivoxLidarDriver一致
+    """
+    raw = np.ascontiguousarray(headers['timestamp']).view(np.uint8).reshape(-1, 8)
+    timestamp = raw.view('<u8').reshape(-1).astype(np.int64)
+    utc = headers['timestamp_type'] == 3
+    if utc.any():
+        hour = raw[utc, 3].astype(np.int64)
+        microsecond = raw[utc, 4:8].copy().view('<u4').reshape(-1).astype(np.int64)
+        timestamp[utc] = hour * 3600000000000 + microsecond * 1000
+    return timestamp
+
+
+def decode_batch(buffer, count, stride, sizes=None, interval=None):
+    """
+    解码按固定间隔存放的多个数据包，数据包可以是不同的数据类型，按(协议版本, 数据类型)查表整批转换 \n
+    :param buffer: 缓冲区
+    :param count: 数据包数量
+    :param stride: 相邻数据包的间隔字节数
+    :param sizes: 各数据包的长度，长度与数据类型不符的数据包丢弃，为空则不检查
+    :param interval: 相邻两次采样的时间间隔(单位：ns)，为空则使用各数据类型的默认值（Mid-70的10μs），
+                     其他雷达应按LIVOX_DEVICE_TYPES传入
+    :return: (xyz, reflectivity, tag, timestamp, imu)，按接收顺序排列；timestamp为每个点的设备时间戳(单位：ns)；
+             imu为(timestamp, gyro, acc)，没有IMU数据包时为None
+    """
+    if count <= 0:
+        return (np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8),
+                np.zeros(0, dtype=np.int64), None)
+    headers = np.ndarray((count,), dtype=np.dtype({'names': ['header'], 'formats': [LIVOX_HEADER_DTYPE],
+                                                   'offsets': [0], 'itemsize': stride}),
+                         buffer=buffer)['header']
+    keys = headers['version'].astype(np.int32) << 8 | headers['data_type']
+    parts, imu = [], None
+    # 通常一批数据包都是同一种数据类型，不必查找所有的类型
+    for key in (keys[:1] if (keys == keys[0]).all() else np.unique(keys)):
+        entry = LIVOX_DATA_TYPES.get((int(key) >> 8, int(key) & 0xFF))
+        if entry is None:
+            continue
+        mask = keys == key
+        if sizes is not None:
+            mask &= np.asarray(sizes[:count]) == entry.packet_size
+        packets = np.ndarray((count,), dtype=entry.packet_dtype(stride), buffer=buffer)
+        if mask.all():
+            index = np.arange(count)
+        else:
+            index = np.flatnonzero(mask)
+            if not len(index):
+                continue
+            packets = packets[index]
+        timestamp = header_timestamps(packets['header'])
+        if not entry.returns:
+            imu = (timestamp, packets['points']['gyro'].reshape(-1, 3), packets['points']['acc'].reshape(-1, 3))
+            continue
+        xyz, reflectivity, tag = entry.convert(packets['points'])
+        # 每个点的时间戳为数据包时间戳加采样序号乘以采样间隔，同一次采样的各回波时间相同
+        step = entry.interval if interval is None else interval
+        offsets = np.repeat(np.arange(entry.groups, dtype=np.int64) * step, entry.returns)
+        timestamp = (timestamp[:, None] + offsets).reshape(-1)
+        parts.append((np.repeat(index, entry.points), xyz, reflectivity, tag, timestamp))
+    if not parts:
+        return (np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8),
+                np.zeros(0, dtype=np.int64), imu)
+    if len(parts) == 1:
+        return parts[0][1:] + (imu,)
+    # 多种数据类型混合时按数据包顺序重排
+    order = np.argsort(np.concatenate([p[0] for p in parts]), kind='stable')
+    return tuple(np.concatenate([p[i] for p in parts])[order] for i in range(1, 5)) + (imu,)
+
+
+def decode_cartesian(payload):
+    """
+    解码一个直角坐标数据包 \n
+    :param payload: 数据包(bytes、bytearray或memoryview)
+    :return: (xyz, reflectivity, tag)，xyz为(n, 3)的float32(单位：m)
+    """
+    points = np.frombuffer(payload, dtype=LIVOX_CARTESIAN_DTYPE, offset=LIVOX_HEADER_DTYPE.itemsize)
+    return _convert_cartesian(points)
+
+
+def packet_dtype(stride):
+    """
+    按固定间隔存放的直角坐标数据包类型，用于直接映射接收缓冲区 \n
+    :param stride: 相邻数据包的间隔字节数，不小于数据包大小
+    """
+    if stride == LIVOX_CARTESIAN_PACKET_DTYPE.itemsize:
+        return LIVOX_CARTESIAN_PACKET_DTYPE
+    return LIVOX_DATA_TYPES[(5, 2)].packet_dtype(stride)
+
+
+def decode_cartesian_batch(buffer, count, stride=None, mask=None):
+    """
+    解码按固定间隔存放的多个直角坐标数据包 \n
+    :param buffer: 缓冲区
+    :param count: 数据包数量
+    :param stride: 相邻数据包的间隔字节数，为空则为连续存放
+    :param mask: 有效数据包的布尔掩码，为空则全部有效
+    :return: (headers, xyz, reflectivity, tag)，xyz为(有效包数 * 96, 3)的float32(单位：m)
+    """
+    dtype = LIVOX_CARTESIAN_PACKET_DTYPE if stride is None else packet_dtype(stride)
+    packets = np.frombuffer(buffer, dtype=dtype, count=count)
+    if mask is not None:
+        packets = packets[mask]
+    xyz, reflectivity, tag = _convert_cartesian(packets['points'])
+    return packets['header'], xyz, reflectivity, tag
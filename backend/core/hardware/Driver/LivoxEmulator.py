@@ -0,0 +1,170 @@
+import select
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from core.hardware.Driver.LivoxCapture import CHANNEL_DATA, CaptureReader
+from core.hardware.Driver.LivoxDecoder import LIVOX_CARTESIAN_PACKET_DTYPE
+from core.hardware.Driver.LivoxProtocol import FRAME_ACK, FRAME_MSG, build_frame
+from core.utils.logger import Logger
+
+"""
+Livox Mid-70雷达模拟器
+在本机模拟雷达的广播、握手、心跳与点云数据流，点云来自抓取文件的回放或按固定种子生成的随机数据包，
+可在没有雷达的情况下完整运行LivoxLidarDriver的连接、接收、解码与投影流程。
+"""
+
+
+class LivoxEmulator(object):
+    """
+    Livox Mid-70雷达模拟器 \n
+    未连接时每0.5s向广播端口发送设备信息，收到握手后停止广播并应答查询、心跳、开始/停止采样与断开指令，
+    开始采样后按设定倍速向握手中的数据端口发送点云数据包。
+    """
+    FIRMWARE = bytes([10, 10, 0, 1])  # 驱动按固件10.10.0001识别为Mid-70
+    BROADCAST_CODE = b'0TFDG3U99001431\x00'
+
+    def __init__(self, path=None, speed=1., ip='127.0.0.1', loop=True, packet_rate=1000, seed=0):
+        """
+        :param path: 抓取文件路径，为空则发送随机生成的数据包
+        :param speed: 回放倍速，0为不等待、尽可能快地发送
+        :param ip: 模拟雷达的IP，驱动连接时使用同一IP作为主机IP
+        :param loop: 抓取文件发送完后是否从头循环
+        :param packet_rate: 随机数据包的发送频率(包/s)，Mid-70约为1000
+        :param seed: 随机数据包的种子
+        """
+        self.ip = ip
+        self.speed = speed
+        self.loop = loop
+        self.packet_rate = packet_rate
+        self.sent = 0  # 已发送的点云数据包数量
+        self.__packets, self.__times = self.__load(path, seed)
+        self.__socket = None
+        self.__host = None  # 握手中的主机数据地址
+        self.__connected = False
+        self.__sampling = False
+        self.__last_heartbeat = 0.
+        self.__started = False
+        self.__threads = []
+
+    def __load(self, path, seed):
+        if path is not None:
+            reader = CaptureReader(path)
+            index = reader.select(CHANNEL_DATA)
+            if not len(index):
+                raise ValueError(f'No data packet in capture file {path}.')
+            packets = [bytearray(reader.packet(entry)) for entry in index]
+            times = (index['timestamp'] - index['timestamp'][0]).astype(np.float64) / 1e9
+            Logger.info(f'Emulator loaded {len(packets)} data packets, {times[-1]:.1f}s from {path}')
+            return packets, times
+        rng = np.random.default_rng(seed)
+        packets = np.zeros(self.packet_rate, dtype=LIVOX_CARTESIAN_PACKET_DTYPE)
+        packets['header']['version'] = 5
+        packets['header']['data_type'] = 2
+        points = packets['points']
+        points['x'] = rng.integers(1000, 30000, points.shape)
+        points['y'] = rng.integers(-10000, 10000, points.shape)
+        points['z'] = rng.integers(-2000, 2000, points.shape)
+        points['reflectivity'] = rng.integers(0, 256, points.shape)
+        times = np.arange(self.packet_rate, dtype=np.float64) / self.packet_rate
+        return [bytearray(p.tobytes()) for p in packets], times
+
+    def start(self):
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__socket.bind((self.ip, 65000))
+        self.__started = True
+        self.__threads = [threading.Thread(target=self.__command_thread, daemon=True),
+                          threading.Thread(target=self.__data_thread, daemon=True)]
+        for thread in self.__threads:
+            thread.start()
+        Logger.info(f'Livox emulator started at {self.ip}, speed: {self.speed or "max"}')
+
+    def stop(self):
+        self.__started = False
+        for thread in self.__threads:
+            thread.join()
+        self.__socket.close()
+
+    def __command_thread(self):
+        last_broadcast = 0.
+        while self.__started:
+            now = time.time()
+            if not self.__connected and now - last_broadcast > 0.5:
+                data = self.BROADCAST_CODE + bytes([6]) + b'\x00\x00'
+                self.__socket.sendto(build_frame(FRAME_MSG, 0, 0, data), (self.ip, 55000))
+                last_broadcast = now
+            # 超过3s没有心跳视为主机断开
+            if self.__connected and now - self.__last_heartbeat > 3.:
+                Logger.warn('Emulator heartbeat timeout, disconnected.')
+                self.__connected = self.__sampling = False
+            if not select.select([self.__socket], [], [], 0.1)[0]:
+                continue
+            data, address = self.__socket.recvfrom(1024)
+            if len(data) < 15 or data[0] != 0xAA:
+                continue
+            self.__handle(data[9], data[10], data[11:-4], address)
+
+    def __handle(self, cmd_set, cmd_id, data, address):
+        if cmd_set != 0:
+            return
+        ack = None
+        if cmd_id == 1:
+            # 握手：主机IP、数据端口、指令端口
+            ip = socket.inet_ntoa(data[0:4])
+            data_port, _ = struct.unpack('<HH', data[4:8])
+            self.__host = (ip, data_port)
+            self.__connected = True
+            self.__last_heartbeat = time.time()
+            ack = b'\x00'
+        elif cmd_id == 2:
+            ack = b'\x00' + self.FIRMWARE
+        elif cmd_id == 3:
+            self.__last_heartbeat = time.time()
+            # 返回码、工作状态(1为正常)、功能信息、确认信息
+            ack = b'\x00' + bytes([1, 0]) + struct.pack('<I', 0)
+        elif cmd_id == 4:
+            self.__sampling = bool(data[0]) if len(data) else False
+            ack = b'\x00'
+        elif cmd_id == 6:
+            self.__connected = self.__sampling = False
+            ack = b'\x00'
+        if ack is not None:
+            self.__socket.sendto(build_frame(FRAME_ACK, 0, cmd_id, ack), address)
+
+    def __data_thread(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        packets, times = self.__packets, self.__times
+        # 循环时在两轮之间留一个平均间隔
+        period = times[-1] + (times[-1] / (len(times) - 1) if len(times) > 1 else 1. / self.packet_rate)
+        # 设备时间戳按回放进度改写为纳秒时间戳，循环回放时不会倒退
+        epoch = time.time()
+        i, base, origin = 0, 0., None
+        while self.__started:
+            if not self.__sampling:
+                origin = None
+                time.sleep(0.01)
+                continue
+            if origin is None:
+                origin = time.perf_counter() - (base + times[i]) / (self.speed or 1.)
+            if self.speed:
+                # 发送所有已到时刻的数据包，再等待下一个数据包的时刻
+                due = (time.perf_counter() - origin) * self.speed
+                if base + times[i] > due:
+                    time.sleep(min(0.005, (base + times[i] - due) / self.speed))
+                    continue
+            packet = packets[i]
+            packet[8] = 0
+            packet[10:18] = struct.pack('<Q', int((epoch + base + times[i]) * 1e9))
+            sock.sendto(packet, self.__host)
+            self.sent += 1
+            i += 1
+            if i == len(packets):
+                if not self.loop:
+                    self.__sampling = False
+                    Logger.info(f'Emulator replay finished, {self.sent} packets sent.')
+                i, base = 0, base + period
+        sock.close()
@@ -1,4 +1,5 @@
 import binascii
+import os
 import select
 import socket
 import struct
@@ -9,33 +10,22 @@ import crcmod
 import cv2
 import numpy as np
 
+from core.hardware.Driver.BackgroundModel import BackgroundModel
+from core.hardware.Driver.LivoxCapture import CHANNEL_BROADCAST, CHANNEL_CMD_RECV, CHANNEL_DATA, CaptureSocket, \
+    CaptureWriter
+from core.hardware.Driver.LivoxDecoder import decode_batch
+from core.hardware.Driver.LivoxProtocol import CMD_ABNORMAL, CMD_HEARTBEAT, FRAME_ACK, FRAME_MSG, parse_frame
+from core.hardware.Driver.PcdFile import PcdReader, PcdWriter, write_pcd
+from core.hardware.Driver.PointFilter import PointFilter
+from core.hardware.Driver.PointStore import PointStore
+from core.hardware.Driver.Projector import Projector
+from core.hardware.Driver.UdpReceiver import UdpBatchReceiver
 from core.library.EasyImportBase import ROOT
 from core.library.EventBusBase import EventBus
+from core.library.PluginManager import PluginManager
 from core.utils.logger import Logger
 
 
-class _LivoxLidarPointCloudObject(object):
-    """
-    Livox雷达点云格式基类
-    """
-    timestamps = []
-    timestamp_types = []
-    slot_ids = []
-    lidar_ids = []
-    returnNums = []
-
-
-class _LivoxMid70PointCloudType(_LivoxLidarPointCloudObject):
-    """
-    LivoxMid70雷达点云格式
-    """
-    x = []
-    y = []
-    z = []
-    intensities = []
-    tags = []
-
-
 class _LivoxLidarHeartbeatThread(object):
     """
     Livox雷达心跳维持线程
@@ -62,19 +52,19 @@ class _LivoxLidarHeartbeatThread(object):
                 self.transmit_socket.sendto(self.cmd, (self.ip, self.port))
                 if select.select([self.transmit_socket], [], [], 0.1)[0]:
                     binData, addr = self.transmit_socket.recvfrom(22)
-                    tempObj = LivoxLidarDriver()
-                    _, ack, cmd_set, cmd_id, ret_code_bin = tempObj.parse_resp(binData)
-                    if ack == "ACK (response)" and cmd_set == "General" and cmd_id == "3":
-                        ret_code = int.from_bytes(ret_code_bin[0], byteorder='little')
+                    frame = parse_frame(binData)
+                    if frame is None:
+                        if self.show_log:
+                            Logger.danger(f"{self.ip} is incorrect heartbeat response")
+                    elif frame[0] == FRAME_ACK and frame[1] == 0 and frame[2] == CMD_HEARTBEAT and len(frame[3]) >= 2:
+                        ret_code, self.work_state = frame[3][0], frame[3][1]
                         if ret_code != 0:
                             if self.show_log:
                                 Logger.danger(f"{self.ip} is incorrect heartbeat response")
-                        else:
-                            self.work_state = int.from_bytes(ret_code_bin[1], byteorder='little')
-                            if self.work_state == 4:
-                                Logger.danger(f"{self.ip} is HEARTBEAT ERROR MESSAGE RECEIVED")
-                                break
-                    elif ack == "MSG (message)" and cmd_set == "General" and cmd_id == "7":
+                        elif self.work_state == 4:
+                            Logger.danger(f"{self.ip} is HEARTBEAT ERROR MESSAGE RECEIVED")
+                            break
+                    elif frame[0] == FRAME_MSG and frame[1] == 0 and frame[2] == CMD_ABNORMAL:
                         Logger.danger(f"{self.ip} is ABNORMAL STATUS MESSAGE RECEIVED")
                         break
                     else:
@@ -92,21 +82,22 @@ class _LivoxLidarHeartbeatThread(object):
         self.idle_state = 9
 
 
-class _LivoxPointCloudRecordThread(object):
+class _LivoxPointCloudRecorder(object):
     """
-    Livox雷达点云录制线程
+    Livox雷达点云录制器，解析数据包、写入点云存储并投影为深度，由录制线程与异步驱动共用
     """
 
-    def __init__(self, lidar_ip=None, receive_socket=None, wait_seconds=0., duration=0., firmware_type=None,
-                 show_log=True, without_lidar=False):
+    def __init__(self, lidar_ip=None, wait_seconds=0., duration=0., firmware_type=None, show_log=True,
+                 point_store=None, extrinsic=None, merged_store=None):
+        """
+        :param extrinsic: 该雷达相对左相机的4x4外参，为空则使用配置文件的lidar_extrinsic
+        :param merged_store: 多个雷达共用的点云存储，点变换到相机坐标系后写入
+        """
         self.lidar_ip = lidar_ip
-        self.receive_socket = receive_socket
         self.wait_seconds = wait_seconds
         self.duration = duration
         self.firmware_type = firmware_type
         self.show_log = show_log
-        self.without_lidar = without_lidar
-        self.started = True
         self.is_recording = False
         self.is_saved = False
         self.dataType = -1
@@ -120,7 +111,13 @@ class _LivoxPointCloudRecordThread(object):
         self.pps_status = -1
         self.device_status = -1
         self.start_time = None
-        self.livox_mid70_point_cloud_array_object = None
+        self.point_store = point_store  # 点云存储，雷达坐标系
+        self.point_interval = None  # 相邻两次采样的时间间隔(单位：ns)，为空则使用解码表中的默认值
+        self.imu = None  # 最新一批IMU数据(timestamp, gyro, acc)
+        self.background = None  # 静态背景模型，为空则投影全部点
+        self.point_filter = None  # 投影前的点云筛选，为空则不筛选
+        self.merged_store = merged_store  # 合并点云存储，相机坐标系
+        self.last_timestamp = None  # 该雷达最新一个点的主机时间戳(单位：ns)
         self.depth_image = []  # 深度图，尺寸：w*h(单位：m)
         self.support_pcd_type = ['txt', 'pcd', 'pkl']
         self._width = 0  # 分辨率宽度
@@ -129,173 +126,123 @@ class _LivoxPointCloudRecordThread(object):
         self._tVec = None  # 雷达外参，相对左相机的平移向量
         self._cMat = None  # 相机内参
         self._cDif = None  # 相机畸变系数
-        self._extrinsic = None  # 雷达外参
+        self._extrinsic = extrinsic  # 雷达外参
+        self.projector = None  # 相机投影器
         self._device_extrinsic = None  # 设备外参
         self._saved_path = ""  # PCD存储路径
+        self._saved_format = "binary"  # PCD数据格式
+        self.saved_path = ""  # 流式保存的PCD文件路径
+        self._writer = None  # 流式保存的PCD写入器
 
         self._init()
 
-        if not self.without_lidar:
-            self.thread = threading.Thread(target=self.run, args=())
-            self.thread.daemon = True
-            self.thread.start()
-
     def _init(self):
         self._width = EventBus.get('image')['data']['width']
         self._height = EventBus.get('image')['data']['height']
-        self._extrinsic = np.array(EventBus.get('lidar_extrinsic')['data'], dtype=np.float64)
+        if self._extrinsic is None:
+            self._extrinsic = EventBus.get('lidar_extrinsic')['data']
+        self._extrinsic = np.array(self._extrinsic, dtype=np.float64)
         self._rVec = cv2.Rodrigues(self._extrinsic[:3, :3])[0]
         self._tVec = self._extrinsic[:3, 3]
+        # 整批变换到相机坐标系使用的float32旋转与平移
+        self._rotation = self._extrinsic[:3, :3].T.astype(np.float32)
+        self._translation = self._extrinsic[:3, 3].astype(np.float32)
         self._cMat = np.array(EventBus.get('camera_intrinsic_matrix')['data'], dtype=np.float64)
         self._cDif = np.array(EventBus.get('camera_dist')['data'], dtype=np.float64)
+        self.projector = Projector(self._cMat, self._cDif, [self._height, self._width])
         self._saved_path = EventBus.get('saved_point_cloud_path')['data']
+        saved_format = EventBus.get('saved_point_cloud_format')
+        if saved_format is not None:
+            self._saved_format = saved_format['data']
         self._device_extrinsic = EventBus.get('device_extrinsic')['data']
+        if self.point_store is None:
+            self.point_store = LivoxLidarDriver.create_point_store()
+        self.background = LivoxLidarDriver.create_background_model(self.lidar_ip)
+        self.point_filter = LivoxLidarDriver.create_point_filter(self._cMat, [self._height, self._width])
 
-    def run(self):
-        # 无雷达情况，读点云文件
-        if self.without_lidar:
-            self.read_pcd(EventBus.get('read_pcd_path')['data'])
-            return
-        breakByRecord = False
-        while True:
-            if self.started:
-                if select.select([self.receive_socket], [], [], 0)[0]:
-                    data_pc, addr = self.receive_socket.recvfrom(1500)
-                    self.version = int.from_bytes(data_pc[0:1], byteorder='little')
-                    self.dataType = int.from_bytes(data_pc[9:10], byteorder='little')
-                    timestamp_type = int.from_bytes(data_pc[8:9], byteorder='little')
-                    timestamp1 = self.get_time_stamp(data_pc[10:18], timestamp_type)
-                    self.update_status(data_pc[4:8])
-                    if self.is_recording:
-                        self.start_time = timestamp1
-                        breakByRecord = True
-                        break
-            else:
-                break
-        if breakByRecord:
-            if self.version == 5:
-                self.livox_mid70_point_cloud_array_object = _LivoxMid70PointCloudType()
-                timestamp2 = self.start_time
-                while True:
-                    if self.started:
-                        timeSinceStart = timestamp2 - self.start_time
-                        if timeSinceStart <= self.wait_seconds:
-                            if select.select([self.receive_socket], [], [], 0)[0]:
-                                data_pc, addr = self.receive_socket.recvfrom(1500)
-                                timestamp_type = int.from_bytes(data_pc[8:9], byteorder='little')
-                                timestamp2 = self.get_time_stamp(data_pc[10:18], timestamp_type)
-                                self.update_status(data_pc[4:8])
-                        else:
-                            self.start_time = timestamp2
-                            break
-                    else:
-                        break
-                if self.show_log:
-                    Logger.info(f"{self.lidar_ip} CAPTURING DATA")
-                # 126230400 一年的秒数
-                if self.duration != 126230400:
-                    if self.firmware_type == 1:
-                        self.duration += (0.001 * (self.duration / 2.0))
-                    elif self.firmware_type == 2:
-                        self.duration += (0.0005 * (self.duration / 2.0))
-                    elif self.firmware_type == 3:
-                        self.duration += (0.00055 * (self.duration / 2.0))
-                    elif self.firmware_type == 4:
-                        self.duration += (0.0005 * (self.duration / 2.0))
-                timestamp_sec = self.start_time
-
-                while True:
-                    if self.started:
-                        timeSinceStart = timestamp_sec - self.start_time
-                        if timeSinceStart <= self.duration:
-                            if select.select([self.receive_socket], [], [], 0)[0]:
-                                data_pc, addr = self.receive_socket.recvfrom(1500)
-                                """
-                                # version = int.from_bytes(data_pc[0:1], byteorder='little')
-                                # slot_id = int.from_bytes(data_pc[1:2], byteorder='little')
-                                # lidar_id = int.from_bytes(data_pc[2:3], byteorder='little')
-                                """
-                                self.update_status(data_pc[4:8])
-                                timestamp_type = int.from_bytes(data_pc[8:9], byteorder='little')
-                                timestamp_sec = self.get_time_stamp(data_pc[10:18], timestamp_type)
-                                bytePos = 18
-                                # Mid70 Device
-                                if self.firmware_type == 4:
-                                    if self.dataType == 2:
-                                        buffer = []
-                                        for i in range(0, 96):
-                                            returnNum = 1
-                                            # X coordinate
-                                            x = data_pc[bytePos:bytePos + 4]
-                                            bytePos += 4
-                                            # Y coordinate
-                                            y = data_pc[bytePos:bytePos + 4]
-                                            bytePos += 4
-                                            # Z coordinate
-                                            z = data_pc[bytePos:bytePos + 4]
-                                            bytePos += 4
-                                            # intensity
-                                            intensity = data_pc[bytePos:bytePos + 1]
-                                            bytePos += 1
-                                            # tags is no need for now
-                                            # tag = data_pc[bytePos:bytePos + 1]
-                                            bytePos += 1
-                                            zeroORtwo = i % 2
-                                            # timestamp
-                                            timestamp_sec += float(not zeroORtwo) * 0.00001
-                                            # return number
-                                            returnNum += zeroORtwo * 1
-                                            # 数据正则化
-                                            x = round(float(struct.unpack('<i', x)[0]) / 1000.0, 3)
-                                            y = round(float(struct.unpack('<i', y)[0]) / 1000.0, 3)
-                                            z = round(float(struct.unpack('<i', z)[0]) / 1000.0, 3)
-                                            intensity = str(float(int.from_bytes(intensity, byteorder='little')))
-                                            self.livox_mid70_point_cloud_array_object.x.append(x)
-                                            self.livox_mid70_point_cloud_array_object.y.append(y)
-                                            self.livox_mid70_point_cloud_array_object.z.append(z)
-                                            self.livox_mid70_point_cloud_array_object.intensities.append(intensity)
-                                            buffer.append([x, y, z, 1])
-                                        self.depth_image.append(self.xyz2uvd(buffer))
-                        else:
-                            self.started = False
-                            self.is_recording = False
-                            break
-                    else:
-                        break
+    def _parse_header(self, data_pc):
+        """
+        解析数据包头部，更新雷达状态 \n
+        :return: 设备时间戳(s)
+        """
+        self.version = data_pc[0]
+        self.dataType = data_pc[9]
+        self.update_status(data_pc[4:8])
+        return self.get_time_stamp(data_pc[10:18], data_pc[8])
 
-    def stop(self):
-        self.started = False
-        self.thread.join()
+    def adjust_duration(self):
+        """
+        按固件类型补偿录制时长
+        """
+        # 126230400 一年的秒数
+        if self.duration != 126230400:
+            if self.firmware_type == 1:
+                self.duration += (0.001 * (self.duration / 2.0))
+            elif self.firmware_type == 2:
+                self.duration += (0.0005 * (self.duration / 2.0))
+            elif self.firmware_type == 3:
+                self.duration += (0.00055 * (self.duration / 2.0))
+            elif self.firmware_type == 4:
+                self.duration += (0.0005 * (self.duration / 2.0))
+
+    def handle_batch(self, view, sizes, count, stride):
+        """
+        解码一批数据包，写入点云存储并投影 \n
+        :param view: 接收缓冲区
+        :param sizes: 各数据包长度
+        :param count: 数据包数量
+        :param stride: 缓冲区中相邻数据包的间隔
+        :return: 最后一个数据包的设备时间戳(s)
+        """
+        timestamp_sec = self._parse_header(view[(count - 1) * stride:count * stride])
+        host_timestamp = self._to_host_time(timestamp_sec, self.lidar_ip)
+        # 按(协议版本, 数据类型)整批解码，长度不符或未注册类型的数据包丢弃
+        xyz, reflectivity, _, timestamp, imu = decode_batch(view, count, stride, sizes, self.point_interval)
+        if imu is not None:
+            self.imu = imu
+        if len(xyz):
+            # 每个点的设备时间戳按最后一个数据包的时钟偏移换算为主机时间戳，
+            # 时钟偏移的估计更新时只限制为不早于该雷达自己的上一个点，多个雷达各自保留自己的时间戳
+            timestamp = (timestamp + (int(host_timestamp * 1e9) - int(timestamp_sec * 1e9))).astype(np.uint64)
+            if self.last_timestamp is not None:
+                timestamp = np.maximum(timestamp, self.last_timestamp)
+            self.last_timestamp = timestamp[-1]
+            self.point_store.push(xyz, reflectivity, timestamp)
+            self._stream_to_pcd(xyz, reflectivity, timestamp)
+            # 投影直接读取存储中的这批点
+            camera = self.to_camera(self.point_store.latest(len(xyz))[0])
+            if self.merged_store is not None:
+                self.merged_store.push(camera, reflectivity, timestamp)
+            self._project(camera, host_timestamp)
+        return timestamp_sec
+
+    def close(self):
+        """
+        关闭流式保存的PCD文件
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _stream_to_pcd(self, xyz, reflectivity, timestamp):
+        """
+        流式保存，is_saved期间把每批点追加到saved_path，is_saved取消后关闭文件
+        """
+        if self.is_saved:
+            if self._writer is None:
+                self._writer = PcdWriter(self.saved_path, self._saved_format)
+            self._writer.write(xyz, reflectivity, timestamp)
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
     def save_to_pcd(self):
-        # 写文件句柄
-        handle = open(f"{self._saved_path}/{time.strftime('%Y-%m-%d %H%M%S', time.localtime())}.pcd", 'a')
-        # 得到点云点数
-        point_num = len(self.livox_mid70_point_cloud_array_object.x)
-        # pcd头部
-        handle.write(
-            '# .PCD v0.7 - Point Cloud Data file format\n'
-            'VERSION 0.7\n'
-            'FIELDS x y z intensity\n'
-            'SIZE 4 4 4 4\n'
-            'TYPE F F F F\n'
-            'COUNT 1 1 1 1\n'
-            f'WIDTH {point_num}\n'
-            'HEIGHT 1\n'
-            'VIEWPOINT 0 0 0 1 0 0 0\n'
-            f'POINTS {point_num}\n'
-            'DATA ascii\n'
-        )
-        # 写入所有点
-        x = self.livox_mid70_point_cloud_array_object.x
-        y = self.livox_mid70_point_cloud_array_object.y
-        z = self.livox_mid70_point_cloud_array_object.z
-        intensities = self.livox_mid70_point_cloud_array_object.intensities
-        for i in range(point_num):
-            handle.write(
-                f'{str(x[i])} {str(y[i])} {str(z[i])} {intensities[i]}\n'
-            )
-        handle.close()
+        """
+        把点云存储中保留的点一次写入PCD文件
+        """
+        xyz, reflectivity, timestamp = self.point_store.latest()
+        path = f"{self._saved_path}/{time.strftime('%Y-%m-%d %H%M%S', time.localtime())}.pcd"
+        write_pcd(path, xyz, reflectivity, timestamp, self._saved_format)
 
     @staticmethod
     def get_time_stamp(data_pc, timestamp_type):
@@ -351,41 +298,89 @@ class _LivoxPointCloudRecordThread(object):
                     if self.firmware_status == 1:
                         Logger.danger(f"{self.lidar_ip} ERROR: ABNORMAL FIRMWARE")
 
-    def xyz2uvd(self, xyz):
+    @staticmethod
+    def _to_host_time(device_time, source=None):
+        """
+        把雷达设备时间戳换算为主机时间戳，未注册同步器时直接使用接收时刻
+        """
+        sync = EventBus.get('lidar_sync')
+        if sync is None or sync['data'] is None:
+            return time.time()
+        return sync['data'].to_host_time(device_time, source=source)
+
+    def to_camera(self, xyz):
+        """
+        把雷达坐标系的点整批变换到相机坐标系 \n
+        :param xyz: (n, 3)的雷达直角坐标
+        :return: (n, 3)的float32相机坐标
+        """
+        return np.asarray(xyz, dtype=np.float32) @ self._rotation + self._translation
+
+    @staticmethod
+    def _push_depth(data, timestamp, source=None):
+        """
+        深度数据入队，注册了同步器时先交给同步器按图像时刻推入深度队列 \n
+        :param source: 雷达标识，同步器等待所有雷达追上图像时刻
+        """
+        sync = EventBus.get('lidar_sync')
+        if sync is not None and sync['data'] is not None:
+            sync['data'].push_lidar(timestamp, data, source)
+        else:
+            EventBus.get('depth_queue')['data'].push(data)
+        # 只记录雷达插件的循环统计，接收线程不休眠，避免丢包
+        PluginManager.tick('lidar', sleep=False)
+
+    def xyz2uvd(self, xyz, timestamp=None):
         """
         功能函数，把雷达的直角坐标转换成像素深度图 \n
         :param xyz: 输入的雷达直角坐标，为每一帧(定义为经过wait_seconds的所有点云的[x, y, z])， 输入的类型为numpy.array
+        :param timestamp: 该批点云的主机时间戳(s)，为空则取当前时间
         """
-        depth = (self._extrinsic @ (np.concatenate([xyz, np.ones((xyz.shape[0], 1))], axis=1).transpose())).transpose()[:,
-              2]
-        point_2d = cv2.projectPoints(xyz, self._rVec, self._tVec, self._cMat, self._cDif)[0].reshape(-1, 2).astype(np.int)
-        # 判断投影点是否在图像内部
-        inside = np.logical_and(np.logical_and(point_2d[:, 0] >= 0, point_2d[:, 0] < self._width),
-                                np.logical_and(point_2d[:, 1] >= 0, point_2d[:, 1] < self._height))
-        point_2d = point_2d[inside]
-        depth = depth[inside]
-        EventBus.get('depth_queue')['data'].push([depth, point_2d])
+        self._project(self.to_camera(xyz), timestamp)
+
+    def _project(self, camera, timestamp=None):
+        """
+        把相机坐标系的点投影为像素深度并入队 \n
+        :param camera: (n, 3)的相机坐标
+        :param timestamp: 该批点云的主机时间戳(s)，为空则取当前时间
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.point_filter is not None:
+            # 视锥与场地范围裁剪、体素降采样
+            cam2world = EventBus.get('cam2world')
+            camera = camera[self.point_filter.select(camera, None if cam2world is None else cam2world['data'])]
+        if self.background is not None:
+            # 只投影动态点与抽样的静态点
+            keep = self.background.select(camera, timestamp)
+            if keep is not None:
+                camera = camera[keep]
+        depth, point_2d = self.projector.project(camera)
+        self._push_depth([depth, point_2d], timestamp, self.lidar_ip)
 
     def read_pcd(self, file: str):
         """
-        从文件中加载PCD，支持*.pkl、*.txt、*.pcd类型文件
+        从文件中加载PCD，支持*.pkl、*.txt、*.pcd类型文件 \n
+        txt与pcd文件惰性读取，有timestamp字段时每帧为wait_seconds内录制的点，否则每帧为read_pcd_points个点
         """
-        if '.' in file:
-            _, suffix = file.split('.')
+        suffix = os.path.splitext(file)[1][1:].lower()
+        if suffix:
             if suffix in self.support_pcd_type:
-                b = None
-                if suffix == 'txt':
-                    pass
-                elif suffix == 'pcd':
-                    pass
-                elif suffix == 'pkl':
-                    b = np.load(ROOT(file), allow_pickle=True)
-                frame = 0
-                total = len(b)
-                while frame < total:
-                    pcd = b[frame]
-                    self.xyz2uvd(np.array(pcd))
-                    frame += 1
+                # 录制文件可能不在资源目录中，存在的路径直接读取
+                path = file if os.path.isfile(file) else ROOT(file)
+                if suffix == 'pkl':
+                    b = np.load(path, allow_pickle=True)
+                    frames = ((np.asarray(pcd, dtype=np.float32)[:, :3], None) for pcd in b)
+                else:
+                    points = EventBus.get('read_pcd_points')
+                    reader = PcdReader(path)
+                    frames = ((xyz, reflectivity) for xyz, reflectivity, _ in
+                              reader.frames(points=10000 if points is None else points['data'],
+                                            ms=self.wait_seconds * 1000))
+                for pcd, reflectivity in frames:
+                    if reflectivity is None:
+                        reflectivity = np.zeros(len(pcd), dtype=np.uint8)
+                    self.point_store.push(pcd, reflectivity, time.time_ns())
+                    self.xyz2uvd(self.point_store.latest(len(pcd))[0])
                     time.sleep(self.wait_seconds)
             else:
                 Logger.danger(f'Only support file type in {self.support_pcd_type}, but found {suffix}.')
@@ -393,6 +388,71 @@ class _LivoxPointCloudRecordThread(object):
             Logger.danger(f'Wrong PCD file format. {file}')
 
 
+class _LivoxPointCloudRecordThread(_LivoxPointCloudRecorder):
+    """
+    Livox雷达点云录制线程
+    """
+
+    def __init__(self, lidar_ip=None, receive_socket=None, wait_seconds=0., duration=0., firmware_type=None,
+                 show_log=True, without_lidar=False, point_store=None):
+        self.receive_socket = receive_socket
+        self.without_lidar = without_lidar
+        self.started = True
+        super().__init__(lidar_ip, wait_seconds, duration, firmware_type, show_log, point_store)
+
+        if not self.without_lidar:
+            self.thread = threading.Thread(target=self.run, args=())
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        # 无雷达情况，读点云文件
+        if self.without_lidar:
+            self.read_pcd(EventBus.get('read_pcd_path')['data'])
+            return
+        receiver = UdpBatchReceiver(self.receive_socket, packet_size=1500, batch=64)
+        size = receiver.packet_size
+        # 等待开始录制，期间只更新雷达状态
+        while self.started and self.start_time is None:
+            view, sizes, count = receiver.receive()
+            if count:
+                timestamp1 = self._parse_header(view[(count - 1) * size:count * size])
+                if self.is_recording:
+                    self.start_time = timestamp1
+        if not self.started:
+            return
+        if self.version == 5:
+            timestamp2 = self.start_time
+            while self.started:
+                if timestamp2 - self.start_time <= self.wait_seconds:
+                    view, sizes, count = receiver.receive()
+                    if count:
+                        timestamp2 = self._parse_header(view[(count - 1) * size:count * size])
+                else:
+                    self.start_time = timestamp2
+                    break
+            if self.show_log:
+                Logger.info(f"{self.lidar_ip} CAPTURING DATA")
+            self.adjust_duration()
+            timestamp_sec = self.start_time
+
+            while self.started:
+                if timestamp_sec - self.start_time > self.duration:
+                    self.started = False
+                    self.is_recording = False
+                    break
+                # 一次唤醒取完已到达的数据包
+                view, sizes, count = receiver.receive()
+                if not count:
+                    continue
+                timestamp_sec = self.handle_batch(view, sizes, count, size)
+
+    def stop(self):
+        self.started = False
+        self.thread.join()
+        self.close()
+
+
 class LivoxLidarDriver(object):
     """
     Livox雷达驱动类 \n
@@ -445,12 +505,19 @@ class LivoxLidarDriver(object):
         self._heartbeat = None
         # 点云录制流
         self._record_stream = None
+        # 点云存储，首次录制时按配置创建，多次录制共用
+        self._point_store = None
+        # 数据包抓取文件
+        self._capture = None
 
     def _init_sockets(self):
         self._data_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self._cmd_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self._capture is not None:
+            self._data_socket = CaptureSocket(self._data_socket, self._capture, CHANNEL_DATA)
+            self._cmd_socket = CaptureSocket(self._cmd_socket, self._capture, CHANNEL_CMD_RECV)
         foundIPs, foundSerials, ipRangeCodes = self._search_livox_lidar()
         foundMatchIP = False
         for i in range(0, len(foundIPs)):
@@ -700,6 +767,8 @@ class LivoxLidarDriver(object):
         serverSock_INIT = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         serverSock_INIT.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         serverSock_INIT.bind(("0.0.0.0", self._lidar_port))
+        if self._capture is not None:
+            serverSock_INIT = CaptureSocket(serverSock_INIT, self._capture, CHANNEL_BROADCAST)
         foundDevice = select.select([serverSock_INIT], [], [], 1)[0]
         IPs = []
         Serials = []
@@ -837,7 +906,8 @@ class LivoxLidarDriver(object):
                     firmwareType = self._SPECIAL_FIRMWARE_TYPE_DICT[self._lidar_firmware]
                 self._record_stream = _LivoxPointCloudRecordThread(self._lidar_ip, self._data_socket,
                                                                    self._wait_seconds, self._duration,
-                                                                   firmwareType, self.show_log, self._without_lidar)
+                                                                   firmwareType, self.show_log, self._without_lidar,
+                                                                   self.get_point_store())
                 time.sleep(0.15)
                 self._record_stream.is_recording = True
                 self._wait_idle()
@@ -917,6 +987,10 @@ class LivoxLidarDriver(object):
                 self._heartbeat = None
                 self._data_socket.close()
                 self._cmd_socket.close()
+                if self._capture is not None:
+                    self._capture.close()
+                    Logger.info(f"Capture saved to {self._capture.path}, {self._capture.count} packets")
+                    self._capture = None
                 if self.show_log:
                     Logger.info(f"Disconnected from Mid-70 sensor at IP: {self._lidar_ip}")
             except RuntimeError:
@@ -943,7 +1017,7 @@ class LivoxLidarDriver(object):
 
     def save_point_cloud_to_pcd(self, path):
         """
-        保留录制的点云到PCD文件
+        开始把录制的点云流式保存到PCD文件，直到调用stop_point_cloud_to_pcd \n
         :param path: PCD文件路径
         """
         if self._record_stream:
@@ -963,11 +1037,74 @@ class LivoxLidarDriver(object):
         else:
             Logger.danger(f"{self._lidar_ip} is not start to record")
 
+    def capture(self, path):
+        """
+        把之后收发的所有数据包（广播、指令、点云数据）连同接收时刻写入抓取文件，需在connect之前调用，disconnect时关闭文件 \n
+        :param path: 抓取文件路径，可由LivoxEmulator回放
+        """
+        if self._is_connected:
+            Logger.danger(f"{self._lidar_ip} capture must be set before connect")
+            return
+        self._capture = CaptureWriter(path)
+
+    @staticmethod
+    def create_point_store():
+        """
+        按配置文件中的point_store创建点云存储
+        """
+        conf = EventBus.get('point_store')
+        return PointStore(**({} if conf is None else conf['data']))
+
+    @staticmethod
+    def create_background_model(lidar_ip=None):
+        """
+        按配置文件中的background_model创建静态背景模型，未配置或enable为false时返回None \n
+        :param lidar_ip: 雷达IP，背景文件名前加雷达IP，多个雷达各自保存
+        """
+        conf = EventBus.get('background_model')
+        if conf is None or not conf['data'].get('enable', True):
+            return None
+        conf = {k: v for k, v in conf['data'].items() if k != 'enable'}
+        if conf.get('path') and lidar_ip:
+            directory, name = os.path.split(conf['path'])
+            conf['path'] = os.path.join(directory, f'{lidar_ip}_{name}')
+        if not conf.get('path') or not os.path.isfile(conf['path']):
+            # 预热期间视野中的一切都会被学习为背景，场地上有机器人时它们会被当作静态点稀疏投影
+            Logger.warn(f"Background model {conf.get('path') or 'without path'} is not recorded, "
+                        f"it will be learned in the first {conf.get('warmup', 5.)}s, keep the field empty of robots")
+        return BackgroundModel(**conf)
+
+    @staticmethod
+    def create_point_filter(k, size):
+        """
+        按配置文件中的point_filter创建投影前的点云筛选，未配置或enable为false时返回None \n
+        :param k: 相机内参
+        :param size: 图像尺寸[height, width]
+        """
+        conf = EventBus.get('point_filter')
+        if conf is None or not conf['data'].get('enable', True):
+            return None
+        point_filter = PointFilter(**{k: v for k, v in conf['data'].items() if k != 'enable'})
+        point_filter.set_camera(k, size)
+        ground_size = EventBus.get('game_ground_size')
+        if ground_size is not None:
+            point_filter.set_field(ground_size['data'])
+        return point_filter
+
+    def get_point_store(self):
+        """
+        获取该雷达的点云存储，可通过window读取最近一段时间内的点
+        """
+        if self._point_store is None:
+            self._point_store = self.create_point_store()
+        return self._point_store
+
     def _xyz2uv(self):
         pass
 
     def load_pcd_file(self):
-        thread = _LivoxPointCloudRecordThread(without_lidar=self._without_lidar, wait_seconds=0.1)
+        thread = _LivoxPointCloudRecordThread(without_lidar=self._without_lidar, wait_seconds=0.1,
+                                              point_store=self.get_point_store())
         thread.run()
 
 # EventBus.start()
@@ -0,0 +1,77 @@
+import socket
+import struct
+
+import crcmod
+
+"""
+Livox雷达控制指令帧的封装与解析
+帧结构：SOF(0xAA) | 版本 | 长度 | 类型 | 序号 | CRC16 | 指令集 | 指令ID | 数据 | CRC32
+协议见：https://github.com/Livox-SDK/Livox-SDK/wiki/Livox-SDK-Communication-Protocol-Cn
+"""
+
+# 帧类型
+FRAME_CMD = 0
+FRAME_ACK = 1
+FRAME_MSG = 2
+# 通用指令集中的指令ID
+CMD_BROADCAST = 0
+CMD_HANDSHAKE = 1
+CMD_QUERY = 2
+CMD_HEARTBEAT = 3
+CMD_SAMPLING = 4
+CMD_DISCONNECT = 6
+CMD_ABNORMAL = 7
+
+_crc16 = crcmod.mkCrcFun(0x11021, rev=True, initCrc=0x4C49)
+_crc32 = crcmod.mkCrcFun(0x104C11DB7, rev=True, initCrc=0x564F580A, xorOut=0xFFFFFFFF)
+_HEAD = struct.Struct('<BBHBH')
+
+
+def build_frame(frame_type, cmd_set, cmd_id, data=b'', seq=0):
+    """
+    封装一帧 \n
+    :param frame_type: FRAME_CMD、FRAME_ACK或FRAME_MSG
+    :param cmd_set: 指令集，0为通用指令集，1为雷达指令集
+    :param cmd_id: 指令ID
+    :param data: 数据段
+    :param seq: 序号
+    """
+    head = _HEAD.pack(0xAA, 1, 11 + len(data) + 4, frame_type, seq)
+    body = head + struct.pack('<HBB', _crc16(head), cmd_set, cmd_id) + bytes(data)
+    return body + struct.pack('<I', _crc32(body))
+
+
+def parse_frame(data):
+    """
+    解析并校验一帧 \n
+    :return: (帧类型, 指令集, 指令ID, 数据段)，校验失败返回None
+    """
+    if len(data) < 15 or data[0] != 0xAA or data[1] != 1:
+        return None
+    length = data[2] | (data[3] << 8)
+    if length != len(data) or length > 1400:
+        return None
+    if _crc16(bytes(data[:7])) != (data[7] | (data[8] << 8)):
+        return None
+    if _crc32(bytes(data[:-4])) != struct.unpack('<I', bytes(data[-4:]))[0]:
+        return None
+    return data[4], data[9], data[10], bytes(data[11:-4])
+
+
+def handshake_frame(host_ip, data_port, cmd_port):
+    """
+    握手指令，通知雷达主机IP、点云数据端口与指令端口
+    """
+    return build_frame(FRAME_CMD, 0, CMD_HANDSHAKE, socket.inet_aton(host_ip) + struct.pack('<HH', data_port, cmd_port))
+
+
+def parse_broadcast(data):
+    """
+    解析雷达广播 \n
+    :return: (序列号, 设备类型, IP段编码)，不是广播返回None
+    """
+    frame = parse_frame(data)
+    if frame is None or frame[0] != FRAME_MSG or frame[1] != 0 or frame[2] != CMD_BROADCAST or len(frame[3]) < 17:
+        return None
+    code = frame[3][:16].decode('ascii', errors='replace')
+    return code[:-2], frame[3][16], int(code[14]) if code[14].isdigit() else 0
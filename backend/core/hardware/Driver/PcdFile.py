@@ -0,0 +1,347 @@
+import itertools
+import os
+import struct
+
+import numpy as np
+from numpy.lib import recfunctions
+
+from core.utils.logger import Logger
+
+try:
+    import lzf
+except ImportError:
+    lzf = None
+
+"""
+PCD点云文件读写
+格式见：https://pointclouds.org/documentation/tutorials/pcd_file_format.html
+"""
+
+PCD_DATA_TYPES = ['ascii', 'binary', 'binary_compressed']
+# 录制点云的字段，timestamp为主机时间戳(单位：ns)
+PCD_POINT_DTYPE = np.dtype([
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('intensity', 'u1'),
+    ('timestamp', '<u8')
+])
+_PCD_TYPES = {'f': 'F', 'u': 'U', 'i': 'I'}
+_NUMPY_TYPES = {'F': 'f', 'U': 'u', 'I': 'i'}
+_COUNT_WIDTH = 12  # 头部点数的固定宽度，流式写入结束后原地改写
+
+
+def _pcd_header(dtype, count, data):
+    names = dtype.names
+    width = str(count).zfill(_COUNT_WIDTH)
+    return ('# .PCD v0.7 - Point Cloud Data file format\n'
+            'VERSION 0.7\n'
+            f'FIELDS {" ".join(names)}\n'
+            f'SIZE {" ".join(str(dtype[n].itemsize) for n in names)}\n'
+            f'TYPE {" ".join(_PCD_TYPES[dtype[n].kind] for n in names)}\n'
+            f'COUNT {" ".join("1" for _ in names)}\n'
+            f'WIDTH {width}\n'
+            'HEIGHT 1\n'
+            'VIEWPOINT 0 0 0 1 0 0 0\n'
+            f'POINTS {width}\n'
+            f'DATA {data}\n').encode('ascii')
+
+
+def lzf_compress(data):
+    """
+    LZF压缩，未安装lzf时输出只含字面量的LZF数据流（可被任意LZF解压，但不减小体积） \n
+    :param data: bytes
+    """
+    if lzf is not None and len(data):
+        # 压缩后反而变大时lzf返回None
+        compressed = lzf.compress(data, len(data) + len(data) // 32 + 1)
+        if compressed is not None:
+            return compressed
+    src = np.frombuffer(data, dtype=np.uint8)
+    blocks, rest = divmod(len(src), 32)
+    out = np.empty(blocks * 33 + (rest + 1 if rest else 0), dtype=np.uint8)
+    full = out[:blocks * 33].reshape(blocks, 33)
+    full[:, 0] = 31
+    full[:, 1:] = src[:blocks * 32].reshape(blocks, 32)
+    if rest:
+        out[blocks * 33] = rest - 1
+        out[blocks * 33 + 1:] = src[blocks * 32:]
+    return out.tobytes()
+
+
+def lzf_decompress(data, size):
+    """
+    LZF解压，未安装lzf时逐个控制字节解析 \n
+    :param data: 压缩数据
+    :param size: 解压后的字节数
+    """
+    if lzf is not None:
+        return lzf.decompress(data, size)
+    out = bytearray()
+    i, n = 0, len(data)
+    while i < n:
+        ctrl = data[i]
+        i += 1
+        if ctrl < 32:
+            # 字面量，长度为ctrl + 1
+            out += data[i:i + ctrl + 1]
+            i += ctrl + 1
+            continue
+        length = ctrl >> 5
+        if length == 7:
+            length += data[i]
+            i += 1
+        length += 2
+        ref = len(out) - ((ctrl & 31) << 8) - data[i] - 1
+        i += 1
+        if ref + length <= len(out):
+            out += out[ref:ref + length]
+        else:
+            # 引用与输出重叠，逐字节复制
+            for k in range(length):
+                out.append(out[ref + k])
+    if len(out) != size:
+        raise ValueError(f'LZF data decompressed to {len(out)} bytes, expected {size}.')
+    return bytes(out)
+
+
+def to_points(xyz, reflectivity, timestamp):
+    """
+    把点云转换为PCD_POINT_DTYPE的结构化数组 \n
+    :param xyz: (n, 3)的坐标(单位：m)
+    :param reflectivity: (n,)的反射率
+    :param timestamp: 主机时间戳(单位：ns)，整数或(n,)的数组
+    """
+    points = np.empty(len(xyz), dtype=PCD_POINT_DTYPE)
+    points['x'] = xyz[:, 0]
+    points['y'] = xyz[:, 1]
+    points['z'] = xyz[:, 2]
+    points['intensity'] = reflectivity
+    points['timestamp'] = timestamp
+    return points
+
+
+class PcdWriter(object):
+    """
+    PCD文件写入器。\n
+    支持ascii、binary、binary_compressed三种格式，点以块为单位追加写入，可在录制过程中持续写入，关闭时改写头部的点数。
+    binary_compressed要求按字段连续存放后整体压缩，录制过程中先把点写入同名的.part临时文件，关闭时再压缩写出。
+    """
+
+    def __init__(self, path, data='binary'):
+        """
+        :param path: PCD文件路径
+        :param data: 数据格式，ascii、binary或binary_compressed
+        """
+        if data not in PCD_DATA_TYPES:
+            raise ValueError(f'Only support PCD data type in {PCD_DATA_TYPES}, but found {data}.')
+        if data == 'binary_compressed' and lzf is None:
+            Logger.warn('Package lzf is not installed, binary_compressed PCD is written without compression.')
+        self.path = path
+        self.data = data
+        self.count = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__file = open(path, 'wb')
+        self.__file.write(_pcd_header(PCD_POINT_DTYPE, 0, data))
+        self.__part = open(f'{path}.part', 'w+b') if data == 'binary_compressed' else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def write(self, xyz, reflectivity, timestamp):
+        """
+        追加一块点 \n
+        :param xyz: (n, 3)的坐标(单位：m)
+        :param reflectivity: (n,)的反射率
+        :param timestamp: 主机时间戳(单位：ns)，整数或(n,)的数组
+        """
+        points = to_points(xyz, reflectivity, timestamp)
+        if self.data == 'ascii':
+            np.savetxt(self.__file, points, fmt='%.3f %.3f %.3f %d %d')
+        elif self.data == 'binary':
+            self.__file.write(points.tobytes())
+        else:
+            self.__part.write(points.tobytes())
+        self.count += len(points)
+
+    def close(self):
+        if self.__file is None:
+            return
+        if self.__part is not None:
+            self.__part.seek(0)
+            points = np.fromfile(self.__part, dtype=PCD_POINT_DTYPE)
+            self.__part.close()
+            os.remove(f'{self.path}.part')
+            raw = b''.join(np.ascontiguousarray(points[name]).tobytes() for name in PCD_POINT_DTYPE.names)
+            compressed = lzf_compress(raw)
+            self.__file.write(struct.pack('<II', len(compressed), len(raw)))
+            self.__file.write(compressed)
+        self.__file.seek(0)
+        self.__file.write(_pcd_header(PCD_POINT_DTYPE, self.count, self.data))
+        self.__file.close()
+        self.__file = None
+
+
+def write_pcd(path, xyz, reflectivity, timestamp, data='binary'):
+    """
+    一次写入整个点云 \n
+    :param path: PCD文件路径
+    :param data: 数据格式，ascii、binary或binary_compressed
+    :return: 写入的点数
+    """
+    with PcdWriter(path, data) as writer:
+        writer.write(xyz, reflectivity, timestamp)
+    return writer.count
+
+
+class PcdReader(object):
+    """
+    PCD/TXT点云文件读取器。\n
+    binary格式的PCD通过内存映射读取，只有被访问的部分才会载入内存；ascii格式的PCD与以空白分隔的TXT（每行x y z [intensity] [timestamp]）
+    按块解析；binary_compressed需要整体解压。`frames`按时间窗口或固定点数惰性地产生帧，回放数GB的录制文件时内存占用只与块大小有关。
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 文件路径，*.pcd或*.txt
+        """
+        self.path = path
+        self.data = None  # PCD数据格式，TXT文件为ascii
+        self.dtype = None  # 单个点的结构化类型
+        self.count = 0  # 点数，ascii格式在读取前未知时为-1
+        self.__offset = 0  # 数据部分在文件中的偏移
+        if os.path.splitext(path)[1].lower() == '.txt':
+            self.__read_txt_header()
+        else:
+            self.__read_pcd_header()
+
+    @property
+    def fields(self):
+        return self.dtype.names
+
+    def __read_pcd_header(self):
+        header = {}
+        with open(self.path, 'rb') as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    raise ValueError(f'PCD file {self.path} has no DATA line.')
+                line = line.decode('ascii', errors='replace').strip()
+                if not line or line.startswith('#'):
+                    continue
+                key, _, value = line.partition(' ')
+                header[key.upper()] = value.split()
+                if key.upper() == 'DATA':
+                    break
+            self.__offset = f.tell()
+        names = header['FIELDS']
+        sizes = [int(v) for v in header['SIZE']]
+        types = header.get('TYPE', ['F'] * len(names))
+        counts = [int(v) for v in header.get('COUNT', ['1'] * len(names))]
+        self.dtype = np.dtype([(n, f'<{_NUMPY_TYPES[t.upper()]}{size}') if c == 1 else
+                               (n, f'<{_NUMPY_TYPES[t.upper()]}{size}', (c,))
+                               for n, size, t, c in zip(names, sizes, types, counts)])
+        self.count = int(header['POINTS'][0]) if 'POINTS' in header else \
+            int(header['WIDTH'][0]) * int(header.get('HEIGHT', ['1'])[0])
+        self.data = header['DATA'][0].lower()
+        if self.data not in PCD_DATA_TYPES:
+            raise ValueError(f'Only support PCD data type in {PCD_DATA_TYPES}, but found {self.data}.')
+
+    def __read_txt_header(self):
+        with open(self.path, 'r') as f:
+            line = f.readline()
+            while line and (not line.strip() or line.startswith('#')):
+                line = f.readline()
+        columns = len(line.split())
+        if columns < 3:
+            raise ValueError(f'TXT point cloud needs at least x y z per line, but found {columns} columns.')
+        names = ['x', 'y', 'z', 'intensity', 'timestamp'][:min(columns, 5)]
+        self.dtype = np.dtype([(n, '<f4') if n != 'timestamp' else (n, '<u8') for n in names])
+        self.data = 'ascii'
+        self.count = -1
+
+    def chunks(self, size=1 << 20):
+        """
+        按块读取原始点 \n
+        :param size: 每块的点数
+        :return: 结构化数组的生成器，binary格式为内存映射的视图
+        """
+        if self.data == 'binary':
+            points = np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.__offset, shape=(self.count,))
+            for i in range(0, self.count, size):
+                yield points[i:i + size]
+        elif self.data == 'binary_compressed':
+            yield self.__read_compressed()
+        else:
+            with open(self.path, 'r') as f:
+                f.seek(self.__offset)
+                while True:
+                    lines = list(itertools.islice(f, size))
+                    if not lines:
+                        break
+                    points = np.loadtxt(lines, dtype=self.dtype, comments='#', ndmin=1)
+                    yield points
+
+    def __read_compressed(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.__offset)
+            compressed_size, size = struct.unpack('<II', f.read(8))
+            raw = lzf_decompress(f.read(compressed_size), size)
+        points = np.empty(self.count, dtype=self.dtype)
+        offset = 0
+        for name in self.dtype.names:
+            field = self.dtype[name]
+            points[name] = np.frombuffer(raw, dtype=field, count=self.count, offset=offset)
+            offset += field.itemsize * self.count
+        return points
+
+    def frames(self, points=None, ms=None, chunk=1 << 20):
+        """
+        惰性地产生帧 \n
+        :param points: 每帧的点数
+        :param ms: 每帧的时间窗口(ms)，按timestamp字段划分，文件没有timestamp字段时改为按points划分
+        :param chunk: 每次读取的点数
+        :return: (xyz, reflectivity, timestamp)的生成器，xyz为(n, 3)的float32，没有对应字段时reflectivity为0、timestamp为None
+        """
+        if ms is not None and ms <= 0:
+            raise ValueError(f'Frame window must be positive, but got {ms} ms.')
+        if points is not None and points <= 0:
+            raise ValueError(f'Frame size must be positive, but got {points} points.')
+        by_time = ms is not None and 'timestamp' in self.dtype.names
+        if not by_time and points is None:
+            raise ValueError('Frame size is needed when the file has no timestamp field.')
+        rest = None
+        for block in self.chunks(chunk):
+            if rest is not None and len(rest):
+                block = np.concatenate([rest, block])
+            if by_time:
+                timestamp = block['timestamp']
+                if not len(timestamp):
+                    continue
+                # 以第一个点的时刻为起点，按窗口切分，最后一个窗口可能不完整，留到下一块
+                edges = np.arange(int(timestamp[0]), int(timestamp[-1]) + 1, max(int(ms * 1e6), 1), dtype=np.uint64)
+                bounds = np.searchsorted(timestamp, edges[1:], side='left')
+            else:
+                bounds = np.arange(points, len(block) + 1, points)
+            start = 0
+            for end in bounds:
+                if end > start:
+                    yield self.__split(block[start:end])
+                start = end
+            rest = block[start:]
+        if rest is not None and len(rest):
+            yield self.__split(rest)
+
+    def __split(self, frame):
+        xyz = recfunctions.structured_to_unstructured(frame[['x', 'y', 'z']], dtype=np.float32)
+        names = self.dtype.names
+        if 'intensity' in names:
+            reflectivity = frame['intensity'].astype(np.uint8)
+        else:
+            reflectivity = np.zeros(len(frame), dtype=np.uint8)
+        timestamp = frame['timestamp'] if 'timestamp' in names else None
+        return xyz, reflectivity, timestamp
@@ -0,0 +1,120 @@
+import numpy as np
+
+"""
+投影前的点云筛选
+依次进行视锥裁剪、场地范围裁剪与体素降采样，全部为整批的numpy运算，投影与深度队列只处理留下的点。
+"""
+
+_AXIS_BITS = 21  # 每个坐标轴的体素编号占用的位数
+_AXIS_OFFSET = 1 << (_AXIS_BITS - 1)
+_AXIS_MAX = (1 << _AXIS_BITS) - 1
+
+
+def voxel_encode(xyz, voxel):
+    """
+    把点所在的体素编号按每轴21位打包为一个int64编码 \n
+    :param xyz: (n, 3)的坐标(单位：m)
+    :param voxel: 体素边长(m)
+    :return: (n,)的int64体素编码
+    """
+    index = np.floor(np.asarray(xyz) * np.float32(1. / voxel)).astype(np.int64)
+    index += _AXIS_OFFSET
+    np.clip(index, 0, _AXIS_MAX, out=index)
+    return (index[:, 0] << (2 * _AXIS_BITS)) | (index[:, 1] << _AXIS_BITS) | index[:, 2]
+
+
+def voxel_min_range(xyz, voxel, distance=None):
+    """
+    体素降采样，每个体素只保留距离最近的点 \n
+    :param xyz: (n, 3)的坐标(单位：m)
+    :param voxel: 体素边长(m)
+    :param distance: (n,)的距离，为空则使用xyz[:, 2]（相机坐标系下的深度）
+    :return: 保留的点的索引，按原顺序排列
+    """
+    if len(xyz) < 2:
+        return np.arange(len(xyz))
+    keys = voxel_encode(xyz, voxel)
+    order = np.lexsort((xyz[:, 2] if distance is None else distance, keys))
+    keys = keys[order]
+    first = np.empty(len(keys), dtype=bool)
+    first[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    return np.sort(order[first])
+
+
+class PointFilter(object):
+    """
+    投影前的点云筛选，输入为相机坐标系的点 \n
+    视锥裁剪按相机内参去掉相机后方与视场外的点；场地范围裁剪在标定得到cam2world后，去掉场地范围（game_ground_size）外的点；
+    体素降采样在每个体素中只保留深度最小的点，深度图每个像素取最近的深度，被遮挡的点不影响结果。
+    """
+
+    def __init__(self, frustum=True, near=0.3, far=50., margin=0.05, crop=True, field_margin=1.,
+                 height_range=(-0.5, 3.), voxel=0.05):
+        """
+        :param frustum: 是否进行视锥裁剪
+        :param near: 最近深度(m)
+        :param far: 最远深度(m)
+        :param margin: 视场外保留的范围，为图像宽高的比例，抵消畸变的影响
+        :param crop: 是否进行场地范围裁剪
+        :param field_margin: 场地边界外保留的范围(m)
+        :param height_range: 保留的高度范围(m)，世界坐标系z轴
+        :param voxel: 体素边长(m)，为0时不降采样
+        """
+        self.frustum = frustum
+        self.near = near
+        self.far = far
+        self.margin = margin
+        self.crop = crop
+        self.field_margin = field_margin
+        self.height_range = height_range
+        self.voxel = voxel
+        self.input_points = 0  # 输入的总点数
+        self.output_points = 0  # 留下的总点数
+        self.__slope = None  # 视场边界在x、y方向上相对深度的斜率
+        self.__field = None  # 场地范围的世界坐标下界与上界
+
+    def set_camera(self, k, size):
+        """
+        :param k: 相机内参
+        :param size: 图像尺寸[height, width]
+        """
+        k = np.asarray(k, dtype=np.float64)
+        height, width = size
+        mx, my = width * self.margin, height * self.margin
+        # u = fx * x / z + cx在[-mx, width + mx)内，y方向同理
+        self.__slope = np.array([(-mx - k[0, 2]) / k[0, 0], (width + mx - k[0, 2]) / k[0, 0],
+                                 (-my - k[1, 2]) / k[1, 1], (height + my - k[1, 2]) / k[1, 1]], dtype=np.float32)
+
+    def set_field(self, ground_size):
+        """
+        :param ground_size: 场地尺寸[长, 宽](m)，世界坐标系x轴为长，y轴为宽的负方向
+        """
+        length, width = ground_size
+        m = self.field_margin
+        self.__field = np.array([[-m, -width - m, self.height_range[0]], [length + m, m, self.height_range[1]]],
+                                dtype=np.float32)
+
+    def select(self, camera, cam2world=None):
+        """
+        :param camera: (n, 3)的相机坐标
+        :param cam2world: 相机到世界的4x4变换，为空时不进行场地范围裁剪
+        :return: 留下的点的索引，按原顺序排列
+        """
+        self.input_points += len(camera)
+        index = np.arange(len(camera))
+        if self.frustum and self.__slope is not None:
+            x, y, z = camera[:, 0], camera[:, 1], camera[:, 2]
+            s = self.__slope
+            mask = (z > self.near) & (z < self.far)
+            mask &= (x >= s[0] * z) & (x < s[1] * z) & (y >= s[2] * z) & (y < s[3] * z)
+            index = np.flatnonzero(mask)
+        if self.crop and self.__field is not None and cam2world is not None and len(index):
+            # 只变换视锥内的点
+            t = np.asarray(cam2world, dtype=np.float32)
+            world = camera[index] @ t[:3, :3].T + t[:3, 3]
+            index = index[np.all((world >= self.__field[0]) & (world <= self.__field[1]), axis=1)]
+        if self.voxel and len(index) > 1:
+            index = index[voxel_min_range(camera[index], self.voxel)]
+        self.output_points += len(index)
+        return index
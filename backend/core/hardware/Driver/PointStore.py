@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+
+
+class PointStore(object):
+    """
+    定长点云存储。\n
+    点以float32坐标(单位：m)、uint8反射率、uint64主机时间戳(单位：ns)保存在预分配的环形数组中，写满后覆盖最旧的点，
+    录制整场比赛内存占用不变。\n
+    数组按镜像方式分配为两倍容量，每个点同时写入i与i + capacity两处，任意不超过容量的最新一段点在数组中总是连续的，
+    读取接口因此直接返回视图，不复制数据。返回的视图在之后写入的点不超过capacity - n个时保持有效，需要长期持有时自行复制。\n
+    多个雷达写入同一存储时各自保留设备的时间戳，批次交替到达使时间戳不再单调，存储中有乱序的点时window逐点筛选并返回副本。
+    """
+
+    def __init__(self, capacity=1000000):
+        """
+        :param capacity: 保存的最大点数，Mid-70约每秒10万点
+        """
+        self.capacity = int(capacity)
+        self.__xyz = np.zeros((2 * self.capacity, 3), dtype=np.float32)
+        self.__reflectivity = np.zeros(2 * self.capacity, dtype=np.uint8)
+        self.__timestamp = np.zeros(2 * self.capacity, dtype=np.uint64)
+        self.__seq = 0  # 已写入的总点数
+        self.__disorder = None  # 最近一次时间戳早于前一个点的写入位置
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.__seq, self.capacity)
+
+    @property
+    def total(self):
+        """
+        已写入的总点数，包括已被覆盖的点
+        """
+        return self.__seq
+
+    def push(self, xyz, reflectivity, timestamp):
+        """
+        写入一批点，同一批内的时间戳应不减 \n
+        :param xyz: (n, 3)的坐标(单位：m)
+        :param reflectivity: (n,)的反射率
+        :param timestamp: 主机时间戳(单位：ns)，整数或(n,)的数组
+        """
+        n, skip = len(xyz), 0
+        if n > self.capacity:
+            # 超过容量的部分写入后也会被覆盖，只写最新的capacity个点
+            skip, n = n - self.capacity, self.capacity
+            xyz, reflectivity = xyz[skip:], reflectivity[skip:]
+            if not np.isscalar(timestamp):
+                timestamp = timestamp[skip:]
+        if not n:
+            return
+        with self.__lock:
+            self.__seq += skip
+            first = timestamp if np.isscalar(timestamp) else timestamp[0]
+            if self.__seq and first < self.__timestamp[(self.__seq - 1) % self.capacity]:
+                self.__disorder = self.__seq
+            start = self.__seq % self.capacity
+            first = min(n, self.capacity - start)
+            for s, d, l in ((0, start, first), (first, 0, n - first)):
+                if not l:
+                    continue
+                for base in (d, d + self.capacity):
+                    self.__xyz[base:base + l] = xyz[s:s + l]
+                    self.__reflectivity[base:base + l] = reflectivity[s:s + l]
+                    self.__timestamp[base:base + l] = timestamp if np.isscalar(timestamp) else timestamp[s:s + l]
+            self.__seq += n
+
+    def latest(self, n=None):
+        """
+        读取最新的n个点 \n
+        :param n: 点数，为空或超过保存的点数时读取全部
+        :return: (xyz, reflectivity, timestamp)的视图，按写入顺序排列
+        """
+        with self.__lock:
+            seq = self.__seq
+        size = min(seq, self.capacity)
+        n = size if n is None else max(0, min(n, size))
+        end = seq % self.capacity + self.capacity
+        return self.__xyz[end - n:end], self.__reflectivity[end - n:end], self.__timestamp[end - n:end]
+
+    def window(self, ms, now=None):
+        """
+        读取最近一段时间内的点 \n
+        :param ms: 时间窗口(ms)
+        :param now: 窗口的结束时刻(单位：ns)，为空则取最晚的时间戳
+        :return: (xyz, reflectivity, timestamp)的视图，有乱序的点时为副本
+        """
+        with self.__lock:
+            # 乱序的一对点中较早写入的一个已被覆盖后，存储中的时间戳重新有序
+            ordered = self.__disorder is None or self.__disorder <= self.__seq - self.capacity
+        xyz, reflectivity, timestamp = self.latest()
+        if not len(timestamp):
+            return xyz, reflectivity, timestamp
+        if not ordered:
+            now = int(timestamp.max()) if now is None else int(now)
+            mask = (timestamp >= np.uint64(max(0, now - int(ms * 1e6)))) & (timestamp <= np.uint64(now))
+            return xyz[mask], reflectivity[mask], timestamp[mask]
+        now = int(timestamp[-1]) if now is None else int(now)
+        begin = np.searchsorted(timestamp, np.uint64(max(0, now - int(ms * 1e6))), side='left')
+        end = np.searchsorted(timestamp, np.uint64(now), side='right')
+        return xyz[begin:end], reflectivity[begin:end], timestamp[begin:end]
+
+    def clear(self):
+        with self.__lock:
+            self.__seq = 0
+            self.__disorder = None
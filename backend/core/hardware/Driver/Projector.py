@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+"""
+相机坐标系点云到像素深度的投影
+把OpenCV的针孔与畸变模型（k1, k2, p1, p2[, k3[, k4, k5, k6]]）展开为float32的整批多项式运算，
+一次得到深度与像素坐标，不再为每批点调用cv2.projectPoints。
+"""
+
+
+class Projector(object):
+    """
+    相机投影器 \n
+    畸变多项式在视场范围内单调，视场外的点畸变后可能折回图像内部，因此先按图像四角反畸变得到的最大归一化半径剔除视场外的点。
+    """
+
+    def __init__(self, k, dist, size, margin=0.05):
+        """
+        :param k: 相机内参
+        :param dist: 畸变系数，支持4、5、8个
+        :param size: 图像尺寸[height, width]
+        :param margin: 视场外保留的范围，为图像宽高的比例
+        """
+        self.k = np.asarray(k, dtype=np.float64)
+        dist = np.asarray(dist, dtype=np.float64).reshape(-1)
+        if len(dist) not in (4, 5, 8):
+            raise ValueError(f'Unsupported distortion coefficients: {len(dist)}')
+        self.dist = dist
+        self.height, self.width = size
+        self.__fx, self.__fy = np.float32(self.k[0, 0]), np.float32(self.k[1, 1])
+        self.__cx, self.__cy = np.float32(self.k[0, 2]), np.float32(self.k[1, 2])
+        coef = np.zeros(8, dtype=np.float64)
+        coef[:len(dist)] = dist
+        self.__k1, self.__k2, self.__p1, self.__p2, self.__k3, self.__k4, self.__k5, self.__k6 = coef.astype(np.float32)
+        self.__rational = len(dist) == 8
+        # 图像四角（含余量）对应的最大归一化半径的平方
+        mx, my = self.width * margin, self.height * margin
+        corners = np.array([[-mx, -my], [self.width + mx, -my], [-mx, self.height + my],
+                            [self.width + mx, self.height + my]], dtype=np.float64)
+        normalized = cv2.undistortPoints(corners.reshape(-1, 1, 2), self.k, self.dist).reshape(-1, 2)
+        self.__max_r2 = np.float32((normalized ** 2).sum(axis=1).max())
+
+    def distort(self, x, y):
+        """
+        :param x: 归一化坐标x/z
+        :param y: 归一化坐标y/z
+        :return: 畸变后的归一化坐标
+        """
+        xy = x * y
+        x2, y2 = x * x, y * y
+        r2 = x2 + y2
+        radial = 1 + r2 * (self.__k1 + r2 * (self.__k2 + r2 * self.__k3))
+        if self.__rational:
+            radial /= 1 + r2 * (self.__k4 + r2 * (self.__k5 + r2 * self.__k6))
+        xd = x * radial + 2 * self.__p1 * xy + self.__p2 * (r2 + 2 * x2)
+        yd = y * radial + self.__p1 * (r2 + 2 * y2) + 2 * self.__p2 * xy
+        return xd, yd
+
+    def project(self, camera):
+        """
+        投影一批相机坐标系的点，只返回落在图像内的点 \n
+        :param camera: (n, 3)的相机坐标
+        :return: (depth, point_2d)，depth为(m,)的float32深度，point_2d为(m, 2)的int32像素坐标[u, v]
+        """
+        camera = np.asarray(camera, dtype=np.float32)
+        z = camera[:, 2]
+        front = z > 0
+        if not front.all():
+            camera, z = camera[front], z[front]
+        inv_z = 1 / z
+        x, y = camera[:, 0] * inv_z, camera[:, 1] * inv_z
+        # 视场外的点不做畸变，避免折回图像内部
+        valid = x * x + y * y <= self.__max_r2
+        if not valid.all():
+            x, y, z = x[valid], y[valid], z[valid]
+        xd, yd = self.distort(x, y)
+        point_2d = np.empty((len(z), 2), dtype=np.int32)
+        point_2d[:, 0] = xd * self.__fx + self.__cx
+        point_2d[:, 1] = yd * self.__fy + self.__cy
+        inside = (point_2d[:, 0] >= 0) & (point_2d[:, 0] < self.width) & (point_2d[:, 1] >= 0) & \
+                 (point_2d[:, 1] < self.height)
+        return z[inside], point_2d[inside]
+
+    def render(self, camera):
+        """
+        把一整段积分时间内的点一次投影为深度图，每个像素取最小深度 \n
+        :param camera: (n, 3)的相机坐标
+        :return: (height, width)的float32深度图，没有点的像素为nan
+        """
+        depth, point_2d = self.project(camera)
+        image = np.full((self.height, self.width), np.nan, dtype=np.float32)
+        if not len(depth):
+            return image
+        pixel = point_2d[:, 1].astype(np.int64) * self.width + point_2d[:, 0]
+        # 按像素、深度排序，每个像素的第一个点即最近的点
+        order = np.lexsort((depth, pixel))
+        pixel = pixel[order]
+        first = np.empty(len(pixel), dtype=bool)
+        first[0] = True
+        np.not_equal(pixel[1:], pixel[:-1], out=first[1:])
+        image.reshape(-1)[pixel[first]] = depth[order[first]]
+        return image
@@ -0,0 +1,60 @@
+import select
+import socket
+
+import numpy as np
+
+from core.utils.logger import Logger
+
+
+class UdpBatchReceiver(object):
+    """
+    批量UDP接收器。\n
+    套接字设为非阻塞，通过select阻塞等待数据到达（带超时，便于检查停止标志），之后取完接收缓冲区中已到达的数据包，一次唤醒处理一批。
+    数据包按固定间隔`packet_size`写入预分配的缓冲区池，可直接按结构化类型映射解码，接收过程不分配内存。
+    """
+
+    def __init__(self, sock, packet_size=1500, batch=64, pool=4, rcvbuf=8 * 1024 * 1024, timeout=0.1):
+        """
+        :param sock: UDP套接字
+        :param packet_size: 单个数据包的最大字节数，也是缓冲区中相邻数据包的间隔
+        :param batch: 每批最多接收的数据包数量
+        :param pool: 缓冲区池大小，返回的缓冲区在接收之后的pool - 1批内保持有效
+        :param rcvbuf: 内核接收缓冲区大小(byte)，处理线程短暂停顿时由内核暂存数据包
+        :param timeout: 等待数据到达的超时时间(s)
+        """
+        self.sock = sock
+        self.packet_size = packet_size
+        self.batch = batch
+        self.timeout = timeout
+        self.__pool = [bytearray(packet_size * batch) for _ in range(pool)]
+        self.__views = [memoryview(buf) for buf in self.__pool]
+        self.__sizes = [np.zeros(batch, dtype=np.int32) for _ in range(pool)]
+        self.__index = 0
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        except OSError as e:
+            Logger.warn(f'Set SO_RCVBUF to {rcvbuf} failed: {e}')
+        actual = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        if actual < rcvbuf:
+            # Linux下受net.core.rmem_max限制
+            Logger.warn(f'SO_RCVBUF is {actual}, less than {rcvbuf}, packets may drop at full rate.')
+        self.sock.setblocking(False)
+
+    def receive(self):
+        """
+        接收一批数据包 \n
+        :return: (缓冲区, 各数据包长度, 数据包数量)，超时返回的数量为0
+        """
+        view, sizes = self.__views[self.__index], self.__sizes[self.__index]
+        self.__index = (self.__index + 1) % len(self.__views)
+        if not select.select([self.sock], [], [], self.timeout)[0]:
+            return view, sizes[:0], 0
+        size, count = self.packet_size, 0
+        try:
+            while count < self.batch:
+                offset = count * size
+                sizes[count] = self.sock.recv_into(view[offset:offset + size], size)
+                count += 1
+        except (BlockingIOError, InterruptedError):
+            pass
+        return view, sizes[:count], count
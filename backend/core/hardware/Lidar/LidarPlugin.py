@@ -3,6 +3,7 @@ import numpy as np
 from core.hardware.Lidar.LivoxMid70 import LivoxMid70
 from core.library.EventBusBase import EventBus
 from core.library.PluginBase import PluginBase
+from core.library.Synchronizer import Synchronizer
 from core.library.Utils import DepthQueue
 
 
@@ -10,7 +11,9 @@ class LidarPlugin(PluginBase):
     use_file = True
     __livox = LivoxMid70(use_file=use_file)
     plugin_name = 'lidar'
+    priority = 2
     depth_queue = DepthQueue(maxsize=120)
+    lidar_sync = Synchronizer()  # 相机/雷达同步器
 
     def __init__(self):
         super().__init__()
@@ -18,7 +21,10 @@ class LidarPlugin(PluginBase):
     @classmethod
     def start(cls):
         # 初始化参数
-        cls.depth_queue.set(k0=np.array(EventBus.get('camera_intrinsic_matrix')['data']), c0=np.array(EventBus.get('camera_dist')['data']), e0=np.array(EventBus.get('lidar_extrinsic')['data']), size=[EventBus.get('image')['data']['height'], EventBus.get('image')['data']['width']])
+        store = EventBus.get('depth_store')
+        cls.depth_queue.set(k0=np.array(EventBus.get('camera_intrinsic_matrix')['data']), c0=np.array(EventBus.get('camera_dist')['data']), e0=np.array(EventBus.get('lidar_extrinsic')['data']), size=[EventBus.get('image')['data']['height'], EventBus.get('image')['data']['width']], **({} if store is None else store['data']))
+        sync = EventBus.get('sync')
+        cls.lidar_sync.set(cls.depth_queue, **({} if sync is None else sync['data']))
         if not cls.use_file:
             cls.__livox.build_connection()
         else:
@@ -1,10 +1,8 @@
-from core.hardware.Driver.LivoxLidarDriver import LivoxLidarDriver
+from core.hardware.Driver.LivoxAsyncDriver import LivoxAsyncDriver
 from core.library.LidarBase import Lidar
 from core.utils.logger import Logger
 
 
-# TODO 1. 添加雷达驱动的保存点云的功能
-# TODO 2. 添加雷达获取深度图的功能
 class LivoxMid70(Lidar):
     """
     此为Livox Mid 70雷达类，用于创建、管理雷达，并通信。
@@ -12,10 +10,26 @@ class LivoxMid70(Lidar):
 
     def __init__(self, use_file):
         super().__init__()
-        self.livox_mid70 = LivoxLidarDriver(without_lidar=use_file)
+        self.livox_mid70 = LivoxAsyncDriver(without_lidar=use_file)
 
     def build_connection(self):
-        self.livox_mid70.connect()
+        # 连接配置文件lidars中的所有雷达，多个雷达的点合并到相机坐标系
+        self.livox_mid70.connect(count=self.livox_mid70.get_lidar_count())
+
+    def get_merged_cloud(self, ms=None):
+        """
+        获取相机坐标系下所有雷达的合并点云 \n
+        :param ms: 时间窗口(ms)，为空则读取全部保留的点
+        """
+        return self.livox_mid70.get_merged_cloud(ms)
+
+    def get_depth_image(self, ms=100):
+        """
+        获取最近一段积分时间内的深度图 \n
+        :param ms: 积分时间(ms)
+        :return: (height, width)的深度图(单位：m)，没有点的像素为nan
+        """
+        return self.livox_mid70.get_depth_image(ms)
 
     def start(self):
         self.livox_mid70.start_record()
@@ -26,3 +40,16 @@ class LivoxMid70(Lidar):
 
     def load_pcd(self):
         self.livox_mid70.load_pcd_file()
+
+    def save_pcd(self, path):
+        """
+        开始把录制的点云流式保存到PCD文件，格式由配置文件的saved_point_cloud_format指定 \n
+        :param path: PCD文件路径
+        """
+        self.livox_mid70.save_point_cloud_to_pcd(path)
+
+    def stop_save_pcd(self):
+        """
+        停止流式保存，关闭PCD文件
+        """
+        self.livox_mid70.stop_point_cloud_to_pcd()
@@ -9,10 +9,10 @@ class AlertPlugin(PluginBase):
     alert_msg = None
     is_pause = False
     plugin_name = 'alert'
+    priority = 3
 
     def __init__(self):
         super().__init__()
-        self.priority = 1
 
     @classmethod
     def start(cls):
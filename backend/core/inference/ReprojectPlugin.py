@@ -1,9 +1,9 @@
 import threading
-import time
 
 from core.inference.geometry.reproject import Reproject
 from core.library.EventBusBase import EventBus
 from core.library.PluginBase import PluginBase
+from core.library.Tracer import Tracer
 
 
 class ReprojectPlugin(PluginBase):
@@ -13,6 +13,7 @@ class ReprojectPlugin(PluginBase):
     cam_in_world = None
     bev_points = None
     plugin_name = 'reproject'
+    priority = 3
 
     def __init__(self):
         super().__init__()
@@ -30,9 +31,22 @@ class ReprojectPlugin(PluginBase):
     def __reproject_thread(cls):
         cls.__reproject.parent = cls
         cls.__reproject.t = EventBus.get('cam2world')['data']
+        subscriber = cls.subscribe('armor_stamp')
         while True:
-            if EventBus.get('armor_car_index') and EventBus.get('depth_queue'):
+            # 检测结果发布后立即反投影
+            item = subscriber.wait(timeout=1)
+            if item is None or not EventBus.get('depth_queue'):
+                continue
+            frame_id, timestamp = item['data']
+            with Tracer.bind(frame_id):
+                sync = EventBus.get('lidar_sync')
+                if sync is not None and sync['data'] is not None:
+                    # 深度队列推进到该帧的采集时刻
+                    with Tracer.span('sync'):
+                        bundle = sync['data'].match(frame_id, timestamp)
+                    if not bundle.matched:
+                        # 窗口内没有雷达数据，跳过本帧，不用过期的深度反投影
+                        cls.tick()
+                        continue
                 cls.__reproject.get_depth(EventBus.get('armor_bbox')['data'], EventBus.get('depth_queue')['data'])
-                time.sleep(0.01)
-            else:
-                time.sleep(0.1)
+            cls.tick()
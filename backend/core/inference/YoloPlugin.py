@@ -1,22 +1,28 @@
 import threading
 
 from core.inference.yolov5.detect import YoloDetector
+from core.library.Enums import EventBusItemType
 from core.library.EventBusBase import EventBus
+from core.library.FrameRingBuffer import FrameRingBuffer
 from core.library.PluginBase import PluginBase
+from core.library.Tracer import Tracer
 
 
 # TODO 精简化YOLO
 class YoloPlugin(PluginBase):
     __thread = None
+    __annotator_ring = None
     annotator_result = None  # 检测结果图像
+    annotator_clip = None    # 第二阶段检测的装甲板拼图
     armor_car_index = None   # armor-car索引表
     armor_bbox = None        # armor的bbox[[cls, bbox], ...]
+    armor_stamp = None       # armor_bbox对应图像的(帧号, 采集时间戳(s))
     is_pause = False
     plugin_name = 'yolo'
+    priority = 2
 
     def __init__(self):
         super().__init__()
-        self.priority = 1
 
     @classmethod
     def start(cls):
@@ -27,10 +33,51 @@ class YoloPlugin(PluginBase):
     def uninstall(cls):
         cls.is_pause = True
 
+    @classmethod
+    def prepare_worker(cls):
+        """
+        检测放到子进程时，检测结果图像经过共享内存帧缓冲区回传主进程，不逐帧序列化整幅图像；
+        帧缓冲区按相机图像的尺寸分配，只有第一阶段的检测结果写入，第二阶段的装甲板拼图发布在annotator_clip
+        """
+        ring = cls.get('camera_ring')
+        if ring is None or ring['data'] is None:
+            return
+        cls.__annotator_ring = FrameRingBuffer(ring['data'].shape, ring['data'].dtype, slots=3)
+        cls.register(None, 'annotator_ring', EventBusItemType.DATA)
+        cls.update('annotator_ring', cls.__annotator_ring)
+        EventBus.bind_ring('annotator_result', 'annotator_ring')
+
+    @classmethod
+    def release_worker(cls):
+        if cls.__annotator_ring is not None:
+            cls.__annotator_ring.close()
+            cls.__annotator_ring.unlink()
+            cls.__annotator_ring = None
+
     @classmethod
     def __yolo_thread(cls):
         YoloDetector.parent = cls
+        subscriber = cls.subscribe('camera_view')
         while not cls.is_pause:
-            img = EventBus.get('camera_view')['data']
-            if img is not None:
-                YoloDetector.run(img)
+            # 每帧只检测一次，超时用于检查暂停标志
+            item = subscriber.wait(timeout=1)
+            if item is None:
+                continue
+            ring = cls.get('camera_ring')
+            if ring is None or ring['data'] is None:
+                if item['data'] is not None:
+                    # 没有帧缓冲区时以总线版本号为帧号，与相机记录的帧号一致（版本号从1开始，帧号从0开始）
+                    frame_id = item['version'] - 1
+                    with Tracer.bind(frame_id):
+                        YoloDetector.run(item['data'])
+                    cls.update('armor_stamp', (frame_id, item['timestamp'] / 1e9))
+                cls.tick()
+                continue
+            # 检测期间持有帧引用，防止槽位被相机覆盖
+            frame = ring['data'].acquire()
+            if frame is not None:
+                with frame, Tracer.bind(frame.frame_id):
+                    YoloDetector.run(frame.data)
+                # 检测结果发布后再发布时间戳，反投影以此为触发
+                cls.update('armor_stamp', (frame.frame_id, frame.timestamp / 1e9))
+            cls.tick()
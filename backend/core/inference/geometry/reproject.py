@@ -5,6 +5,7 @@ import numpy as np
 
 from core.library.Draw import BEVHandler
 from core.library.EasyImportBase import ROOT
+from core.library.Tracer import Tracer
 from core.library.Utils import Singleton, is_none
 
 
@@ -29,8 +30,13 @@ class Reproject(Singleton):
         """
         if is_none(armor) or is_none(cloud) or is_none(self.t['data']):
             return
-        # 获取所有armor对应的类别与深度
-        depth = cloud.get_armor_depth(armor)
+        with Tracer.span('reproject'):
+            self.__get_depth(armor, cloud)
+
+    def __get_depth(self, armor, cloud):
+        # 获取所有armor对应的类别与深度，ROI深度按配置的估计方法计算，排除透过缝隙的背景点与地面点
+        estimator = self.parent.get('depth_estimator')
+        depth = cloud.get_armor_depth(armor, **({} if estimator is None else estimator['data']))
         if is_none(depth):
             return
         # 反投影
@@ -42,6 +48,8 @@ class Reproject(Singleton):
             # 坐标变换
             d[1] += ground_width
             bev_points[cls] = d
+        # 推送小地图的线程据此找到该值对应的帧，发布前记录，保证读取方拿到新值时已能查到帧号；bev_points只由本线程发布
+        Tracer.tag('bev_points', self.parent.get('bev_points')['version'] + 1)
         self.parent.update('bev_points', bev_points)
         BEVHandler.draw()
         print(bev_points)
@@ -1,5 +1,6 @@
 import math
 import queue
+import time
 from collections import Counter
 
 import cv2
@@ -8,6 +9,8 @@ import torch
 from ultralytics.utils.plotting import Annotator, colors
 
 from core.library.EasyImportBase import ROOT
+from core.library.Enums import LogLevel
+from core.library.Tracer import Tracer
 from core.library.Utils import Singleton, draw_rec, get_bbox_from_label, get_max_conf_bbox, get_max_item_from_dict, \
     get_data_from_list
 from core.utils.logger import Logger
@@ -96,6 +99,8 @@ class YoloDetector(Singleton):
 
     @classmethod
     def run(cls, img, img_sz=(640, 640)):
+        start = time.time_ns()
+        stage = f'yolo.stage{cls.stage + 1}'
         if not cls.__is_init:
             cls.__init()
             cls.__is_init = True
@@ -137,12 +142,18 @@ class YoloDetector(Singleton):
                         annotator.box_label(xyxy, label, color=colors(c, True))
                         coord.append([c, [int(f) for f in xyxy], float(conf)])
                 im0 = annotator.result()
-                cls.parent.update('annotator_result', im0)
+                # 第二阶段的输入为装甲板拼图，尺寸与相机图像不同，单独发布
+                cls.parent.update('annotator_result' if cls.stage == 0 else 'annotator_clip', im0)
                 if cls.stage == 1:
                     cv2.imshow('res', im0)
                     cv2.waitKey(1)
-            Logger.output(
-                f"stage {cls.stage + 1} {s}{'' if len(det) else '(no detections) | '}Spend {dt[1].dt * 1E3:.1f}ms")
+            if Logger.is_enabled(LogLevel.OUTPUT):
+                Logger.output(
+                    f"stage {cls.stage + 1} {s}{'' if len(det) else '(no detections) | '}Spend {dt[1].dt * 1E3:.1f}ms")
+        # 预处理、推理、NMS的计时记入帧追踪
+        for name, p in zip(('pre', 'infer', 'nms'), dt):
+            if hasattr(p, 'dt'):
+                Tracer.record(f'{stage}.{name}', int(p.start * 1e9), int((p.start + p.dt) * 1e9))
         if cls.stage == 1:
             cls.__total_ticks += 1
             cls.__detect_armors = coord
@@ -152,12 +163,13 @@ class YoloDetector(Singleton):
             cls.__normalize(res)
             if len(cls.__detect_armors) != 0 and len(cls.__detect_cars) != 0:
                 res = cls.__reshape()
-                img = draw_rec(cls.__last_img, [p[1] for p in res])
+                img = draw_rec(cls.__last_img.copy(), [p[1] for p in res])
                 img = cv2.resize(img, dsize=(1000, 600))
                 cv2.imshow('aaa', img)
                 cv2.waitKey(0)
             cls.parent.update('armor_car_index', cls.__armor_index)
             cls.parent.update('armor_bbox', res)
+            Tracer.record(stage, start, time.time_ns())
             return
         cls.__last_img = img
         cls.__detect_cars = coord
@@ -167,6 +179,7 @@ class YoloDetector(Singleton):
         bw, bh = b_img.shape[:2]
         input_coord = cls.gen_scale_coord(coord, (bw / iw, bh / ih)) if cls.use_zio else coord
         stage2_img = cls.__gen_clip_image(input_image=input_image, input_coord=input_coord)
+        Tracer.record(stage, start, time.time_ns())
         if not isinstance(stage2_img, type(None)):
             cls.run(img=stage2_img, img_sz=(640, 640))
 
@@ -0,0 +1,114 @@
+import numpy as np
+
+"""
+ROI深度估计
+装甲板ROI中除了装甲板本身，还会落入从缝隙透过的背景点与地面点，直接取平均深度会被拉偏。
+这里把所有ROI内的有效像素按深度分桶(mm)，一次bincount得到每个ROI的深度直方图（每桶的点数与深度和），
+各估计方法都在直方图上整批计算，不对每个ROI排序。
+各方法按名字注册在DEPTH_ESTIMATORS中，参数为(count, total, **params)，返回(n,)的深度(mm)，ROI内没有点时为nan。
+"""
+
+DEPTH_ESTIMATORS = {}
+
+
+def register_estimator(name):
+    """
+    注册深度估计方法 \n
+    :param name: 方法名
+    """
+
+    def register(func):
+        DEPTH_ESTIMATORS[name] = func
+        return func
+
+    return register
+
+
+def depth_histogram(box, depth, box_num, bucket=100):
+    """
+    生成每个ROI的深度直方图 \n
+    :param box: (m,)每个像素所属的ROI编号
+    :param depth: (m,)像素深度(mm)
+    :param box_num: ROI数量
+    :param bucket: 分桶宽度(mm)
+    :return: (count, total)，均为(box_num, 桶数)，每桶的点数与深度和(mm)
+    """
+    bins = 0xFFFF // bucket + 1
+    index = box.astype(np.int64) * bins + depth // bucket
+    count = np.bincount(index, minlength=box_num * bins).reshape(box_num, bins)
+    total = np.bincount(index, weights=depth, minlength=box_num * bins).reshape(box_num, bins)
+    return count, total
+
+
+def _bucket_mean(count, total):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total / count
+
+
+@register_estimator('mean')
+def mean_depth(count, total, **_):
+    """
+    平均深度
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total.sum(axis=1) / count.sum(axis=1)
+
+
+@register_estimator('median')
+def median_depth(count, total, **_):
+    """
+    中位数，取中位数所在桶的平均深度
+    """
+    cumulative = np.cumsum(count, axis=1)
+    n = cumulative[:, -1]
+    index = np.argmax(cumulative >= ((n + 1) // 2)[:, None], axis=1)
+    rows = np.arange(len(count))
+    res = _bucket_mean(count[rows, index], total[rows, index])
+    res[n == 0] = np.nan
+    return res
+
+
+@register_estimator('trimmed')
+def trimmed_mean_depth(count, total, trim=0.2, **_):
+    """
+    截尾平均，去掉最近与最远各trim比例的点，边界桶按比例计入 \n
+    :param trim: 每端去掉的比例
+    """
+    cumulative = np.cumsum(count, axis=1)
+    n = cumulative[:, -1:].astype(np.float64)
+    low, high = n * trim, n * (1 - trim)
+    # 每桶落在[low, high)内的点数
+    kept = np.clip(np.minimum(cumulative, high) - np.maximum(cumulative - count, low), 0, None)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(kept * _bucket_mean(count, total), axis=1) / kept.sum(axis=1)
+
+
+@register_estimator('nearest')
+def nearest_cluster_depth(count, total, min_points=3, gap=1, **_):
+    """
+    最近簇，从近到远找到第一个点数足够的桶，向远处合并相邻的非空桶，取簇内的平均深度；
+    背景点在装甲板后方，与装甲板的簇之间隔着空桶，不会被合并。没有足够点数的桶时取中位数 \n
+    :param min_points: 簇起点的桶（含其后gap个桶）至少包含的点数
+    :param gap: 簇内允许的最大连续空桶数
+    """
+    bins = count.shape[1]
+    cumulative = np.zeros((len(count), bins + 1), dtype=np.int64)
+    np.cumsum(count, axis=1, out=cumulative[:, 1:])
+    cumulative_total = np.zeros((len(count), bins + 1), dtype=np.float64)
+    np.cumsum(total, axis=1, out=cumulative_total[:, 1:])
+    # 从每个桶开始gap + 1个桶内的点数
+    window = cumulative[:, np.minimum(np.arange(bins) + gap + 1, bins)] - cumulative[:, :-1]
+    start_ok = window >= min_points
+    found = start_ok.any(axis=1)
+    start = np.argmax(start_ok, axis=1)
+    # 簇在start之后第一个连续gap + 1个空桶处结束
+    position = np.arange(bins)
+    end_ok = (window == 0) & (position > start[:, None])
+    end = np.where(end_ok.any(axis=1), np.argmax(end_ok, axis=1), bins)
+    rows = np.arange(len(count))
+    n = cumulative[rows, end] - cumulative[rows, start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        res = (cumulative_total[rows, end] - cumulative_total[rows, start]) / n
+    if not found.all():
+        res[~found] = median_depth(count[~found], total[~found])
+    return res
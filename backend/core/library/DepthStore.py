@@ -0,0 +1,404 @@
+import numpy as np
+
+"""
+深度队列的存储后端
+DepthQueue把每条数据转换为有序且不重复的像素索引与每个像素的最小深度(mm)后交给存储后端，由后端负责滑动窗口内的
+逐像素最小深度与ROI查询。后端按名字注册在DEPTH_STORES中，在配置文件depth_store中选择：
+dense为整幅的uint16深度图，入队、出队时增量维护，查询为连续切片与积分图查表；
+sparse只保存窗口内的点，按所在分块排序，查询时只访问ROI覆盖的分块中的点，不保存整幅深度图。
+"""
+
+EMPTY = np.uint16(0xFFFF)  # 无深度
+DEPTH_STORES = {}
+
+
+def register_store(name):
+    """
+    注册存储后端 \n
+    :param name: 后端名
+    """
+
+    def register(cls):
+        DEPTH_STORES[name] = cls
+        return cls
+
+    return register
+
+
+def _split_boxes(boxes, size):
+    """
+    :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+    :param size: 图像尺寸[height, width]
+    :return: 裁剪到图像内的int64 ROI
+    """
+    height, width = size
+    return np.clip(np.asarray(boxes, dtype=np.float64).reshape(-1, 4).astype(np.int64), 0,
+                   [height, height, width, width])
+
+
+def _merge(old, new, mask, position):
+    """
+    :param old: 已有的数组
+    :param new: 新数组
+    :param mask: 归并结果中已有元素的位置
+    :param position: 新元素在归并结果中的位置
+    """
+    merged = np.empty(len(mask), dtype=old.dtype)
+    merged[mask] = old
+    merged[position] = new
+    return merged
+
+
+@register_store('dense')
+class DenseDepthStore(object):
+    """
+    整幅深度图存储 \n
+    深度以uint16毫米保存（最大65.534m，0xFFFF为无深度），每个像素取窗口内所有数据的最小深度。
+    另有一张uint8的覆盖计数图记录每个像素被窗口内多少条数据覆盖。出队时只处理出队数据中等于当前最小值的像素：
+    计数降为0的像素直接清空，仍被其他数据覆盖的像素在窗口内的其余数据中重新取最小值，
+    因此不会像逐像素置为nan那样抹掉较新数据写入同一像素的深度。\n
+    入队与出队的耗时与该条数据的点数成正比，与图像分辨率无关；内存上限为 height * width * 3 字节（如3088x2064约19MB），
+    加上窗口内的点，每点6字节。\n
+    平均深度查询使用积分图：深度图按cell x cell像素分块，每块的深度和(mm)与有效像素数在入队、出队修改像素时增量更新，
+    查询时若有修改则对分块做一次前缀和（3088x2064为258x386块，约0.8ms，每次入队后的第一次查询都要付出），
+    之后ROI内完整的分块为4次查表。ROI边缘不足一个分块的行与列另外累加：每行在每个列分块内、每列在每个行分块内的
+    深度和与有效像素数同样增量更新，边缘的行与列在内部分块上的部分整批按区间求和，四角不足一个分块的像素逐像素累加，
+    结果是精确的平均深度，与sparse一致。分块与积分图另占约 height * width * 16 / cell ** 2 字节，
+    行、列的分块和另占约 height * width * 16 / cell 字节（3088x2064、cell为8时约13MB）。
+    """
+    # 有效像素数占用的低位，整幅图的有效像素数小于2 ** 23，深度和小于2 ** 39，打包后不会溢出int64
+    COUNT_BITS = 23
+
+    def __init__(self, size, cell=8):
+        """
+        :param size: 图像尺寸[height, width]
+        :param cell: 积分图的分块边长(像素)
+        """
+        self.size = size
+        self.cell = cell
+        self.__pixels = []  # 窗口内每条数据的(有序且不重复的像素索引, 该像素的最小深度(mm))
+        self.__depth = np.full(size[0] * size[1], EMPTY, dtype=np.uint16)
+        self.__count = np.zeros(size[0] * size[1], dtype=np.uint8)
+        # 每块的深度和(mm)与有效像素数，打包为 深度和 << COUNT_BITS | 有效像素数
+        self.__cells = np.zeros((-(-size[0] // cell), -(-size[1] // cell)), dtype=np.int64)
+        # 每行在每个列分块内、每列在每个行分块内的深度和与有效像素数，同样打包，放在同一块内存中整批查询
+        h, w = self.__cells.shape
+        self.__lines = np.zeros(size[0] * w + size[1] * h, dtype=np.int64)
+        self.__rows = self.__lines[:size[0] * w].reshape(size[0], w)
+        self.__cols = self.__lines[size[0] * w:].reshape(size[1], h)
+        self.__integral = None  # 分块的积分图，修改后置空，查询时重新生成
+
+    @property
+    def nbytes(self):
+        """
+        占用的内存(字节)
+        """
+        return self.__depth.nbytes + self.__count.nbytes + self.__cells.nbytes * 2 + self.__lines.nbytes + \
+            sum(pixel.nbytes + depth.nbytes for pixel, depth in self.__pixels)
+
+    def push(self, pixel, depth):
+        """
+        :param pixel: 有序且不重复的像素索引
+        :param depth: 每个像素的最小深度(mm)
+        """
+        self.__pixels.append((pixel, depth))
+        self.__count[pixel] += 1
+        old = self.__depth[pixel]
+        changed = depth < old
+        self.__write(pixel[changed], depth[changed], old[changed])
+
+    def pop(self):
+        """
+        出队最早的一条数据，只修正该条数据作为最小值的像素
+        """
+        pixel, depth = self.__pixels[0]
+        if len(pixel):
+            self.__count[pixel] -= 1
+            owned = self.__depth[pixel] == depth
+            pixel, depth = pixel[owned], depth[owned]
+            count = self.__count[pixel]
+            cleared = pixel[count == 0]
+            self.__write(cleared, np.full(len(cleared), EMPTY, dtype=np.uint16), depth[count == 0])
+            shared = pixel[count > 0]
+            if len(shared):
+                # 仍被其他数据覆盖的像素，在窗口内其余数据中重新取最小值
+                best = np.full(len(shared), EMPTY, dtype=np.uint16)
+                for other, other_depth in self.__pixels[1:]:
+                    if not len(other):
+                        continue
+                    position = np.searchsorted(other, shared)
+                    position[position == len(other)] = 0
+                    hit = other[position] == shared
+                    np.minimum(best, np.where(hit, other_depth[position], EMPTY), out=best)
+                self.__write(shared, best, depth[count > 0])
+        del self.__pixels[0]
+
+    def __write(self, pixel, depth, old):
+        """
+        修改像素深度，同时增量更新所在分块的深度和与有效像素数 \n
+        :param pixel: 像素索引
+        :param depth: 新深度(mm)
+        :param old: 原深度(mm)
+        """
+        if not len(pixel):
+            return
+        self.__depth[pixel] = depth
+        valid, old_valid = depth != EMPTY, old != EMPTY
+        v, u = np.divmod(pixel, self.size[1])
+        h, w = self.__cells.shape
+        cv, cu = v // self.cell, u // self.cell
+        delta = np.where(valid, depth, 0).astype(np.int64) - np.where(old_valid, old, 0)
+        delta <<= self.COUNT_BITS
+        delta += valid.astype(np.int64) - old_valid
+        np.add.at(self.__cells.reshape(-1), cv * w + cu, delta)
+        np.add.at(self.__lines, np.concatenate([v * w + cu, self.__rows.size + u * h + cv]), np.tile(delta, 2))
+        self.__integral = None
+
+    def __integral_image(self):
+        """
+        由分块生成积分图，没有修改时直接复用
+        """
+        if self.__integral is None:
+            h, w = self.__cells.shape
+            integral = np.zeros((h + 1, w + 1), dtype=np.int64)
+            np.cumsum(self.__cells, axis=0, out=integral[1:, 1:])
+            np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+            self.__integral = integral
+        return self.__integral
+
+    def get_mean_depth(self, boxes):
+        """
+        :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+        :return: (n,)的float64平均深度(mm)，ROI内没有深度时为nan
+        """
+        bound = _split_boxes(boxes, self.size)
+        num = len(bound)
+        # 行与列的范围拼在一起处理，前num个为行，后num个为列
+        start, end = bound[:, [0, 2]].T.reshape(-1), bound[:, [1, 3]].T.reshape(-1)
+        first, last, full = self.__inner(start, end)
+        lines, line_ok = self.__edges(start, end, first, last, full)
+        (cy0, cx0), (cy1, cx1) = first.reshape(2, num), last.reshape(2, num)
+        row_inner, col_inner = full.reshape(2, num)
+        # ROI内完整的分块
+        integral = self.__integral_image()
+        packed = integral[cy1, cx1] - integral[cy0, cx1] - integral[cy1, cx0] + integral[cy0, cx0]
+        packed[~(row_inner & col_inner)] = 0
+        # 分块以外的边缘行与边缘列，另一个方向为空的ROI没有像素
+        rows, cols = lines[:num], lines[num:]
+        row_ok, col_ok = line_ok[:num], line_ok[num:]
+        row_ok &= (end > start)[num:, None]
+        col_ok &= (end > start)[:num, None]
+        # 边缘行在内部列分块上的区间，与边缘列在内部行分块上的区间
+        h, w = self.__cells.shape
+        segment = np.concatenate([rows * w + cx0[:, None], self.__rows.size + cols * h + cy0[:, None]], axis=1)
+        length = np.concatenate([np.broadcast_to((cx1 - cx0)[:, None], rows.shape),
+                                 np.broadcast_to((cy1 - cy0)[:, None], cols.shape)], axis=1)
+        ok = np.concatenate([row_ok & col_inner[:, None], col_ok & row_inner[:, None]], axis=1)
+        owner = np.nonzero(ok)[0]
+        if len(owner):
+            segment, length = segment[ok], length[ok]
+            # 把各区间的元素依次取出，在连续的数组上分段求和
+            offset = np.cumsum(length) - length
+            index = np.repeat(segment - offset, length) + np.arange(offset[-1] + length[-1])
+            np.add.at(packed, owner, np.add.reduceat(self.__lines[index], offset))
+        n = packed & ((1 << self.COUNT_BITS) - 1)
+        total = (packed >> self.COUNT_BITS).astype(np.float64)
+        # 四角不足一个分块的像素
+        corner = row_ok[:, :, None] & col_ok[:, None, :]
+        owner, row, col = np.nonzero(corner)
+        depth = self.__depth[rows[owner, row] * self.size[1] + cols[owner, col]]
+        valid = depth != EMPTY
+        n += np.bincount(owner[valid], minlength=num)
+        total += np.bincount(owner[valid], weights=depth[valid], minlength=num)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / n
+
+    def __inner(self, start, end):
+        """
+        范围[start, end)内完整的分块[first, last)，没有完整分块时为[0, 0) \n
+        :return: (first, last, 是否有完整分块)
+        """
+        first, last = -(-start // self.cell), end // self.cell
+        ok = last > first
+        return np.where(ok, first, 0), np.where(ok, last, 0), ok
+
+    def __edges(self, start, end, first, last, ok):
+        """
+        范围[start, end)内不在完整分块中的行（或列），每个范围最多2 * cell - 2个，按2 * cell个位置展开 \n
+        :return: (行号, 是否有效)，均为(n, 2 * cell)
+        """
+        # 没有完整分块时整个范围都是边缘
+        inner_start, inner_end = np.where(ok, first * self.cell, end), np.where(ok, last * self.cell, end)
+        head, tail = inner_start - start, end - inner_end
+        k = np.arange(2 * self.cell)
+        lines = np.where(k < head[:, None], start[:, None] + k, inner_end[:, None] + k - head[:, None])
+        valid = k < (head + tail)[:, None]
+        return np.where(valid, lines, 0), valid
+
+    def get_box_samples(self, boxes):
+        """
+        取出所有ROI内的有效像素，每个ROI为一次连续切片 \n
+        :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+        :return: (box, depth)，每个像素所属的ROI编号与深度(mm)
+        """
+        depth = self.__depth.reshape(self.size[0], self.size[1])
+        samples = [depth[y0:y1, x0:x1].ravel() for y0, y1, x0, x1 in _split_boxes(boxes, self.size)]
+        samples = [sample[sample != EMPTY] for sample in samples]
+        box = np.repeat(np.arange(len(samples)), [len(sample) for sample in samples])
+        return box, np.concatenate(samples).astype(np.int64)
+
+    def get_depth_area(self, y0, y1, x0, x1):
+        """
+        :return: (y1 - y0, x1 - x0)的uint16深度(mm)，没有深度的像素为0xFFFF
+        """
+        return self.__depth.reshape(self.size[0], self.size[1])[y0:y1, x0:x1].copy()
+
+
+@register_store('sparse')
+class SparseDepthStore(object):
+    """
+    稀疏点存储 \n
+    窗口内所有数据的点打包为一个int64：所在分块的编码（行分块号 * 每行分块数 + 列分块号）、点在分块内的位置与深度(mm)，
+    整体保持有序，另有一个int32数组记录点所属数据的序号，每点12字节，不保存整幅深度图
+    （3088x2064时窗口内24万点约3MB，整幅深度图约19MB）。
+    入队只记下该条数据，出队只推进最早的序号；查询前把新数据排序后与已有的点归并，并去掉序号早于窗口的点，每次查询至多一次。
+    查询时每个ROI的每一行分块在有序数组中是连续的一段，二分查找得到起止位置后只取出这些点；
+    同一像素的点相邻且按深度排列，第一个即最小深度，结果与整幅深度图逐像素取最小一致，且ROI边界精确到像素。
+    """
+    DEPTH_BITS = 16
+
+    def __init__(self, size, cell=8):
+        """
+        :param size: 图像尺寸[height, width]
+        :param cell: 分块边长(像素)
+        """
+        self.size = size
+        self.cell = cell
+        self.__columns = -(-size[1] // cell)  # 每行分块数
+        self.__half = (cell - 1).bit_length()  # 分块内行、列位置各占的位数
+        self.__shift = 2 * self.__half + self.DEPTH_BITS  # 分块编码的位移
+        self.__record = np.zeros(0, dtype=np.int64)
+        self.__seq = np.zeros(0, dtype=np.int32)
+        self.__pending = []  # 尚未归并的(序号, 像素索引, 深度(mm))
+        self.__first = 0  # 窗口内最早一条数据的序号
+        self.__oldest = 0  # 已归并的点的最早序号的下界
+        self.__next = 0  # 下一条数据的序号
+
+    @property
+    def nbytes(self):
+        """
+        占用的内存(字节)
+        """
+        return self.__record.nbytes + self.__seq.nbytes + \
+            sum(pixel.nbytes + depth.nbytes for _, pixel, depth in self.__pending)
+
+    def push(self, pixel, depth):
+        """
+        :param pixel: 有序且不重复的像素索引
+        :param depth: 每个像素的最小深度(mm)
+        """
+        self.__pending.append((self.__next, pixel, depth))
+        self.__next += 1
+
+    def pop(self):
+        self.__first += 1
+        # 还没有归并就出队的数据直接丢弃
+        if self.__pending and self.__pending[0][0] < self.__first:
+            del self.__pending[0]
+
+    def __encode(self, pixel, depth):
+        """
+        :return: 打包的int64，(分块编码, 分块内位置, 深度)
+        """
+        v, u = np.divmod(pixel.astype(np.int64), self.size[1])
+        key = (v // self.cell) * self.__columns + u // self.cell
+        offset = ((v % self.cell) << self.__half) | (u % self.cell)
+        return (key << self.__shift) | (offset << self.DEPTH_BITS) | depth
+
+    def __decode(self, record):
+        """
+        :return: (v, u, depth)
+        """
+        key = record >> self.__shift
+        offset = (record >> self.DEPTH_BITS) & ((1 << (2 * self.__half)) - 1)
+        cy, cx = np.divmod(key, self.__columns)
+        v = cy * self.cell + (offset >> self.__half)
+        u = cx * self.cell + (offset & ((1 << self.__half) - 1))
+        return v, u, (record & ((1 << self.DEPTH_BITS) - 1)).astype(np.uint16)
+
+    def __refresh(self):
+        """
+        去掉窗口外的点，把新数据归并进有序的点数组
+        """
+        if self.__oldest < self.__first:
+            keep = self.__seq >= self.__first
+            self.__record, self.__seq = self.__record[keep], self.__seq[keep]
+            self.__oldest = self.__first
+        pending = [item for item in self.__pending if item[0] >= self.__first and len(item[1])]
+        self.__pending = []
+        if not pending:
+            return
+        record = self.__encode(np.concatenate([item[1] for item in pending]),
+                               np.concatenate([item[2] for item in pending]))
+        seq = np.repeat(np.array([item[0] for item in pending], dtype=np.int32), [len(item[1]) for item in pending])
+        order = np.argsort(record)
+        record, seq = record[order], seq[order]
+        # 新点在归并结果中的位置，其余位置按原顺序放已有的点
+        position = np.searchsorted(self.__record, record) + np.arange(len(record))
+        old = np.ones(len(self.__record) + len(record), dtype=bool)
+        old[position] = False
+        self.__record = _merge(self.__record, record, old, position)
+        self.__seq = _merge(self.__seq, seq, old, position)
+
+    def __gather(self, boxes):
+        """
+        取出所有ROI内的点，同一ROI中同一像素只保留最小深度 \n
+        :return: (box, v, u, depth)，每个点所属的ROI编号、像素坐标与深度(mm)
+        """
+        self.__refresh()
+        bound = _split_boxes(boxes, self.size)
+        y0, y1, x0, x1 = bound.T
+        empty = (y1 <= y0) | (x1 <= x0)
+        # 每个ROI覆盖的分块行
+        rows = np.where(empty, 0, -(-y1 // self.cell) - y0 // self.cell)
+        box = np.repeat(np.arange(len(bound)), rows)
+        row = y0[box] // self.cell + np.arange(len(box)) - np.repeat(np.cumsum(rows) - rows, rows)
+        start = np.searchsorted(self.__record, (row * self.__columns + x0[box] // self.cell) << self.__shift)
+        end = np.searchsorted(self.__record, (row * self.__columns - (-x1[box] // self.cell)) << self.__shift)
+        # 每一行分块对应有序数组中连续的一段，按ROI、行的顺序展开，展开后仍按(ROI, 像素, 深度)有序
+        length = end - start
+        box = np.repeat(box, length)
+        record = self.__record[np.arange(len(box)) - np.repeat(np.cumsum(length) - length - start, length)]
+        v, u, depth = self.__decode(record)
+        first = np.ones(len(box), dtype=bool)
+        pixel = record >> self.DEPTH_BITS
+        first[1:] = (box[1:] != box[:-1]) | (pixel[1:] != pixel[:-1])
+        first &= (v >= y0[box]) & (v < y1[box]) & (u >= x0[box]) & (u < x1[box])
+        return box[first], v[first], u[first], depth[first]
+
+    def get_mean_depth(self, boxes):
+        """
+        :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+        :return: (n,)的float64平均深度(mm)，ROI内没有深度时为nan
+        """
+        box, _, _, depth = self.__gather(boxes)
+        n = len(np.asarray(boxes).reshape(-1, 4))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.bincount(box, weights=depth, minlength=n) / np.bincount(box, minlength=n)
+
+    def get_box_samples(self, boxes):
+        """
+        :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+        :return: (box, depth)，每个像素所属的ROI编号与深度(mm)
+        """
+        box, _, _, depth = self.__gather(boxes)
+        return box, depth.astype(np.int64)
+
+    def get_depth_area(self, y0, y1, x0, x1):
+        """
+        :return: (y1 - y0, x1 - x0)的uint16深度(mm)，没有深度的像素为0xFFFF
+        """
+        area = np.full((max(y1 - y0, 0), max(x1 - x0, 0)), EMPTY, dtype=np.uint16)
+        _, v, u, depth = self.__gather([[y0, y1, x0, x1]])
+        area[v - y0, u - x0] = depth
+        return area
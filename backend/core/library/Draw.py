@@ -4,6 +4,7 @@ import cv2
 import numpy as np
 
 from core.library.EasyImportBase import ROOT
+from core.library.Tracer import Tracer
 from core.library.Utils import Singleton, RED, BLUE, normalize_dict
 
 """
@@ -43,6 +44,11 @@ class BEVHandler(Singleton):
 
     @classmethod
     def draw(cls):
+        with Tracer.span('bev_draw'):
+            cls.__draw()
+
+    @classmethod
+    def __draw(cls):
         bev = cls.bev.copy()
         robots = copy.deepcopy(cls.bus_handler.get('bev_points')['data'])
         cls.draw_robots(bev, normalize_dict(robots, cls.bg_ratio))
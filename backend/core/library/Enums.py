@@ -5,3 +5,11 @@ class EventBusItemType(enum.Enum):
     DATA = 1
     FUNCTION = 2
     CLASS = 3
+
+
+class LogLevel(enum.IntEnum):
+    OUTPUT = 0
+    INFO = 1
+    WARN = 2
+    DANGER = 3
+    MAIN = 4
@@ -1,9 +1,13 @@
 import abc
 import json
+import threading
+import time
 
 from core.library.CommandManager import CommandManager
 from core.library.Enums import EventBusItemType
+from core.library.FrameRingBuffer import FrameRef
 from core.library.PluginManager import PluginManager
+from core.library.Tracer import Tracer
 from core.library.Utils import ThreadSafeSingleton
 from core.utils.logger import Logger
 
@@ -43,9 +47,66 @@ class SubscribeEvent(object):
         self.__events.append(cls)
 
 
+class EventBusItem(object):
+    """
+    总线数据包，以`__slots__`固定字段，兼容`item['data']`形式的字典访问。\n
+    `version`为单调递增的版本号，每次`put`加一；`timestamp`为最近一次写入的时间戳(ns)。
+    """
+    __slots__ = ('key', 'data', 'type', 'version', 'timestamp')
+
+    def __init__(self, key, data, item_type, version=0, timestamp=0):
+        self.key = key
+        self.data = data
+        self.type = item_type
+        self.version = version
+        self.timestamp = timestamp
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+
+class EventBusSubscriber(object):
+    """
+    总线订阅者，记录上一次读到的版本号，每个新值只唤醒一次。
+    """
+
+    def __init__(self, key, version=None):
+        """
+        :param key: 订阅的键值
+        :param version: 起始版本号，默认为订阅时的当前版本，即只等待之后的新值
+        """
+        self.key = key
+        self.version = EventBus.get_version(key) if version is None else version
+
+    def wait(self, timeout=None):
+        """
+        阻塞等待新值 \n
+        :param timeout: 超时时间(s)，None为一直等待
+        :return: 数据包快照，超时返回None
+        """
+        item = EventBus.wait_for(self.key, self.version, timeout)
+        if item is not None:
+            self.version = item.version
+        return item
+
+
 # TODO 修改总线格式，完善注册、卸载消息机制
 class EventBus(ThreadSafeSingleton):
-    __items = []
+    __items = {}  # 键值到EventBusItem的哈希表
+    __conditions = {}  # 键值到条件变量的哈希表，put时唤醒等待者
+    __items_lock = threading.Lock()
+    __ring_bindings = {}  # 由共享内存帧缓冲区发布的键值到缓冲区键值的映射
+    __remote = None  # 子进程中指向主进程总线的客户端，本地未注册的键值通过它存取
+    __counters = {}  # 线程id到[读次数, 写次数]，供插件监控器按线程统计
     __plugins = []
     from core.library.EasyImportBase import ROOT
     __config_file = ROOT('data/config.json')
@@ -68,42 +129,148 @@ class EventBus(ThreadSafeSingleton):
 
     @classmethod
     def register(cls, item, key: str, item_type: EventBusItemType):
-        cls.__items.append({
-            'data': item,
-            'key': key,
-            'type': item_type
-        })
+        with cls.__items_lock:
+            if key in cls.__items:
+                Logger.warn(f'EventBus key {key} has been registered, skip.')
+                return
+            cls.__items[key] = EventBusItem(key, item, item_type, 0, time.time_ns())
+            cls.__conditions[key] = threading.Condition()
 
     @classmethod
     def register_with_all(cls, data):
-        cls.__items.append(data)
+        cls.register(data['data'], data['key'], data['type'])
 
     @classmethod
     def put(cls, key, data):
-        for item in cls.__items:
-            if item['key'] == key:
-                if item['type'] != EventBusItemType.DATA:
-                    raise ValueError('Only data can be update.')
-                else:
-                    item['data'] = data
+        cls.__count(1)
+        item = cls.__items.get(key)
+        if item is None:
+            if cls.__remote is not None:
+                cls.__remote.put(key, data)
+            return
+        if item.type != EventBusItemType.DATA:
+            raise ValueError('Only data can be update.')
+        cond = cls.__conditions[key]
+        with cond:
+            item.data = data
+            item.version += 1
+            item.timestamp = time.time_ns()
+            cond.notify_all()
 
     @classmethod
     def get(cls, key: str):
-        # TODO 改为HashMap
-        for item in cls.__items:
-            if item['key'] == key:
-                return item
-        return None
+        cls.__count(0)
+        item = cls.__items.get(key)
+        if item is None and cls.__remote is not None:
+            return cls.__remote.get(key)
+        return item
+
+    @classmethod
+    def get_version(cls, key: str):
+        """
+        获取键值当前的版本号，未注册返回-1 \n
+        :param key: 键值
+        """
+        item = cls.__items.get(key)
+        if item is None and cls.__remote is not None:
+            return cls.__remote.call('get_version', key)
+        return -1 if item is None else item.version
+
+    @classmethod
+    def wait_for(cls, key: str, since_version: int = -1, timeout=None):
+        """
+        阻塞等待键值的版本号大于since_version \n
+        :param key: 键值
+        :param since_version: 已读到的版本号
+        :param timeout: 超时时间(s)，None为一直等待
+        :return: 加锁时取得的数据包快照，超时或未注册返回None
+        """
+        cls.__count(0)
+        item = cls.__items.get(key)
+        if item is None:
+            if cls.__remote is not None:
+                with PluginManager.idle():
+                    return cls.__remote.wait_for(key, since_version, timeout)
+            return None
+        cond = cls.__conditions[key]
+        with cond, PluginManager.idle():
+            if not cond.wait_for(lambda: item.version > since_version, timeout):
+                return None
+            return EventBusItem(item.key, item.data, item.type, item.version, item.timestamp)
+
+    @classmethod
+    def get_counters(cls):
+        """
+        获取各线程的总线读写次数 \n
+        :return: {线程id: (读次数, 写次数)}
+        """
+        return {ident: tuple(counter) for ident, counter in list(cls.__counters.items())}
+
+    @classmethod
+    def __count(cls, index):
+        # 每个线程只修改自己的计数器，不需要加锁
+        counter = cls.__counters.get(threading.get_ident())
+        if counter is None:
+            counter = cls.__counters.setdefault(threading.get_ident(), [0, 0])
+        counter[index] += 1
+
+    @classmethod
+    def subscribe(cls, key: str, version=None):
+        """
+        订阅键值，返回订阅者，通过`wait`阻塞获取新值 \n
+        :param key: 键值
+        :param version: 起始版本号，默认为当前版本
+        """
+        return EventBusSubscriber(key, version)
+
+    @classmethod
+    def bind_ring(cls, key: str, ring_key: str):
+        """
+        声明键值的值为共享内存帧缓冲区中的帧，跨进程读取时直接从缓冲区挂载，不经过连接传输 \n
+        :param key: 帧键值，如camera_view
+        :param ring_key: 帧缓冲区键值，如camera_ring
+        """
+        cls.__ring_bindings[key] = ring_key
+
+    @classmethod
+    def get_ring_bindings(cls):
+        return dict(cls.__ring_bindings)
+
+    @classmethod
+    def acquire_frame(cls, key: str):
+        """
+        获取帧键值的引用，持有期间帧不会被相机覆盖，使用完毕需调用`release`或使用with语句。\n
+        总线中的帧是帧缓冲区的视图，不增加引用计数，相机写满一圈后会被原地覆盖，
+        除了逐帧订阅的检测外，读取帧的代码都应通过本接口获取 \n
+        :param key: 帧键值，如camera_view
+        :return: FrameRef，没有帧时返回None；未绑定帧缓冲区的键值返回不持有引用的FrameRef
+        """
+        ring_key = cls.__ring_bindings.get(key)
+        item = cls.get(key)
+        if ring_key is not None:
+            ring = cls.get(ring_key)
+            # 尺寸与帧缓冲区不一致、经过连接传输的值不在缓冲区中，直接返回该值
+            if ring is not None and ring['data'] is not None and \
+                    (item is None or item['data'] is None or ring['data'].accepts(item['data'])):
+                return ring['data'].acquire()
+        if item is None or item['data'] is None:
+            return None
+        return FrameRef(None, -1, item.version, item.timestamp, item.data)
+
+    @classmethod
+    def attach_remote(cls, remote):
+        """
+        子进程调用，将本地未注册的键值代理到主进程的总线 \n
+        :param remote: EventBusClient
+        """
+        cls.__remote = remote
+        cls.__ring_bindings.update(remote.call('get_ring_bindings'))
 
     @classmethod
     def remove(cls, key: str):
-        index = None
-        for _index, item in enumerate(cls.__items):
-            if item['key'] == key:
-                index = _index
-                break
-        if index is not None:
-            cls.__items.remove(index)
+        with cls.__items_lock:
+            cls.__items.pop(key, None)
+            cls.__conditions.pop(key, None)
 
     @classmethod
     def install_plugin(cls, plugin):
@@ -114,7 +281,7 @@ class EventBus(ThreadSafeSingleton):
 
     @classmethod
     def get_items(cls):
-        return cls.__items
+        return list(cls.__items.values())
 
     @classmethod
     def get_plugin(cls, plugin_name):
@@ -125,12 +292,22 @@ class EventBus(ThreadSafeSingleton):
 
     @classmethod
     def start(cls):
+        trace = cls.get('trace')
+        Tracer.set(**({} if trace is None else trace['data']))
         PluginManager.load_plugins(cls.__plugins)
-        PluginManager.run_plugins()
+        placement = cls.get('plugin_placement')
+        scheduler = cls.get('scheduler')
+        PluginManager.run_plugins(cls, None if placement is None else placement['data'],
+                                  None if scheduler is None else scheduler['data'])
+        monitor = cls.get('monitor')
+        PluginManager.monitor(cls, **({} if monitor is None else monitor['data']))
 
     @classmethod
     def stop(cls):
         PluginManager.uninstall_plugins()
+        trace = cls.get('trace')
+        if trace is not None and trace['data'].get('path'):
+            Tracer.save(trace['data']['path'])
 
     @classmethod
     def read_config_file(cls, config_files: str = None):
@@ -142,4 +319,7 @@ class EventBus(ThreadSafeSingleton):
             data = json.load(f)
             for k, v in data.items():
                 cls.register(v, k, EventBusItemType.DATA)
+        log = cls.get('log')
+        if log is not None:
+            Logger.set(**log['data'])
         Logger.main(f'EventBus load config file success.')
@@ -0,0 +1,194 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class FrameRef(object):
+    """
+    帧引用，持有期间对应槽位不会被相机覆盖，使用完毕需调用`release`或使用with语句。
+    """
+    __slots__ = ('ring', 'slot', 'frame_id', 'timestamp', 'data')
+
+    def __init__(self, ring, slot, frame_id, timestamp, data):
+        self.ring = ring
+        self.slot = slot
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.data = data  # 只读numpy视图
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.release(self.slot)
+            self.ring = None
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.release()
+
+
+class FrameRingBuffer(object):
+    """
+    基于共享内存的定长帧环形缓冲区。\n
+    相机在空闲槽位中原地写入图像，消费者（线程或进程）获得只读numpy视图，不发生拷贝和序列化。\n
+    共享内存布局：头部为int64表，第0行为[最新槽位, 最新帧号, 槽位数]，其余每行对应一个槽位[帧号, 时间戳(ns), 引用计数]；
+    头部之后按64字节对齐依次存放各槽位的图像数据。\n
+    跨进程使用时，将本对象作为进程参数传入即可在子进程中按名称重新挂载。
+    """
+    _ALIGN = 64
+
+    def __init__(self, shape, dtype=np.uint8, slots=4, name=None, create=True, lock=None):
+        """
+        :param shape: 单帧尺寸，如(h, w, 3)
+        :param dtype: 单帧数据类型
+        :param slots: 槽位数量，至少为同时持有帧的消费者数量加2
+        :param name: 共享内存名称，为空则自动生成
+        :param create: 是否创建共享内存，False为挂载已有的共享内存
+        :param lock: 跨进程锁，为空则新建
+        """
+        assert slots >= 2, 'FrameRingBuffer needs at least 2 slots.'
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self._lock = multiprocessing.get_context('spawn').Lock() if lock is None else lock
+        self._owner = create
+        self._frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._stride = -(-self._frame_bytes // self._ALIGN) * self._ALIGN
+        header_bytes = (slots + 1) * 3 * 8
+        self._offset = -(-header_bytes // self._ALIGN) * self._ALIGN
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=self._offset + self._stride * slots)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._header = np.ndarray((slots + 1, 3), dtype=np.int64, buffer=self._shm.buf)
+        self._frames = [np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf,
+                                   offset=self._offset + i * self._stride) for i in range(slots)]
+        if create:
+            self._header[:] = 0
+            self._header[0] = [-1, -1, slots]
+            self._header[1:, 0] = -1
+
+    def __getstate__(self):
+        return {'shape': self.shape, 'dtype': self.dtype.str, 'slots': self.slots, 'name': self.name,
+                'lock': self._lock}
+
+    def __setstate__(self, state):
+        self.__init__(state['shape'], state['dtype'], state['slots'], state['name'], False, state['lock'])
+
+    def acquire_write(self):
+        """
+        获取一个可写入的空闲槽位，跳过最新帧和仍被引用的槽位，优先选择最旧的帧 \n
+        :return: (槽位, 可写视图)，没有空闲槽位时返回(None, None)
+        """
+        with self._lock:
+            latest = self._header[0, 0]
+            slot, oldest = None, None
+            for i in range(self.slots):
+                frame_id, _, ref = self._header[i + 1]
+                if i == latest or ref != 0:
+                    continue
+                if oldest is None or frame_id < oldest:
+                    slot, oldest = i, frame_id
+            if slot is None:
+                return None, None
+            # 写入期间标记为占用，防止被其他写者选中
+            self._header[slot + 1, 2] = -1
+        return slot, self._frames[slot]
+
+    def commit(self, slot, timestamp=None):
+        """
+        提交写入完成的槽位，使其成为最新帧 \n
+        :param slot: acquire_write返回的槽位
+        :param timestamp: 采集时间戳(ns)，为空则取当前时间
+        :return: 帧号
+        """
+        with self._lock:
+            frame_id = self._header[0, 1] + 1
+            self._header[slot + 1] = [frame_id, time.time_ns() if timestamp is None else timestamp, 0]
+            self._header[0, :2] = [slot, frame_id]
+        return int(frame_id)
+
+    def abort(self, slot):
+        """
+        放弃写入，归还acquire_write获取的槽位
+        """
+        with self._lock:
+            self._header[slot + 1, 2] = 0
+
+    def write(self, img, timestamp=None):
+        """
+        将已有的图像拷贝进环形缓冲区，无法原地写入的相机使用 \n
+        :return: 帧号，没有空闲槽位时返回-1
+        """
+        if not self.accepts(img):
+            raise ValueError(f'Frame of shape {np.shape(img)} and dtype {np.asarray(img).dtype} does not match '
+                             f'the ring buffer of shape {self.shape} and dtype {self.dtype}.')
+        slot, buf = self.acquire_write()
+        if slot is None:
+            return -1
+        try:
+            np.copyto(buf, img)
+        except BaseException:
+            self.abort(slot)
+            raise
+        return self.commit(slot, timestamp)
+
+    def accepts(self, img):
+        """
+        图像的尺寸与数据类型是否与帧缓冲区一致，可以写入
+        """
+        return tuple(np.shape(img)) == self.shape and np.asarray(img).dtype == self.dtype
+
+    def acquire(self, since_frame_id=-1):
+        """
+        获取最新帧的引用，持有期间该槽位不会被覆盖 \n
+        :param since_frame_id: 已读到的帧号，最新帧不比它新时返回None
+        :return: FrameRef或None
+        """
+        with self._lock:
+            slot, frame_id, _ = self._header[0]
+            if slot < 0 or frame_id <= since_frame_id:
+                return None
+            self._header[slot + 1, 2] += 1
+            timestamp = int(self._header[slot + 1, 1])
+        return FrameRef(self, int(slot), int(frame_id), timestamp, self.view(slot))
+
+    def release(self, slot):
+        with self._lock:
+            self._header[slot + 1, 2] -= 1
+
+    def view(self, slot):
+        """
+        获取槽位的只读视图，不增加引用计数
+        """
+        v = self._frames[slot].view()
+        v.flags.writeable = False
+        return v
+
+    def latest(self):
+        """
+        获取最新帧的只读视图，不增加引用计数，没有帧时返回None
+        """
+        slot = int(self._header[0, 0])
+        return None if slot < 0 else self.view(slot)
+
+    def latest_frame_id(self):
+        return int(self._header[0, 1])
+
+    def close(self):
+        self._header = None
+        self._frames = []
+        try:
+            self._shm.close()
+        except BufferError:
+            # 仍有消费者持有视图，由进程退出时释放
+            pass
+
+    def unlink(self):
+        if self._owner:
+            self._shm.unlink()
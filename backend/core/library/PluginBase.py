@@ -1,6 +1,7 @@
 import abc
 
 from core.library.EventBusBase import EventBus
+from core.library.PluginManager import PluginManager
 
 
 # TODO 修改插件注册方式和插件结构
@@ -28,6 +29,20 @@ class PluginBase(metaclass=abc.ABCMeta):
         """
         pass
 
+    @classmethod
+    def prepare_worker(cls):
+        """
+        插件运行在子进程中时，创建子进程前在主进程中调用，用于创建需要跨进程共享的资源，如共享内存帧缓冲区
+        """
+        pass
+
+    @classmethod
+    def release_worker(cls):
+        """
+        插件运行在子进程中时，子进程退出后在主进程中调用，释放prepare_worker创建的资源
+        """
+        pass
+
     @classmethod
     def register(cls, value, key, item_type):
         """
@@ -48,3 +63,24 @@ class PluginBase(metaclass=abc.ABCMeta):
         插件向总线获取值
         """
         return EventBus.get(key)
+
+    @classmethod
+    def subscribe(cls, key, version=None):
+        """
+        插件向总线订阅值，返回订阅者
+        """
+        return EventBus.subscribe(key, version)
+
+    @classmethod
+    def wait_for(cls, key, since_version=-1, timeout=None):
+        """
+        插件阻塞等待总线上的新值
+        """
+        return EventBus.wait_for(key, since_version, timeout)
+
+    @classmethod
+    def tick(cls, sleep=True):
+        """
+        插件每次循环结束时调用，由调度器控制循环频率
+        """
+        return PluginManager.tick(cls.plugin_name, sleep)
@@ -0,0 +1,209 @@
+import importlib
+import multiprocessing
+import os
+import threading
+from multiprocessing.connection import Listener, Client
+
+from core.utils.logger import Logger
+
+"""
+多进程插件宿主
+插件可以按配置运行在独立的子进程中，子进程中的总线接口通过本地连接代理到主进程的总线，插件代码无需修改。
+"""
+
+# 统一使用spawn，子进程为干净的解释器，不继承主进程总线中的值，与Windows下的行为一致
+_context = multiprocessing.get_context('spawn')
+
+
+class EventBusServer(object):
+    """
+    总线服务端，运行在主进程中，为子进程的每个线程提供一条独立连接
+    """
+    # 子进程可以调用的总线接口
+    _METHODS = frozenset(['get', 'put', 'wait_for', 'get_version', 'register', 'remove', 'get_ring_bindings'])
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.authkey = os.urandom(16)
+        self.listener = Listener(authkey=self.authkey)
+        self.address = self.listener.address
+        self.thread = threading.Thread(target=self.__accept_thread, daemon=True)
+        self.thread.start()
+
+    def __accept_thread(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                break
+            threading.Thread(target=self.__serve_thread, args=(conn,), daemon=True).start()
+
+    def __serve_thread(self, conn):
+        bindings = self.bus.get_ring_bindings()
+        ring_keys = set(bindings.values())
+        while True:
+            try:
+                method, args = conn.recv()
+            except (EOFError, OSError):
+                break
+            if method not in self._METHODS:
+                conn.send(('err', AttributeError(f'EventBus has no remote method {method}.')))
+                continue
+            if method in ('get', 'wait_for') and args[0] in ring_keys:
+                # 帧缓冲区持有进程锁，只能在创建子进程时传入
+                conn.send(('err', RuntimeError(f'EventBus key {args[0]} is a shared memory frame ring and cannot be '
+                                               f'sent over the connection, it is attached to workers at spawn.')))
+                continue
+            try:
+                if method == 'put' and args[0] in bindings and args[1] is None:
+                    # 子进程已将帧写入共享内存帧缓冲区，主进程总线发布缓冲区中最新帧的视图
+                    ring = self.bus.get(bindings[args[0]])
+                    if ring is not None and ring['data'] is not None:
+                        args = (args[0], ring['data'].latest())
+                res = getattr(self.bus, method)(*args)
+                # 共享内存帧缓冲区发布的值不经过连接传输，由子进程从本地挂载的缓冲区读取
+                if method in ('get', 'wait_for') and res is not None and args[0] in bindings:
+                    res = type(res)(res.key, None, res.type, res.version, res.timestamp)
+                conn.send(('ok', res))
+            except Exception as e:
+                conn.send(('err', e))
+        conn.close()
+
+    def close(self):
+        self.listener.close()
+
+
+class EventBusClient(object):
+    """
+    总线客户端，运行在子进程中，每个线程持有一条到主进程的连接
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.__local = threading.local()
+        self.__bindings = self.call('get_ring_bindings')
+
+    def call(self, method, *args):
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self.__local.conn = conn
+        conn.send((method, args))
+        status, res = conn.recv()
+        if status == 'err':
+            raise res
+        return res
+
+    def get(self, key):
+        return self.__resolve(key, self.call('get', key))
+
+    def put(self, key, data):
+        ring_key = self.__bindings.get(key)
+        if ring_key is not None and data is not None:
+            from core.library.EventBusBase import EventBus
+            ring = EventBus.get(ring_key)
+            # 尺寸或类型与帧缓冲区不一致的图像（如放大后的检测结果）仍经过连接传输
+            if ring is not None and ring['data'] is not None and ring['data'].accepts(data):
+                # 大图像写入本地挂载的共享内存帧缓冲区，连接上只传输通知，没有空闲槽位时丢弃本帧
+                if ring['data'].write(data) < 0:
+                    return
+                data = None
+        self.call('put', key, data)
+
+    def wait_for(self, key, since_version, timeout):
+        return self.__resolve(key, self.call('wait_for', key, since_version, timeout))
+
+    def __resolve(self, key, item):
+        ring_key = self.__bindings.get(key)
+        if item is None or ring_key is None:
+            return item
+        from core.library.EventBusBase import EventBus
+        ring = EventBus.get(ring_key)
+        if ring is not None and ring['data'] is not None:
+            item.data = ring['data'].latest()
+        return item
+
+
+def _worker_main(name, plugins, items, address, authkey, stop_event):
+    """
+    子进程入口，注册随进程传入的本地值，代理总线并启动插件
+    """
+    from core.library.EventBusBase import EventBus
+    from core.library.Tracer import Tracer
+    for item in items:
+        EventBus.register(item.data, item.key, item.type)
+    EventBus.attach_remote(EventBusClient(address, authkey))
+    plugins = [getattr(importlib.import_module(module), cls_name) for module, cls_name in plugins]
+    from core.library.PluginManager import PluginManager
+    log = EventBus.get('log')
+    log = {} if log is None else dict(log['data'])
+    if log.get('path'):
+        # 每个进程写自己的日志文件，避免滚动时互相覆盖
+        root, ext = os.path.splitext(log['path'])
+        log['path'] = f'{root}.{name}{ext}'
+    Logger.set(**log)
+    trace = EventBus.get('trace')
+    trace = {} if trace is None else dict(trace['data'])
+    if trace.get('path'):
+        # 每个进程保存自己的追踪记录，由导出工具合并
+        root, ext = os.path.splitext(trace['path'])
+        trace['path'] = f'{root}.{name}{ext}'
+    Tracer.set(**trace)
+    scheduler = EventBus.get('scheduler')
+    PluginManager.get_scheduler().set(plugins, None if scheduler is None else scheduler['data'])
+    for plugin in plugins:
+        plugin.start()
+    monitor = EventBus.get('monitor')
+    PluginManager.monitor(EventBus, key=f'plugin_monitor_{name}', **({} if monitor is None else monitor['data']))
+    Logger.info(f'Worker {name} started plugins {[plugin.plugin_name for plugin in plugins]} in pid {os.getpid()}.')
+    stop_event.wait()
+    for plugin in plugins:
+        plugin.uninstall()
+    if trace.get('path'):
+        Tracer.save(trace['path'])
+
+
+class PluginProcess(object):
+    """
+    插件进程，同一进程中的插件共享一个解释器
+    """
+
+    def __init__(self, name, plugins, local_keys, server):
+        """
+        :param name: 进程名称
+        :param plugins: 运行在本进程中的插件
+        :param local_keys: 随进程传入并保存在子进程本地的键值，
+            如需要原地修改的对象，这些值在子进程中的修改不会同步回主进程；
+            通过EventBus.bind_ring绑定的共享内存帧缓冲区总是随进程传入，不需要列出
+        :param server: 总线服务端
+        """
+        self.name = name
+        self.plugins = plugins
+        self.local_keys = local_keys
+        self.server = server
+        self.stop_event = _context.Event()
+        self.process = None
+
+    def start(self):
+        items = [self.server.bus.get(key) for key in self.local_keys]
+        missing = [key for key, item in zip(self.local_keys, items) if item is None]
+        if missing:
+            Logger.warn(f'Worker {self.name} local keys {missing} are not registered, skip.')
+        # 帧缓冲区持有进程锁，无法经过连接获取，创建子进程时随进程传入
+        for key in dict.fromkeys(self.server.bus.get_ring_bindings().values()):
+            item = self.server.bus.get(key)
+            if key not in self.local_keys and item is not None and item['data'] is not None:
+                items.append(item)
+        self.process = _context.Process(
+            target=_worker_main, name=f'plugin-{self.name}', daemon=False,
+            args=(self.name, [(p.__module__, p.__name__) for p in self.plugins],
+                  [item for item in items if item is not None], self.server.address, self.server.authkey,
+                  self.stop_event))
+        self.process.start()
+
+    def stop(self, timeout=3):
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
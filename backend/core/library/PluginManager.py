@@ -1,4 +1,10 @@
+import threading
+import time
+
 from core.library.Enums import EventBusItemType
+from core.library.PluginHost import EventBusServer, PluginProcess
+from core.library.PluginMonitor import PluginMonitor
+from core.library.PluginScheduler import PluginScheduler
 from core.library.Utils import Singleton
 from core.utils.logger import Logger
 
@@ -8,6 +14,10 @@ class PluginManager(Singleton):
     插件管理器，用来创建、管理、监控插件。
     """
     __plugins = []
+    __processes = {}  # 进程名称到插件进程
+    __server = None  # 子进程总线服务端
+    __scheduler = PluginScheduler()  # 插件调度器
+    __monitor = None  # 插件监控器
 
     def __init__(self):
         super().__init__()
@@ -25,15 +35,42 @@ class PluginManager(Singleton):
             cls.__plugins.append(plugin)
 
     @classmethod
-    def run_plugins(cls):
+    def run_plugins(cls, bus=None, placement=None, scheduler=None):
         """
-        运行插件
+        运行插件，未配置进程的插件以线程运行在主进程中 \n
+        :param bus: 总线，子进程通过它代理总线接口
+        :param placement: 插件进程配置，格式：{插件名称: {"worker": 进程名称, "local_keys": [键值, ...]}}，
+            同一进程名称的插件运行在同一子进程中
+        :param scheduler: 插件调度配置，见PluginScheduler.set
         """
+        placement = placement or {}
         Logger.info(f'Found Plugins {[plugin.plugin_name for plugin in cls.__plugins]}.')
+        cls.__scheduler.set(cls.__plugins, scheduler)
+        workers = {}
         for plugin in cls.__plugins:
-
+            conf = placement.get(plugin.plugin_name)
+            if conf is None:
                 plugin.start()
-
+            else:
+                worker = workers.setdefault(conf['worker'], ([], []))
+                worker[0].append(plugin)
+                worker[1].extend(conf.get('local_keys', []))
+        # 主进程插件启动后再创建子进程，保证随进程传入的本地值已经就绪
+        if workers:
+            assert bus is not None, 'Running plugins in worker processes needs the EventBus.'
+            for plugins, _ in workers.values():
+                for plugin in plugins:
+                    plugin.prepare_worker()
+            if cls.__server is None:
+                cls.__server = EventBusServer(bus)
+            for name, (plugins, local_keys) in workers.items():
+                # 子进程的监控结果发布在主进程总线上，由主进程的监控器合并
+                if bus.get(f'plugin_monitor_{name}') is None:
+                    bus.register(None, f'plugin_monitor_{name}', EventBusItemType.DATA)
+                process = PluginProcess(name, plugins, list(dict.fromkeys(local_keys)), cls.__server)
+                process.start()
+                cls.__processes[name] = process
+                Logger.info(f'Plugins {[plugin.plugin_name for plugin in plugins]} run in worker {name}.')
         Logger.info(f'All Plugins are active.')
 
     @classmethod
@@ -42,20 +79,83 @@ class PluginManager(Singleton):
         卸载插件，可根据提供的插件名称进行卸载 \n
         :param plugin_name: 插件名称，默认为空
         """
-        if plugin_name:
-            for plugin in cls.__plugins:
-                if plugin.plugin_name == plugin_name:
-                    plugin.uninstall()
-        else:
-            for plugin in cls.__plugins:
+        hosted = [p.plugin_name for process in cls.__processes.values() for p in process.plugins]
+        for name, process in list(cls.__processes.items()):
+            names = [plugin.plugin_name for plugin in process.plugins]
+            if plugin_name is None or plugin_name in names:
+                # 子进程中的插件随进程一起卸载
+                process.stop()
+                del cls.__processes[name]
+        for plugin in cls.__plugins:
+            if plugin.plugin_name in hosted:
+                if plugin_name is None or plugin.plugin_name == plugin_name:
+                    plugin.release_worker()
+                continue
+            if plugin_name is None or plugin.plugin_name == plugin_name:
                 plugin.uninstall()
 
+    @classmethod
+    def tick(cls, plugin_name, sleep=True, token=None):
+        """
+        插件每次循环结束时调用，按调度器分配的频率和CPU预算休眠 \n
+        :param plugin_name: 插件名称
+        :param sleep: 是否在本函数中休眠，协程中传入False并自行等待返回的时间
+        :param token: register_loop得到的令牌，同一线程中有多个循环（协程）时使用
+        :return: 需要休眠的时间(s)
+        """
+        return cls.__scheduler.tick(plugin_name, sleep, token)
+
+    @classmethod
+    def register_loop(cls, plugin_name):
+        """
+        为协程等共用线程的循环注册独立的调度状态，循环结束时调用unregister_loop \n
+        :return: 令牌
+        """
+        return cls.__scheduler.register(plugin_name)
+
+    @classmethod
+    def unregister_loop(cls, token):
+        cls.__scheduler.unregister(token)
+
+    @classmethod
+    def idle(cls):
+        """
+        插件阻塞等待输入时使用的上下文，等待时间不计入循环耗时，不会被调度器误判为资源不足
+        """
+        return cls.__scheduler.idle()
+
+    @classmethod
+    def get_scheduler(cls):
+        return cls.__scheduler
+
     @staticmethod
     def register(target_plugin, item, key, data: EventBusItemType):
         target_plugin.register(item, key, data)
 
-    def monitor(self):
+    @classmethod
+    def monitor(cls, bus, interval=1., key='plugin_monitor'):
         """
-        插件监控器，监控插件使用的资源。
+        插件监控器，监控插件使用的资源。\n
+        每隔interval采样各插件的循环频率、耗时分位数、CPU占用、常驻内存和总线读写次数，发布到总线中，
+        子进程中的插件由子进程的监控器采样，主进程合并后一起发布 \n
+        :param bus: 总线
+        :param interval: 采样间隔(s)
+        :param key: 发布监控结果的键值
         """
-        pass
+        if cls.__monitor is not None:
+            return
+        if bus.get(key) is None:
+            bus.register(None, key, EventBusItemType.DATA)
+        cls.__monitor = PluginMonitor(cls.__scheduler)
+        threading.Thread(target=cls.__monitor_thread, args=(bus, interval, key), daemon=True).start()
+
+    @classmethod
+    def __monitor_thread(cls, bus, interval, key):
+        while True:
+            time.sleep(interval)
+            stats = cls.__monitor.sample(bus)
+            for name in list(cls.__processes):
+                item = bus.get(f'plugin_monitor_{name}')
+                if item is not None and item['data']:
+                    stats.update(item['data'])
+            bus.put(key, stats)
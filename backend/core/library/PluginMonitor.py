@@ -0,0 +1,80 @@
+import os
+import time
+
+import numpy as np
+
+
+def _rss():
+    """
+    当前进程的常驻内存(byte)
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # 非Linux系统取峰值常驻内存，macOS单位为byte，其余为KB
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname().sysname == 'Darwin' else rss * 1024
+    except ImportError:
+        return None
+
+
+class PluginMonitor(object):
+    """
+    插件监控器，按插件统计循环频率、单次循环耗时分位数、线程CPU占用、所在进程的常驻内存和总线读写次数。\n
+    循环频率、耗时和CPU时间来自插件每次循环调用的`tick`，总线读写次数按线程统计，再通过调度器记录的线程归属到插件。
+    """
+
+    def __init__(self, scheduler):
+        """
+        :param scheduler: 插件调度器
+        """
+        self.scheduler = scheduler
+        self.__last_wall = None
+        self.__last = {}  # 插件名称到上一次采样的(CPU时间, 读次数, 写次数)
+
+    def sample(self, bus):
+        """
+        采样一次 \n
+        :param bus: 总线，读取各线程的读写次数
+        :return: {插件名称: 统计信息}
+        """
+        wall = time.perf_counter()
+        interval = None if self.__last_wall is None else wall - self.__last_wall
+        self.__last_wall = wall
+        counters = bus.get_counters()
+        rss = _rss()
+        res = {}
+        for name, s in self.scheduler.stats().items():
+            reads = sum(counters.get(ident, (0, 0))[0] for ident in s['threads'])
+            writes = sum(counters.get(ident, (0, 0))[1] for ident in s['threads'])
+            last = self.__last.get(name)
+            self.__last[name] = (s['cpu_time'], reads, writes)
+            latency = np.array(s['latency']) * 1000 if s['latency'] else None
+            stat = {
+                'pid': os.getpid(),
+                'rate': round(s['rate'], 2),
+                'target_rate': self.scheduler.target_rate(name),
+                'latency_ms': None if latency is None else {
+                    'p50': round(float(np.percentile(latency, 50)), 3),
+                    'p95': round(float(np.percentile(latency, 95)), 3),
+                    'p99': round(float(np.percentile(latency, 99)), 3),
+                    'max': round(float(latency.max()), 3)
+                },
+                'cpu_time': round(s['cpu_time'], 3),
+                'cpu': None,  # 占用的CPU核数
+                'rss': rss,  # 所在进程的常驻内存(byte)，同一进程中的插件共享
+                'bus_reads': reads,
+                'bus_writes': writes,
+                'bus_read_rate': None,
+                'bus_write_rate': None
+            }
+            if last is not None and interval:
+                stat['cpu'] = round((s['cpu_time'] - last[0]) / interval, 3)
+                stat['bus_read_rate'] = round((reads - last[1]) / interval, 2)
+                stat['bus_write_rate'] = round((writes - last[2]) / interval, 2)
+            res[name] = stat
+        return res
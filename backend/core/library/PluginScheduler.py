@@ -0,0 +1,246 @@
+import collections
+import contextlib
+import itertools
+import os
+import threading
+import time
+
+from core.utils.logger import Logger
+
+
+class _LoopState(object):
+    """
+    插件循环线程的调度状态
+    """
+    __slots__ = ('name', 'last_wall', 'last_release', 'last_cpu', 'rate', 'count', 'window_start', 'window_work',
+                 'window_loops', 'work', 'latency', 'cpu_time', 'affinity_applied')
+
+    def __init__(self, name):
+        self.name = name
+        self.last_wall = None  # 上一次tick的时刻
+        self.last_release = None  # 上一次tick休眠结束的时刻
+        self.last_cpu = None
+        self.rate = None  # 上一个统计窗口的实际循环频率(Hz)
+        self.count = 0
+        self.window_start = None
+        self.window_work = 0.
+        self.window_loops = 0
+        self.work = None  # 上一个统计窗口的平均单次循环耗时(s)，不含休眠与等待输入
+        self.latency = collections.deque(maxlen=256)  # 最近各次循环的耗时(s)，不含休眠与等待输入
+        self.cpu_time = 0.  # 累计线程CPU时间(s)
+        self.affinity_applied = False
+
+
+class PluginScheduler(object):
+    """
+    插件调度器，按插件优先级分配循环频率、CPU预算和CPU核心。\n
+    插件在每次循环结束时调用`tick`，调度器根据目标频率和CPU预算计算需要休眠的时间；
+    当高优先级插件（反投影、预警）的单次循环耗时（不含休眠与等待输入）长到无法达到目标频率时，判定为资源不足，
+    逐级降低低优先级插件（如websocket视频）的频率，恢复后再逐级放开。
+    事件驱动的插件输入不足时（如检测帧率低于目标频率）循环在等待输入中空闲，耗时不变，不会触发降级。
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__states = {}  # (插件名称, 线程id或令牌)到循环状态
+        self.__tokens = itertools.count(-1, -1)  # 令牌为负数，与线程id区分
+        self.__idle = threading.local()  # 各线程在本次循环中等待输入的时间(s)
+        self.__plugins = {}  # 插件名称到{priority, rate, budget, min_rate}
+        self.__cores = {}  # 优先级到CPU核心列表
+        self.__shed_level = 0
+        self.__last_check = 0.
+        self.shed_ratio = 0.8  # 按循环耗时可达到的频率低于目标频率的比例时判定为资源不足
+        self.max_shed_level = 3  # 最大降级次数，每级频率减半
+        self.check_interval = 0.5  # 降级检查间隔(s)
+
+    def set(self, plugins, config=None):
+        """
+        :param plugins: 插件列表，读取其plugin_name和priority
+        :param config: 调度配置，格式：{"plugins": {插件名称: {"rate": Hz, "budget": 核, "min_rate": Hz}}, "cores": {优先级: [核心]}}
+        """
+        config = config or {}
+        self.shed_ratio = config.get('shed_ratio', self.shed_ratio)
+        self.max_shed_level = config.get('max_shed_level', self.max_shed_level)
+        self.__cores = {int(k): v for k, v in config.get('cores', {}).items()}
+        conf = config.get('plugins', {})
+        for plugin in plugins:
+            # -1为自动设置，按普通优先级处理
+            priority = 1 if plugin.priority == -1 else plugin.priority
+            c = conf.get(plugin.plugin_name, {})
+            self.__plugins[plugin.plugin_name] = {
+                'priority': priority,
+                'rate': c.get('rate'),
+                'budget': c.get('budget', 1.),
+                'min_rate': c.get('min_rate', 1.)
+            }
+
+    def target_rate(self, name):
+        """
+        插件当前的目标频率(Hz)，考虑降级，None为不限制
+        """
+        p = self.__plugins.get(name)
+        if p is None or p['rate'] is None:
+            return None
+        if self.__shed_level and p['priority'] < self.__critical_priority():
+            return max(p['min_rate'], p['rate'] / (2 ** self.__shed_level))
+        return p['rate']
+
+    def register(self, name):
+        """
+        为插件的一个循环注册独立的调度状态，同一线程中的多个协程（如每个websocket连接）各自注册 \n
+        :param name: 插件名称
+        :return: 令牌，传给tick与unregister
+        """
+        with self.__lock:
+            token = next(self.__tokens)
+            self.__states[(name, token)] = _LoopState(name)
+        return token
+
+    def unregister(self, token):
+        """
+        循环结束时注销register得到的令牌
+        """
+        with self.__lock:
+            for key in [key for key in self.__states if key[1] == token]:
+                del self.__states[key]
+
+    @contextlib.contextmanager
+    def idle(self):
+        """
+        插件循环中阻塞等待输入时使用，等待的时间不计入循环耗时
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.__idle.time = getattr(self.__idle, 'time', 0.) + time.perf_counter() - start
+
+    def tick(self, name, sleep=True, token=None):
+        """
+        插件每次循环结束时调用 \n
+        :param name: 插件名称
+        :param sleep: 是否在本函数中休眠，协程中应传入False并自行await asyncio.sleep
+        :param token: register得到的令牌，为空则按调用线程区分循环
+        :return: 需要休眠的时间(s)
+        """
+        if token is None:
+            key = (name, threading.get_ident())
+            # 协程不阻塞等待，等待输入的时间只属于线程
+            idle, self.__idle.time = getattr(self.__idle, 'time', 0.), 0.
+        else:
+            key, idle = (name, token), 0.
+        state = self.__states.get(key)
+        if state is None:
+            with self.__lock:
+                state = self.__states.setdefault(key, _LoopState(name))
+        if not state.affinity_applied:
+            self.__apply_affinity(name)
+            state.affinity_applied = True
+        wall, cpu = time.perf_counter(), time.thread_time()
+        delay = 0.
+        # 按统计窗口计算实际频率
+        if state.window_start is None:
+            state.window_start = wall
+        elif wall - state.window_start >= self.check_interval:
+            state.rate = state.count / (wall - state.window_start)
+            state.work = state.window_work / state.window_loops if state.window_loops else None
+            state.count, state.window_start = 0, wall
+            state.window_work, state.window_loops = 0., 0
+        state.count += 1
+        if state.last_wall is not None:
+            # 本次循环的耗时，不含上一次的休眠
+            elapsed = wall - state.last_release
+            used = cpu - state.last_cpu
+            work = max(elapsed - idle, 0.)
+            state.latency.append(work)
+            state.window_work += work
+            state.window_loops += 1
+            state.cpu_time += used
+            p = self.__plugins.get(name)
+            if p is not None:
+                rate = self.target_rate(name)
+                if rate is not None:
+                    delay = max(delay, 1. / rate - elapsed)
+                # 按CPU预算限制占空比
+                if p['budget'] > 0:
+                    delay = max(delay, used / p['budget'] - elapsed)
+        self.__check_shed(wall)
+        state.last_wall = wall
+        state.last_release = wall + max(delay, 0.)
+        if sleep and delay > 0:
+            time.sleep(delay)
+            # 以实际醒来的时刻为准，休眠超时不计入下一次循环的耗时
+            state.last_release = time.perf_counter()
+        state.last_cpu = cpu
+        return max(delay, 0.)
+
+    def rates(self):
+        """
+        各插件循环线程的实际频率(Hz)
+        """
+        res = {}
+        now = time.perf_counter()
+        for (name, _), state in list(self.__states.items()):
+            rate = state.rate
+            # 循环卡住时不再tick，按当前窗口计算
+            if state.window_start is not None and now - state.window_start > 2 * self.check_interval:
+                rate = state.count / (now - state.window_start)
+            if rate is not None:
+                res[name] = res.get(name, 0.) + rate
+        return res
+
+    def stats(self):
+        """
+        各插件循环线程的统计信息，同一插件的多个线程合并 \n
+        :return: {插件名称: {"rate": Hz, "latency": [耗时(s), ...], "cpu_time": s, "threads": [线程id, ...]}}
+        """
+        res = {}
+        rates = self.rates()
+        for (name, ident), state in list(self.__states.items()):
+            s = res.setdefault(name, {'rate': rates.get(name, 0.), 'latency': [], 'cpu_time': 0., 'threads': []})
+            s['latency'].extend(state.latency)
+            s['cpu_time'] += state.cpu_time
+            s['threads'].append(ident)
+        return res
+
+    def shed_level(self):
+        return self.__shed_level
+
+    def __critical_priority(self):
+        return max([p['priority'] for p in self.__plugins.values()], default=0)
+
+    def __check_shed(self, now):
+        if now - self.__last_check < self.check_interval:
+            return
+        with self.__lock:
+            if now - self.__last_check < self.check_interval:
+                return
+            self.__last_check = now
+            critical = self.__critical_priority()
+            pressure = {}
+            for (name, _), state in list(self.__states.items()):
+                p = self.__plugins.get(name)
+                if p is None or p['priority'] < critical or p['rate'] is None or state.work is None:
+                    continue
+                # 最近没有循环的插件（等待输入或已停止）不参与判定
+                if now - state.window_start > 2 * self.check_interval:
+                    continue
+                # 单次循环的耗时对应的可达频率低于目标频率的比例，说明插件在争抢CPU
+                if state.work * p['rate'] * self.shed_ratio > 1.:
+                    pressure[name] = state.work
+            if pressure and self.__shed_level < self.max_shed_level:
+                self.__shed_level += 1
+                Logger.warn(f'Scheduler shed level up to {self.__shed_level}, loop time(s): {pressure}.')
+            elif not pressure and self.__shed_level > 0:
+                self.__shed_level -= 1
+                Logger.info(f'Scheduler shed level down to {self.__shed_level}.')
+
+    def __apply_affinity(self, name):
+        p = self.__plugins.get(name)
+        if p is None or p['priority'] not in self.__cores or not hasattr(os, 'sched_setaffinity'):
+            return
+        try:
+            # Linux下pid为0时只作用于调用线程
+            os.sched_setaffinity(0, self.__cores[p['priority']])
+        except OSError as e:
+            Logger.warn(f'Plugin {name} set cpu affinity failed: {e}')
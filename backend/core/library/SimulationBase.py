@@ -37,6 +37,7 @@ class Simulation(Singleton):
         LidarPlugin.register(LidarPlugin.depth_queue, 'depth_queue', EventBusItemType.DATA)
         YoloPlugin.register(YoloPlugin.reproject_points, 'reproject_points', EventBusItemType.DATA)
         YoloPlugin.register(YoloPlugin.annotator_result, 'annotator_result', EventBusItemType.DATA)
+        YoloPlugin.register(YoloPlugin.annotator_clip, 'annotator_clip', EventBusItemType.DATA)
         YoloPlugin.register(YoloPlugin.armor_car_index, 'armor_car_index', EventBusItemType.DATA)
         EventBus.start()
         # while True:
@@ -0,0 +1,158 @@
+import collections
+import threading
+import time
+
+from core.library.PluginManager import PluginManager
+
+
+class SyncBundle(object):
+    """
+    同步数据组，一帧图像与其时间窗口内的雷达数据。\n
+    depth_queue为同步器持有的深度队列本身，不是快照，只在match返回后、下一次match之前对应本帧；
+    get_bundle返回的历史数据组不含深度队列。
+    """
+    __slots__ = ('frame_id', 'timestamp', 'lidar_start', 'lidar_end', 'lidar_num', 'depth_queue')
+
+    def __init__(self, frame_id, timestamp, lidar_start, lidar_end, lidar_num, depth_queue):
+        self.frame_id = frame_id
+        self.timestamp = timestamp  # 图像采集时间戳(s)
+        self.lidar_start = lidar_start  # 窗口内最早的雷达时间戳(s)
+        self.lidar_end = lidar_end  # 窗口内最晚的雷达时间戳(s)
+        self.lidar_num = lidar_num  # 深度队列中窗口内的雷达数据包数量
+        self.depth_queue = depth_queue
+
+    @property
+    def matched(self):
+        """
+        窗口内是否有雷达数据，为False时深度队列为空，不应使用其深度
+        """
+        return self.lidar_num > 0
+
+
+class Synchronizer(object):
+    """
+    相机/雷达时间戳同步器。\n
+    雷达数据包先以主机时间戳暂存在有界队列中，图像的检测结果到达后，只把时间戳不晚于`图像时间戳 + tolerance`的数据包推入深度队列，
+    并从深度队列中淘汰早于`图像时间戳 - window`的数据，深度队列因此始终对应该帧图像的时刻，不会混入未来的点，
+    也不会在雷达滞后或断开时使用过期的深度。\n
+    多个雷达共用同一个深度队列时，数据包按雷达分别暂存并记录各自的最新时间戳，等待所有雷达都追上图像时刻，
+    一个雷达较快时不会在其他雷达滞后时提前匹配；超过window没有收到数据包的雷达视为断开，不再等待。\n
+    雷达时间戳为设备时钟，通过接收时刻与设备时间戳之差的最小值估计两个时钟的偏移，把设备时间换算为主机时间。
+    """
+
+    def __init__(self, tolerance=0.02, window=0.1, timeout=0.05, history=1024):
+        """
+        :param tolerance: 允许的雷达与图像的时间差(s)
+        :param window: 图像时刻之前需要的雷达积分时间(s)，早于该窗口的数据包直接丢弃，已在深度队列中的数据被淘汰
+        :param timeout: 等待雷达数据追上图像时刻的最长时间(s)
+        :param history: 每个雷达暂存的数据包与图像的最大数量
+        """
+        self.__cond = threading.Condition()
+        self.__pending = {}  # 各雷达暂存的(主机时间戳(s), 数据)
+        self.__frames = collections.deque()
+        self.__offsets = {}  # 各雷达设备时钟到主机时钟的偏移(s)与估计时刻
+        self.__latest = {}  # 各雷达最新数据包的主机时间戳(s)
+        self.__arrival = {}  # 各雷达最近一次收到数据包的时刻(s)
+        self.__depth_queue = None
+        self.tolerance = tolerance
+        self.window = window
+        self.timeout = timeout
+        self.history = history
+
+    def set(self, depth_queue, tolerance=None, window=None, timeout=None, history=None):
+        """
+        :param depth_queue: 同步后的雷达数据推入的深度队列
+        """
+        self.__depth_queue = depth_queue
+        self.tolerance = self.tolerance if tolerance is None else tolerance
+        self.window = self.window if window is None else window
+        self.timeout = self.timeout if timeout is None else timeout
+        self.history = self.history if history is None else history
+
+    def to_host_time(self, device_time, receive_time=None, source=None):
+        """
+        把雷达设备时间戳换算为主机时间戳 \n
+        :param device_time: 设备时间戳(s)
+        :param receive_time: 数据包接收时刻(s)，为空则取当前时间
+        :param source: 雷达标识，多个雷达的设备时钟相互独立，各自估计偏移
+        """
+        receive_time = time.time() if receive_time is None else receive_time
+        offset = receive_time - device_time
+        current = self.__offsets.get(source)
+        # 取最小延迟作为偏移估计，每隔10s重新估计，跟随时钟漂移
+        if current is None or offset < current[0] or receive_time - current[1] > 10.:
+            current = self.__offsets[source] = (offset, receive_time)
+        return device_time + current[0]
+
+    def push_lidar(self, timestamp, data, source=None):
+        """
+        雷达数据包入队 \n
+        :param timestamp: 主机时间戳(s)
+        :param data: [depth, point_2d]
+        :param source: 雷达标识，各雷达分别暂存与等待
+        """
+        with self.__cond:
+            pending = self.__pending.setdefault(source, collections.deque())
+            if len(pending) >= self.history:
+                pending.popleft()
+            pending.append((timestamp, data))
+            self.__latest[source] = timestamp
+            self.__arrival[source] = time.time()
+            self.__cond.notify_all()
+
+    def __caught_up(self, end):
+        """
+        所有在线的雷达是否都已追上图像时刻，超过window没有收到数据包的雷达视为断开
+        """
+        now = time.time()
+        latest = [t for source, t in self.__latest.items() if now - self.__arrival[source] <= self.window]
+        return bool(latest) and min(latest) >= end
+
+    def match(self, frame_id, timestamp):
+        """
+        把图像时刻之前的雷达数据推入深度队列，返回同步数据组 \n
+        :param frame_id: 帧号
+        :param timestamp: 图像采集时间戳(s)
+        :return: SyncBundle
+        """
+        end = timestamp + self.tolerance
+        with self.__cond:
+            # 等待雷达数据追上图像时刻
+            with PluginManager.idle():
+                self.__cond.wait_for(lambda: self.__caught_up(end), self.timeout)
+            ready = []
+            for pending in self.__pending.values():
+                while pending and pending[0][0] <= end:
+                    t, data = pending.popleft()
+                    if t >= timestamp - self.window:
+                        ready.append((t, data))
+            # 各雷达的数据包按时间戳合并后入队
+            for t, data in sorted(ready, key=lambda item: item[0]):
+                self.__depth_queue.push(data, t)
+            self.__depth_queue.evict_before(timestamp - self.window)
+            stamps = self.__depth_queue.timestamps
+            # 超时后才到达的滞后数据排在较新的数据之后，队列中的时间戳不一定有序
+            start, last = (min(stamps), max(stamps)) if stamps else (None, None)
+            bundle = SyncBundle(frame_id, timestamp, start, last, len(stamps), self.__depth_queue)
+            if len(self.__frames) >= self.history:
+                self.__frames.popleft()
+            # 深度队列随后续帧推进，历史数据组不保留
+            self.__frames.append(SyncBundle(frame_id, timestamp, start, last, len(stamps), None))
+        return bundle
+
+    def get_bundle(self, frame_id):
+        """
+        获取历史同步数据组
+        """
+        for bundle in reversed(self.__frames):
+            if bundle.frame_id == frame_id:
+                return bundle
+        return None
+
+    def lag(self):
+        """
+        雷达数据相对当前时刻的滞后(s)，多个雷达时取最慢的雷达
+        """
+        with self.__cond:
+            latest = min(self.__latest.values(), default=None)
+        return None if latest is None else time.time() - latest
@@ -0,0 +1,238 @@
+import collections
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+
+"""
+帧追踪
+相机采集时为每帧分配帧号，流水线各阶段以帧号记录开始、结束时间戳，用于分析从采集到小地图推送的延迟构成。
+"""
+
+TRACE_DTYPE = np.dtype([('frame_id', np.int64), ('stage', np.int16), ('start', np.int64), ('end', np.int64)])
+
+
+class _Span(object):
+    """
+    阶段计时，with语句退出时记录
+    """
+    __slots__ = ('stage', 'frame_id', 'start')
+
+    def __init__(self, stage, frame_id):
+        self.stage = stage
+        self.frame_id = frame_id
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        Tracer.record(self.stage, self.start, time.time_ns(), self.frame_id)
+
+
+class _Bind(object):
+    """
+    把帧号绑定到当前线程，with语句退出时恢复
+    """
+    __slots__ = ('frame_id', 'last')
+
+    def __init__(self, frame_id):
+        self.frame_id = frame_id
+        self.last = -1
+
+    def __enter__(self):
+        self.last = Tracer.current()
+        Tracer._local.frame_id = self.frame_id
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        Tracer._local.frame_id = self.last
+
+
+class Tracer(object):
+    """
+    帧追踪器，每个进程一个。\n
+    追踪记录写入定长环形缓冲区，写者通过原子自增的序号取得槽位后直接写入，不加锁，缓冲区满后覆盖最旧的记录。\n
+    帧号通过`bind`绑定到处理该帧的线程上，同一线程中的各阶段无需逐层传递帧号。
+    """
+    enable = True
+    _local = threading.local()
+    __capacity = 65536
+    __records = np.zeros(__capacity, dtype=TRACE_DTYPE)
+    __index = itertools.count()  # next在CPython中是原子操作
+    __stages = {}  # 阶段名称到阶段编号
+    __stages_lock = threading.Lock()
+    __tags = {}  # (键值, 版本号)到帧号
+    __tag_order = collections.deque()
+    __saver = None
+
+    @classmethod
+    def set(cls, enable=True, capacity=65536, path=None, interval=10.):
+        """
+        :param enable: 是否记录
+        :param capacity: 环形缓冲区容量（记录条数）
+        :param path: 自动保存的文件路径，为空则不保存
+        :param interval: 自动保存间隔(s)
+        """
+        cls.enable = enable
+        if capacity != cls.__capacity:
+            cls.__capacity = capacity
+            cls.__records = np.zeros(capacity, dtype=TRACE_DTYPE)
+            cls.__index = itertools.count()
+        if enable and path and cls.__saver is None:
+            cls.__saver = threading.Thread(target=cls.__save_thread, args=(path, interval), daemon=True)
+            cls.__saver.start()
+
+    @classmethod
+    def bind(cls, frame_id):
+        """
+        把帧号绑定到当前线程，配合with语句使用
+        """
+        return _Bind(frame_id)
+
+    @classmethod
+    def current(cls):
+        """
+        当前线程绑定的帧号，未绑定返回-1
+        """
+        return getattr(cls._local, 'frame_id', -1)
+
+    @classmethod
+    def span(cls, stage, frame_id=None):
+        """
+        阶段计时，配合with语句使用 \n
+        :param stage: 阶段名称
+        :param frame_id: 帧号，为空则使用当前线程绑定的帧号
+        """
+        return _Span(stage, frame_id)
+
+    @classmethod
+    def record(cls, stage, start, end, frame_id=None):
+        """
+        记录一个阶段 \n
+        :param stage: 阶段名称
+        :param start: 开始时间戳(ns)
+        :param end: 结束时间戳(ns)
+        :param frame_id: 帧号，为空则使用当前线程绑定的帧号
+        """
+        if not cls.enable:
+            return
+        frame_id = cls.current() if frame_id is None else frame_id
+        if frame_id < 0:
+            return
+        sid = cls.__stages.get(stage)
+        if sid is None:
+            with cls.__stages_lock:
+                sid = cls.__stages.setdefault(stage, len(cls.__stages))
+        records = cls.__records
+        records[next(cls.__index) % len(records)] = (frame_id, sid, start, end)
+
+    @classmethod
+    def tag(cls, key, version, frame_id=None):
+        """
+        记录总线上某个版本的值对应的帧号，供读取该值的线程继续追踪 \n
+        :param key: 键值
+        :param version: 版本号
+        :param frame_id: 帧号，为空则使用当前线程绑定的帧号
+        """
+        frame_id = cls.current() if frame_id is None else frame_id
+        if not cls.enable or frame_id < 0:
+            return
+        cls.__tags[(key, version)] = frame_id
+        cls.__tag_order.append((key, version))
+        while len(cls.__tag_order) > 1024:
+            cls.__tags.pop(cls.__tag_order.popleft(), None)
+
+    @classmethod
+    def frame_of(cls, key, version):
+        """
+        获取总线上某个版本的值对应的帧号，没有记录返回-1
+        """
+        return cls.__tags.get((key, version), -1)
+
+    @classmethod
+    def snapshot(cls):
+        """
+        获取环形缓冲区中的有效记录 \n
+        :return: (记录, 阶段名称列表)
+        """
+        records = cls.__records
+        stages = [None] * len(cls.__stages)
+        for name, sid in list(cls.__stages.items()):
+            stages[sid] = name
+        # 未写入的槽位结束时间戳为0
+        return records[records['end'] > 0].copy(), stages
+
+    @classmethod
+    def save(cls, path):
+        """
+        保存追踪记录，使用`load`读取
+        """
+        records, stages = cls.snapshot()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.tmp.npz'
+        np.savez(tmp, records=records, stages=np.array(stages, dtype=str), pid=os.getpid())
+        os.replace(tmp, path)
+
+    @classmethod
+    def __save_thread(cls, path, interval):
+        while True:
+            time.sleep(interval)
+            cls.save(path)
+
+    @staticmethod
+    def load(*paths):
+        """
+        读取并合并多个进程保存的追踪记录 \n
+        :return: (记录, 阶段名称列表)
+        """
+        merged, names = [], []
+        for path in paths:
+            with np.load(path) as f:
+                records, stages = f['records'].copy(), [str(s) for s in f['stages']]
+            # 不同进程的阶段编号不同，按名称重新编号
+            remap = np.zeros(max(len(stages), 1), dtype=np.int16)
+            for sid, name in enumerate(stages):
+                if name not in names:
+                    names.append(name)
+                remap[sid] = names.index(name)
+            records['stage'] = remap[records['stage']]
+            merged.append(records)
+        return (np.concatenate(merged) if merged else np.zeros(0, dtype=TRACE_DTYPE)), names
+
+    @staticmethod
+    def breakdown(records, stages, origin='camera', percentiles=(50, 90, 99)):
+        """
+        统计各阶段的耗时与相对采集时刻的延迟 \n
+        :param records: 追踪记录
+        :param stages: 阶段名称列表
+        :param origin: 作为起点的采集阶段，其开始时刻视为该帧的采集时刻
+        :param percentiles: 统计的分位数
+        :return: {阶段名称: {"count": 次数, "duration": {分位数: ms}, "latency": {分位数: ms}}}，
+            latency为阶段结束时刻相对该帧采集时刻的延迟
+        """
+        res = {}
+        if len(records) == 0:
+            return res
+        glass = {}
+        if origin in stages:
+            o = records[records['stage'] == stages.index(origin)]
+            glass = dict(zip(o['frame_id'].tolist(), o['start'].tolist()))
+        for sid, name in enumerate(stages):
+            r = records[records['stage'] == sid]
+            if len(r) == 0:
+                continue
+            duration = (r['end'] - r['start']) / 1e6
+            stat = {'count': len(r), 'duration': {p: float(np.percentile(duration, p)) for p in percentiles},
+                    'latency': None}
+            start = np.array([glass.get(f, -1) for f in r['frame_id'].tolist()], dtype=np.int64)
+            mask = start >= 0
+            if mask.any():
+                latency = (r['end'][mask] - start[mask]) / 1e6
+                stat['latency'] = {p: float(np.percentile(latency, p)) for p in percentiles}
+            res[name] = stat
+        return res
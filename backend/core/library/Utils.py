@@ -4,6 +4,10 @@ import threading
 import cv2
 import numpy as np
 
+from core.library.DepthEstimator import DEPTH_ESTIMATORS, depth_histogram
+from core.library.DepthStore import DEPTH_STORES, EMPTY
+from core.library.Tracer import Tracer
+
 
 class Singleton(object):
     """
@@ -234,10 +238,17 @@ def regen_list_from_keys(target: dict, keys: list):
 
 
 class DepthQueue(object):
+    """
+    滑动窗口深度队列。\n
+    每条数据入队时转换为有序且不重复的像素索引与每个像素的最小深度(mm)，交给存储后端维护窗口内逐像素的最小深度，
+    后端见DepthStore：dense为整幅深度图，sparse只保存窗口内的点，在set中按名字选择，接口与结果一致。
+    """
+
     def __init__(self, maxsize=1):
         """
-        :param maxsize: 队列最大容量
+        :param maxsize: 队列最大容量，不超过255
         """
+        assert 0 < maxsize <= 255
         self.__maxsize = maxsize
         self.__size = None
         self.__k0 = None
@@ -245,44 +256,133 @@ class DepthQueue(object):
         self.__e0 = None
         self.__current = 0
         self.__queue = []
-        self.__depth = None
+        self.__stamps = []
+        self.__store = None
+        self.__lock = threading.RLock()
 
-    def set(self, k0, c0, e0, size):
+    def set(self, k0, c0, e0, size, backend='dense', **params):
+        """
+        :param backend: 存储后端，见DepthStore.DEPTH_STORES
+        :param params: 存储后端的参数
+        """
+        if backend not in DEPTH_STORES:
+            raise ValueError(f'Unknown depth store: {backend}')
         self.__size = size
         self.__k0 = k0
         self.__c0 = c0
         self.__e0 = e0
-        self.__depth = np.ones((size[0], size[1]), np.float64) * np.nan
+        with self.__lock:
+            self.__store = DEPTH_STORES[backend](size, **params)
+            self.__queue = []
+            self.__stamps = []
+            self.__current = 0
+
+    @property
+    def queue(self):
+        return self.__queue
+
+    @property
+    def timestamps(self):
+        """
+        队列中各条数据的时间戳(s)，入队时没有时间戳的为-inf
+        """
+        with self.__lock:
+            return list(self.__stamps)
+
+    @property
+    def nbytes(self):
+        """
+        存储后端占用的内存(字节)
+        """
+        return self.__store.nbytes
 
     def get(self):
-        return self.__queue[self.__current]
+        return self.__queue[0]
 
     def pop(self):
-        top = self.get()
-        self.__current -= 1
-        del self.__queue[0]
-        return top
+        with self.__lock:
+            top = self.get()
+            self.__store.pop()
+            self.__current -= 1
+            del self.__queue[0]
+            del self.__stamps[0]
+            return top
 
     def empty(self):
         return self.__current == 0
 
     def full(self):
-        return self.__current == (self.__maxsize - 1)
+        return self.__current >= self.__maxsize
 
-    def push(self, a):
+    def push(self, a, timestamp=None):
         """
         向深度队列入队
-        :param a: [depth, point_2d]
+        :param a: [depth, point_2d]，depth单位为m，point_2d为[u, v]像素坐标
+        :param timestamp: 数据的时间戳(s)，用于evict_before按时间淘汰
+        """
+        with self.__lock:
+            if self.full():
+                self.pop()
+            self.__queue.append(a)
+            self.__stamps.append(-np.inf if timestamp is None else timestamp)
+            self.__current += 1
+            self.__store.push(*self.__reduce(*a))
+
+    def evict_before(self, timestamp):
         """
-        if self.full():
-            ip_d, _ = self.pop()
-            self.__depth[ip_d[:, 1], ip_d[:, 0]] = np.nan
-        self.__queue.append(a)
-        self.__current += 1
-        dpt, ip = a
-        s = np.stack([self.__depth[ip[:, 1], ip[:, 0]], dpt], axis=1)
-        s = np.nanmin(s, axis=1)
-        self.__depth[ip[:, 1], ip[:, 0]] = s
+        从队首淘汰时间戳早于timestamp的数据，没有时间戳的数据无法判断时刻，一并淘汰 \n
+        :param timestamp: 时间戳(s)
+        :return: 淘汰的数量
+        """
+        num = 0
+        with self.__lock:
+            while self.__current and self.__stamps[0] < timestamp:
+                self.pop()
+                num += 1
+        return num
+
+    def __reduce(self, dpt, ip):
+        """
+        把一条数据转换为有序且不重复的像素索引与每个像素的最小深度(mm)
+        """
+        if not len(dpt):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16)
+        pixel = ip[:, 1].astype(np.int64) * self.__size[1] + ip[:, 0]
+        depth = np.clip(np.rint(np.asarray(dpt, dtype=np.float64) * 1000.), 0, int(EMPTY) - 1).astype(np.uint16)
+        order = np.lexsort((depth, pixel))
+        pixel, depth = pixel[order], depth[order]
+        first = np.empty(len(pixel), dtype=bool)
+        first[0] = True
+        np.not_equal(pixel[1:], pixel[:-1], out=first[1:])
+        return pixel[first], depth[first]
+
+    def get_mean_depth(self, boxes):
+        """
+        一次查询多个ROI的平均深度 \n
+        :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+        :return: (n,)的float32平均深度(单位：m)，ROI内没有深度时为nan
+        """
+        with self.__lock:
+            return (self.__store.get_mean_depth(boxes) * 0.001).astype(np.float32)
+
+    def get_box_depth(self, boxes, method='mean', bucket=100, **params):
+        """
+        一次估计多个ROI的深度 \n
+        :param boxes: (n, 4)的ROI像素范围[y0, y1, x0, x1]，左闭右开
+        :param method: 估计方法，mean为平均深度，其余见DepthEstimator.DEPTH_ESTIMATORS
+        :param bucket: 直方图分桶宽度(mm)
+        :param params: 估计方法的参数
+        :return: (n,)的float32深度(单位：m)，ROI内没有深度时为nan
+        """
+        if method == 'mean':
+            return self.get_mean_depth(boxes)
+        if method not in DEPTH_ESTIMATORS:
+            raise ValueError(f'Unknown depth estimator: {method}')
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        with self.__lock:
+            box, depth = self.__store.get_box_samples(boxes)
+        count, total = depth_histogram(box, depth, len(boxes), bucket)
+        return (DEPTH_ESTIMATORS[method](count, total, **params) * 0.001).astype(np.float32)
 
     def get_from_index(self, index):
         assert 0 <= index <= self.__maxsize - 1
@@ -292,33 +392,50 @@ class DepthQueue(object):
         return self.__queue
 
     def get_depth(self):
-        return self.__depth
+        """
+        :return: (height, width)的float32深度图(单位：m)，没有深度的像素为nan
+        """
+        return self.get_depth_area(0, self.__size[0], 0, self.__size[1])
 
-    def get_armor_depth(self, armors):
+    def get_depth_area(self, y0, y1, x0, x1):
+        """
+        读取深度图的一块区域 \n
+        :return: (y1 - y0, x1 - x0)的float32深度(单位：m)，没有深度的像素为nan
+        """
+        with self.__lock:
+            area = self.__store.get_depth_area(y0, y1, x0, x1).astype(np.float32)
+        area[area == EMPTY] = np.nan
+        area *= np.float32(0.001)
+        return area
+
+    def get_armor_depth(self, armors, method='mean', **params):
         """
         根据armors确定到armor的距离
         :param armors: armor列表，[[cls, bbox, (conf)], ...]
+        :param method: ROI深度的估计方法，见get_box_depth
+        :param params: 估计方法的参数
         :return: [[cls, depth], ...]
         """
-        res = []
         if len(armors) == 0:
             return
-
-        def xyxy2c(p):
-            return np.float32([p[0] + (p[2] / 2), p[1] + (p[3] / 2)])
-
-        def xyxy2xywh(p):
-            return [p[0], p[1], abs(p[2] - p[0]), abs(p[3] - p[1])]
-
-        for armor in armors:
-            cls, bbox = armor[0], xyxy2xywh(armor[1])
-            c = xyxy2c(bbox)
-            area = self.__depth[int(max(0, c[1] - bbox[3])):int(min(c[1] + bbox[3], self.__size[0] - 1)),
-                                int(max(c[0] - bbox[2], 0)):int(min(c[0] + bbox[2], self.__size[1] - 1))]
-            z = np.nanmean(area) if not np.isnan(area).all() else np.nan
-            res.append([cls, np.concatenate([cv2.undistortPoints(c, self.__k0, self.__c0).reshape(-1), np.array([z])],
-                                            axis=0)])
-        return np.stack(res, axis=0)
+        with Tracer.span('depth'):
+            return self.__get_armor_depth(armors, method, params)
+
+    def __get_armor_depth(self, armors, method, params):
+        cls = [armor[0] for armor in armors]
+        # xyxy -> 中心与宽高，ROI为以中心为中点、边长为宽高两倍的区域
+        xyxy = np.array([armor[1] for armor in armors], dtype=np.float32).reshape(-1, 4)
+        wh = np.abs(xyxy[:, 2:] - xyxy[:, :2])
+        c = xyxy[:, :2] + wh / 2
+        boxes = np.stack([np.maximum(0, c[:, 1] - wh[:, 1]), np.minimum(c[:, 1] + wh[:, 1], self.__size[0] - 1),
+                          np.maximum(c[:, 0] - wh[:, 0], 0), np.minimum(c[:, 0] + wh[:, 0], self.__size[1] - 1)], axis=1)
+        z = self.get_box_depth(boxes, method, **params)
+        xy = cv2.undistortPoints(c.reshape(-1, 1, 2), self.__k0, self.__c0).reshape(-1, 2)
+        xyz = np.concatenate([xy, z[:, None]], axis=1).astype(np.float64)
+        res = np.empty((len(cls), 2), dtype=object)
+        res[:, 0] = cls
+        res[:, 1] = list(xyz)
+        return res
 
 
 # 绘制
@@ -1,5 +1,11 @@
+import atexit
+import collections
+import os
+import threading
+import time
+
+from core.library.Enums import LogLevel
 from core.library.Utils import ThreadSafeSingleton
-import datetime
 
 
 class Colors:
@@ -15,56 +21,212 @@ class Colors:
     UNDERLINE = '\033[4m'
 
 
+# 各级别的标签与颜色
+_STYLES = {
+    LogLevel.OUTPUT: ('[  Output  ]', Colors.BLUE),
+    LogLevel.INFO: ('[   Info   ]', Colors.CYAN),
+    LogLevel.WARN: ('[   Warn   ]', Colors.WARNING),
+    LogLevel.DANGER: ('[  Failed  ]', Colors.FAIL),
+    LogLevel.MAIN: ('[MainThread]', Colors.MAIN)
+}
+
+
+class _RotatingFile(object):
+    """
+    滚动日志文件，超过max_bytes时依次重命名为.1、.2……，最多保留backup_count个
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+
+    def write(self, line):
+        data = line + '\n'
+        if self.max_bytes > 0 and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.size = 0
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
 class Logger(ThreadSafeSingleton):
-    __logs = []  # 系统日志
+    """
+    系统日志。\n
+    调用方只把(级别, 时间, 消息)放入待写队列，时间格式化、控制台输出和写文件都由后台写线程完成；
+    低于当前级别的日志在调用时直接返回，不拼接消息。\n
+    写出的日志保存在定长环形缓冲区中，通过`read`以游标读取，游标为日志的全局序号。
+    """
+    __level = LogLevel.OUTPUT
+    __capacity = 4096
+    __logs = [None] * __capacity  # 系统日志环形缓冲区
+    __seq = 0  # 已写出的日志条数，即下一条日志的游标
+    __pending = collections.deque(maxlen=65536)  # 待写队列，写线程跟不上时丢弃最旧的日志
+    __console = True
+    __sink = None  # 滚动日志文件
+    __writer = None
+    __write_lock = threading.Lock()
+    __interval = 0.05  # 写线程的写出间隔(s)
 
     def __init__(self):
         super().__init__()
 
+    @classmethod
+    def set(cls, level=None, capacity=None, path=None, max_bytes=10 * 1024 * 1024, backup_count=5, console=None):
+        """
+        :param level: 最低输出级别，LogLevel或其名称，如"info"
+        :param capacity: 环形缓冲区保存的日志条数
+        :param path: 日志文件路径，为空则不写文件
+        :param max_bytes: 单个日志文件的最大字节数，超过后滚动
+        :param backup_count: 保留的历史日志文件数量
+        :param console: 是否输出到控制台
+        """
+        if level is not None:
+            cls.__level = LogLevel[level.upper()] if isinstance(level, str) else LogLevel(level)
+        if console is not None:
+            cls.__console = console
+        with cls.__write_lock:
+            if capacity is not None and capacity != cls.__capacity:
+                logs = cls.__read(0)[0][-capacity:]
+                cls.__capacity = capacity
+                cls.__logs = [None] * capacity
+                cls.__seq = 0
+                for line in logs:
+                    cls.__append(line)
+            if path is not None:
+                if cls.__sink is not None:
+                    cls.__sink.close()
+                cls.__sink = _RotatingFile(path, max_bytes, backup_count)
+
+    @classmethod
+    def is_enabled(cls, level):
+        """
+        该级别的日志是否会输出，消息拼接代价较高时可先判断
+        """
+        return level >= cls.__level
+
     @classmethod
     def info(cls, *msg):
-        t = datetime.datetime.now()
-        s = ' '.join([str(s) for s in msg])
-        cls.update_message_pool(f"[   Info   ] {t.strftime('%H:%M:%S')} {s}")
-        print(
-            f"{Colors.CYAN} [   Info   ] {t.strftime('%H:%M:%S')}{Colors.END} {s}")
+        cls.__log(LogLevel.INFO, msg)
 
     @classmethod
     def output(cls, *msg):
-        t = datetime.datetime.now()
-        s = ' '.join([str(s) for s in msg])
-        cls.update_message_pool(f"[  Output  ] {t.strftime('%H:%M:%S')} {s}")
-        print(
-            f"{Colors.BLUE} [  Output  ] {t.strftime('%H:%M:%S')}{Colors.END} {s}")
+        cls.__log(LogLevel.OUTPUT, msg)
 
     @classmethod
     def warn(cls, *msg):
-        t = datetime.datetime.now()
-        s = ' '.join([str(s) for s in msg])
-        cls.update_message_pool(f"[   Warn   ] {t.strftime('%H:%M:%S')} {s}")
-        print(
-            f"{Colors.WARNING} [   Warn   ] {t.strftime('%H:%M:%S')}{Colors.END} {s}")
+        cls.__log(LogLevel.WARN, msg)
 
     @classmethod
     def danger(cls, *msg):
-        t = datetime.datetime.now()
-        s = ' '.join([str(s) for s in msg])
-        cls.update_message_pool(f"[  Failed  ] {t.strftime('%H:%M:%S')} {s}")
-        print(
-            f"{Colors.FAIL} [  Failed  ] {t.strftime('%H:%M:%S')}{Colors.END} {s}")
+        cls.__log(LogLevel.DANGER, msg)
 
     @classmethod
     def main(cls, *msg):
-        t = datetime.datetime.now()
-        s = ' '.join([str(s) for s in msg])
-        cls.update_message_pool(f"[MainThread] {t.strftime('%H:%M:%S')} {s}")
-        print(
-            f"{Colors.MAIN} [MainThread] {t.strftime('%H:%M:%S')} {s}{Colors.END}")
+        cls.__log(LogLevel.MAIN, msg)
+
+    @classmethod
+    def read(cls, cursor=0, limit=None):
+        """
+        按游标读取日志 \n
+        :param cursor: 上一次读取返回的游标，0为从最早保留的日志开始，落后超过缓冲区容量时从最早保留的日志开始
+        :param limit: 最多读取的条数，None为全部
+        :return: (日志列表, 新游标)
+        """
+        return cls.__read(cursor, limit)
+
+    @classmethod
+    def cursor(cls):
+        """
+        当前游标，从此处开始读取只会读到之后的日志
+        """
+        return cls.__seq
 
     @classmethod
     def output_logs(cls):
-        return cls.__logs
+        """
+        获取环形缓冲区中保留的所有日志
+        """
+        return cls.__read(0)[0]
 
     @classmethod
     def update_message_pool(cls, string):
-        cls.__logs.append(string)
+        with cls.__write_lock:
+            cls.__append(string)
+
+    @classmethod
+    def flush(cls):
+        """
+        写出待写队列中的所有日志
+        """
+        with cls.__write_lock:
+            while cls.__pending:
+                level, t, s = cls.__pending.popleft()
+                tag, color = _STYLES[level]
+                stamp = time.strftime('%H:%M:%S', time.localtime(t))
+                line = f'{tag} {stamp} {s}'
+                cls.__append(line)
+                if cls.__console:
+                    if level == LogLevel.MAIN:
+                        print(f'{color} {tag} {stamp} {s}{Colors.END}')
+                    else:
+                        print(f'{color} {tag} {stamp}{Colors.END} {s}')
+                if cls.__sink is not None:
+                    cls.__sink.write(line)
+            if cls.__sink is not None:
+                cls.__sink.flush()
+
+    @classmethod
+    def __log(cls, level, msg):
+        if level < cls.__level:
+            return
+        cls.__pending.append((level, time.time(), ' '.join([str(s) for s in msg])))
+        if cls.__writer is None:
+            cls.__start_writer()
+
+    @classmethod
+    def __start_writer(cls):
+        with cls.__write_lock:
+            if cls.__writer is not None:
+                return
+            cls.__writer = threading.Thread(target=cls.__writer_thread, daemon=True)
+            cls.__writer.start()
+        # 写线程为守护线程，退出时写出剩余的日志
+        atexit.register(cls.flush)
+
+    @classmethod
+    def __writer_thread(cls):
+        while True:
+            time.sleep(cls.__interval)
+            cls.flush()
+
+    @classmethod
+    def __append(cls, line):
+        cls.__logs[cls.__seq % cls.__capacity] = line
+        cls.__seq += 1
+
+    @classmethod
+    def __read(cls, cursor=0, limit=None):
+        logs, seq = cls.__logs, cls.__seq
+        start = max(cursor, seq - len(logs), 0)
+        end = seq if limit is None else min(seq, start + limit)
+        return [logs[i % len(logs)] for i in range(start, end)], end
@@ -0,0 +1,134 @@
+"""
+装甲板深度测试，在这个程序中提供了对DepthQueue.get_armor_depth速度的测试。
+包括：旧版逐个装甲板切片nanmean并逐个反畸变与整批查询、整批反畸变的对比，结果的一致性检查，
+基于深度直方图的中位数、截尾平均、最近簇估计的耗时，以及dense（整幅深度图）与sparse（稀疏点）两种存储后端的内存与耗时
+注意：本程序使用配置文件中的相机参数，以及随机生成的深度数据与装甲板，不需要连接雷达与相机
+"""
+import time
+
+import cv2
+import numpy as np
+
+from core.library.EventBusBase import EventBus
+from core.library.Utils import DepthQueue
+
+
+def _legacy_armor_depth(depth, armors, k0, c0, size):
+    """
+    旧版逐个装甲板求深度，仅用于对比（旧版最后np.stack混合类型的列表，新版numpy会报错，这里直接返回列表）
+    """
+    res = []
+    for armor in armors:
+        cls, p = armor[0], armor[1]
+        bbox = [p[0], p[1], abs(p[2] - p[0]), abs(p[3] - p[1])]
+        c = np.float32([bbox[0] + (bbox[2] / 2), bbox[1] + (bbox[3] / 2)])
+        area = depth[int(max(0, c[1] - bbox[3])):int(min(c[1] + bbox[3], size[0] - 1)),
+                     int(max(c[0] - bbox[2], 0)):int(min(c[0] + bbox[2], size[1] - 1))]
+        z = np.nanmean(area) if not np.isnan(area).all() else np.nan
+        res.append([cls, np.concatenate([cv2.undistortPoints(c, k0, c0).reshape(-1), np.array([z])], axis=0)])
+    return res
+
+
+class ArmorDepthMeasure(object):
+    """
+    装甲板深度测试程序类
+    """
+
+    def __init__(self, robot_num=14, maxsize=120, batch_points=2000, repeat=200, backends=('dense', 'sparse')):
+        """
+        :param robot_num: 视野中的机器人数量，每个机器人2块装甲板
+        :param maxsize: 深度队列容量
+        :param batch_points: 每次入队的点数
+        :param repeat: 查询的重复次数
+        :param backends: 对比的深度队列存储后端
+        """
+        self.robot_num = robot_num
+        self.maxsize = maxsize
+        self.batch_points = batch_points
+        self.repeat = repeat
+        self.backends = backends
+        self.batches = []
+        self.armors = []
+        self.init()
+
+    def init(self):
+        """
+        程序引导，读取相机参数，随机生成入队数据与装甲板
+        """
+        EventBus.read_config_file()
+        image = EventBus.get('image')['data']
+        width, height = image['width'], image['height']
+        rng = np.random.default_rng(0)
+        for _ in range(self.maxsize * 2):
+            n = self.batch_points
+            point_2d = np.stack([rng.integers(0, width, n), rng.integers(0, height, n)], axis=1).astype(np.int32)
+            # 深度随图像纵坐标变化，模拟场地由远及近
+            depth = 5 + 20 * (1 - point_2d[:, 1] / height) + rng.normal(0, 0.05, n)
+            self.batches.append([depth.astype(np.float32), point_2d])
+        for i in range(self.robot_num * 2):
+            w, h = rng.uniform(20, 150), rng.uniform(10, 80)
+            x, y = rng.uniform(0, width - w), rng.uniform(0, height - h)
+            self.armors.append([i % 12, [x, y, x + w, y + h], 0.9])
+
+    def create_depth_queue(self, backend):
+        image = EventBus.get('image')['data']
+        depth_queue = DepthQueue(maxsize=self.maxsize)
+        depth_queue.set(k0=np.array(EventBus.get('camera_intrinsic_matrix')['data']),
+                        c0=np.array(EventBus.get('camera_dist')['data']),
+                        e0=np.array(EventBus.get('lidar_extrinsic')['data']),
+                        size=[image['height'], image['width']], backend=backend)
+        return depth_queue
+
+    def start(self):
+        k0 = np.array(EventBus.get('camera_intrinsic_matrix')['data'])
+        c0 = np.array(EventBus.get('camera_dist')['data'])
+        image = EventBus.get('image')['data']
+        size = [image['height'], image['width']]
+        n = len(self.armors)
+        legacy = None
+        for backend in self.backends:
+            depth_queue = self.create_depth_queue(backend)
+            t = time.perf_counter()
+            for batch in self.batches:
+                depth_queue.push(batch)
+            t = (time.perf_counter() - t) / len(self.batches)
+            print(f'{backend}: {depth_queue.nbytes / 2 ** 20:.1f} MB, push {self.batch_points} points: {t * 1e6:.1f} us')
+            if legacy is None:
+                depth = depth_queue.get_depth()
+                t = self.__measure(lambda: _legacy_armor_depth(depth, self.armors, k0, c0, size))
+                print(f'  [legacy  ] {n} armors: {t * 1e6:.1f} us')
+                legacy = np.stack([d for _, d in _legacy_armor_depth(depth, self.armors, k0, c0, size)])
+            t = self.__measure(lambda: depth_queue.get_armor_depth(self.armors))
+            print(f'  [mean    ] {n} armors: {t * 1e6:.1f} us')
+            # 每帧之间都有新数据入队时，查询前需要重新生成积分图或归并新的点
+            t = 0
+            for i in range(self.repeat):
+                depth_queue.push(self.batches[i % len(self.batches)])
+                start = time.perf_counter()
+                depth_queue.get_armor_depth(self.armors)
+                t += time.perf_counter() - start
+            print(f'  [refresh ] {n} armors after push: {t / self.repeat * 1e6:.1f} us')
+            for method in ('median', 'trimmed', 'nearest'):
+                t = self.__measure(lambda: depth_queue.get_armor_depth(self.armors, method=method))
+                print(f'  [{method:<8}] {n} armors: {t * 1e6:.1f} us')
+
+            # 一致性检查：与填满队列时旧版的结果对比，两种后端的ROI均精确到像素
+            depth_queue = self.create_depth_queue(backend)
+            for batch in self.batches:
+                depth_queue.push(batch)
+            new = np.stack(depth_queue.get_armor_depth(self.armors)[:, 1])
+            print(f'  max xy error: {np.abs(legacy[:, :2] - new[:, :2]).max():.6f}, '
+                  f'max depth error: {np.nanmax(np.abs(legacy[:, 2] - new[:, 2])):.3f} m, '
+                  f'mean depth: {np.nanmean(legacy[:, 2]):.3f} m')
+
+    def __measure(self, func):
+        func()
+        t = time.perf_counter()
+        for _ in range(self.repeat):
+            func()
+        return (time.perf_counter() - t) / self.repeat
+
+
+if __name__ == "__main__":
+    adm = ArmorDepthMeasure(robot_num=14)
+    adm.start()
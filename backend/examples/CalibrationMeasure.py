@@ -7,7 +7,7 @@ import numpy as np
 from core.hardware.Camera.CameraPlugin import CameraPlugin
 from core.library.Enums import EventBusItemType
 from core.library.EventBusBase import EventBus
-from core.library.Utils import is_none, find_board, regen_list_from_keys
+from core.library.Utils import find_board, regen_list_from_keys
 
 
 class CalibrationMeasure(object):
@@ -31,9 +31,10 @@ class CalibrationMeasure(object):
 
     def run_cam(self):
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(1200, 600))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(1200, 600))
                 _, h = cv2.getTextSize('AvgDepth on selected ROI: (m)', cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)
                 img = cv2.putText(img, 'AvgDepth on selected ROI: ', (0, 2 * h),
                                   cv2.FONT_HERSHEY_SIMPLEX, 0.75, (255, 255, 255), 2)
@@ -45,9 +46,10 @@ class CalibrationMeasure(object):
     def run_env(self):
         self.pnp4p()  # 先进行标定
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(1200, 600))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(1200, 600))
                 _, h = cv2.getTextSize('AvgDepth on selected ROI: (m)', cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)
                 img = cv2.putText(img, 'AvgDepth on selected ROI: ', (0, 2 * h),
                                   cv2.FONT_HERSHEY_SIMPLEX, 0.75, (255, 255, 255), 2)
@@ -78,9 +80,10 @@ class CalibrationMeasure(object):
             'time': 0
         }
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(1200, 600))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(1200, 600))
                 img = cv2.polylines(img, np.array([regen_list_from_keys(params, [f'p{i + 1}' for i in range(4)])]),
                                     True, thickness=2, color=(0, 0, 255))
                 cv2.imshow("camera_view", img)
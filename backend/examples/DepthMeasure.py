@@ -68,9 +68,10 @@ class DepthMeasure(object):
         rh, rw = h_ / ih, w_ / iw
         bw, bh = 20, 20
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(iw, ih))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(iw, ih))
                 _, h = cv2.getTextSize('A', cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)
                 x, y = params['x'], params['y']
                 img = cv2.circle(img, (x, y), color=(0, 0, 255), radius=5, thickness=-1)
@@ -88,9 +89,10 @@ class DepthMeasure(object):
         iw, ih = 1200, 600
         rh, rw = h_ / ih, w_ / iw
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(1200, 600))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(1200, 600))
                 _, h = cv2.getTextSize('A', cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)
                 # 找标定板
                 img, img_points = find_board(img)  # shape (N, 1, 2)
@@ -137,9 +139,10 @@ class DepthMeasure(object):
         iw, ih = 1200, 600
         rh, rw = h_ / ih, w_ / iw
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(iw, ih))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(iw, ih))
                 _, h = cv2.getTextSize('A', cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)
                 img = cv2.circle(img, (params['x1'], params['y1']), color=(0, 0, 255), radius=5, thickness=-1)
                 img = cv2.circle(img, (params['x2'], params['y2']), color=(0, 0, 255), radius=5, thickness=-1)
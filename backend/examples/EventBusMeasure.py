@@ -0,0 +1,81 @@
+"""
+总线吞吐测试，在这个程序中提供了对总线get/put吞吐量的测试。
+包括：哈希总线与旧版线性扫描总线在注册大量键值时的对比
+注意：本程序不启动任何插件，仅对总线的存取接口计时
+"""
+import time
+
+from core.library.Enums import EventBusItemType
+from core.library.EventBusBase import EventBus
+
+
+class _LinearEventBus(object):
+    """
+    旧版线性扫描总线，仅用于对比
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def register(self, item, key, item_type):
+        self.items.append({
+            'data': item,
+            'key': key,
+            'type': item_type
+        })
+
+    def put(self, key, data):
+        for item in self.items:
+            if item['key'] == key:
+                item['data'] = data
+
+    def get(self, key):
+        for item in self.items:
+            if item['key'] == key:
+                return item
+        return None
+
+
+class EventBusMeasure(object):
+    """
+    总线吞吐测试程序类
+    """
+
+    def __init__(self, key_num=128, loop=200000):
+        """
+        :param key_num: 注册的键值数量
+        :param loop: 每项测试的存取次数
+        """
+        self.key_num = key_num
+        self.loop = loop
+        self.keys = [f'measure_key_{i}' for i in range(key_num)]
+        self.linear = _LinearEventBus()
+        self.init()
+
+    def init(self):
+        """
+        程序引导
+        """
+        for k in self.keys:
+            EventBus.register(None, k, EventBusItemType.DATA)
+            self.linear.register(None, k, EventBusItemType.DATA)
+
+    def start(self):
+        # 取最后注册的键值，对线性扫描来说是最坏情况
+        key = self.keys[-1]
+        for name, bus in (('hash', EventBus), ('linear', self.linear)):
+            put_rate = self.__measure(lambda: bus.put(key, 1))
+            get_rate = self.__measure(lambda: bus.get(key))
+            print(f'[{name:>6}] keys: {self.key_num}, put: {put_rate / 1e6:.3f} M/s, get: {get_rate / 1e6:.3f} M/s')
+        print(f'version of {key}: {EventBus.get_version(key)}')
+
+    def __measure(self, func):
+        t = time.perf_counter()
+        for _ in range(self.loop):
+            func()
+        return self.loop / (time.perf_counter() - t)
+
+
+if __name__ == "__main__":
+    em = EventBusMeasure(key_num=128)
+    em.start()
@@ -0,0 +1,106 @@
+"""
+雷达抓取与回放工具，在这个程序中提供了雷达数据包的抓取、本机模拟雷达回放，以及驱动最大可持续接收速率的测试。
+用法：
+python -m examples.LidarReplay capture lidar.cap 20    连接真实雷达，录制20s，把所有数据包写入lidar.cap
+python -m examples.LidarReplay serve lidar.cap 2       以2倍速回放lidar.cap，作为本机雷达供主程序连接，不指定文件时发送随机数据包
+python -m examples.LidarReplay measure [lidar.cap]     以不同倍速回放，测试驱动接收、解码、投影的丢包率
+注意：measure在同一进程中运行模拟器与驱动，模拟器的发送也占用GIL，测得的速率偏保守；倍速0为不等待、尽可能快地发送
+"""
+import sys
+import time
+
+import numpy as np
+
+from core.hardware.Driver.LivoxEmulator import LivoxEmulator
+from core.hardware.Driver.LivoxLidarDriver import LivoxLidarDriver
+from core.library.Enums import EventBusItemType
+from core.library.EventBusBase import EventBus
+from core.library.Utils import DepthQueue
+
+
+class LidarReplay(object):
+    """
+    雷达抓取与回放程序类
+    """
+
+    def __init__(self, path=None, ip='127.0.0.1'):
+        """
+        :param path: 抓取文件路径
+        :param ip: 主机IP，回放时同为模拟雷达的IP，为空则自动获取
+        """
+        self.path = path
+        self.ip = ip
+        self.depth_queue = DepthQueue(maxsize=120)
+        self.init()
+
+    def init(self):
+        """
+        程序引导，注册驱动需要的深度队列
+        """
+        EventBus.read_config_file()
+        image = EventBus.get('image')['data']
+        store = EventBus.get('depth_store')
+        self.depth_queue.set(k0=np.array(EventBus.get('camera_intrinsic_matrix')['data']),
+                             c0=np.array(EventBus.get('camera_dist')['data']),
+                             e0=np.array(EventBus.get('lidar_extrinsic')['data']),
+                             size=[image['height'], image['width']], **({} if store is None else store['data']))
+        EventBus.register(self.depth_queue, 'depth_queue', EventBusItemType.DATA)
+
+    def capture(self, seconds=20.):
+        driver = LivoxLidarDriver()
+        driver.capture(self.path)
+        if driver.connect(self.ip) == 0:
+            return
+        driver.start_record()
+        time.sleep(seconds)
+        driver.stop_record()
+        driver.disconnect()
+
+    def serve(self, speed=1.):
+        emulator = LivoxEmulator(self.path, speed=speed, ip=self.ip)
+        emulator.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            emulator.stop()
+
+    def measure(self, speeds=(1, 2, 4, 8, 16, 0), seconds=5.):
+        print(f'{"speed":>6} {"sent":>8} {"received":>8} {"drop":>7} {"rate(pkt/s)":>12}')
+        best = 0.
+        for speed in speeds:
+            emulator = LivoxEmulator(self.path, speed=speed, ip=self.ip)
+            emulator.start()
+            driver = LivoxLidarDriver(show_log=False, duration=126230400, wait_seconds=0.)
+            if driver.connect(self.ip) == 0:
+                emulator.stop()
+                continue
+            store = driver.get_point_store()
+            driver.start_record()
+            time.sleep(1.)
+            sent, received, t = emulator.sent, store.total, time.perf_counter()
+            time.sleep(seconds)
+            sent, received = emulator.sent - sent, (store.total - received) // 96
+            rate = received / (time.perf_counter() - t)
+            # 只断开连接，不保存PCD
+            driver.disconnect()
+            emulator.stop()
+            drop = max(0., 1. - received / max(sent, 1))
+            # 丢包率低于1%视为可持续
+            if drop < 0.01:
+                best = max(best, rate)
+            print(f'{speed or "max":>6} {sent:>8} {received:>8} {drop * 100:>6.2f}% {rate:>12.0f}')
+        print(f'max sustainable rate: {best:.0f} pkt/s, {best * 96 / 1e6:.2f} M points/s')
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'measure'
+    if mode == 'capture':
+        LidarReplay(sys.argv[2], ip='').capture(float(sys.argv[3]) if len(sys.argv) > 3 else 20.)
+    elif mode == 'serve':
+        path = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != '-' else None
+        LidarReplay(path).serve(float(sys.argv[3]) if len(sys.argv) > 3 else 1.)
+    elif mode == 'measure':
+        LidarReplay(sys.argv[2] if len(sys.argv) > 2 else None).measure()
+    else:
+        raise RuntimeError("No available mode is given.")
@@ -0,0 +1,102 @@
+"""
+Livox解码测试，在这个程序中提供了对Mid-70直角坐标数据包解码速度的测试。
+包括：旧版逐点解析、整包向量化解码、整批向量化解码、查表解码（含逐点时间戳）的对比，以及解码结果的一致性检查
+注意：本程序使用随机生成的数据包，不需要连接雷达
+"""
+import struct
+import time
+
+import numpy as np
+
+from core.hardware.Driver.LivoxDecoder import LIVOX_CARTESIAN_PACKET_DTYPE, decode_batch, decode_cartesian, \
+    decode_cartesian_batch
+
+
+def _legacy_decode(data_pc):
+    """
+    旧版逐点解析，仅用于对比
+    """
+    byte_pos = 18
+    buffer, intensities = [], []
+    for i in range(0, 96):
+        x = data_pc[byte_pos:byte_pos + 4]
+        byte_pos += 4
+        y = data_pc[byte_pos:byte_pos + 4]
+        byte_pos += 4
+        z = data_pc[byte_pos:byte_pos + 4]
+        byte_pos += 4
+        intensity = data_pc[byte_pos:byte_pos + 1]
+        byte_pos += 2
+        x = round(float(struct.unpack('<i', x)[0]) / 1000.0, 3)
+        y = round(float(struct.unpack('<i', y)[0]) / 1000.0, 3)
+        z = round(float(struct.unpack('<i', z)[0]) / 1000.0, 3)
+        intensities.append(str(float(int.from_bytes(intensity, byteorder='little'))))
+        buffer.append([x, y, z, 1])
+    return np.float64(buffer)[:, :3], intensities
+
+
+class LivoxDecodeMeasure(object):
+    """
+    Livox解码测试程序类
+    """
+
+    def __init__(self, packet_num=10000, batch=64):
+        """
+        :param packet_num: 测试的数据包数量，Mid-70约每秒1000包
+        :param batch: 整批解码时每批的数据包数量
+        """
+        self.packet_num = packet_num
+        self.batch = batch
+        self.buffer = None
+        self.packets = []
+        self.init()
+
+    def init(self):
+        """
+        程序引导，生成随机数据包
+        """
+        rng = np.random.default_rng(0)
+        packets = np.zeros(self.packet_num, dtype=LIVOX_CARTESIAN_PACKET_DTYPE)
+        packets['header']['version'] = 5
+        packets['header']['data_type'] = 2
+        points = packets['points']
+        points['x'] = rng.integers(0, 30000, points.shape)
+        points['y'] = rng.integers(-10000, 10000, points.shape)
+        points['z'] = rng.integers(-2000, 2000, points.shape)
+        points['reflectivity'] = rng.integers(0, 256, points.shape)
+        self.buffer = packets.tobytes()
+        size = LIVOX_CARTESIAN_PACKET_DTYPE.itemsize
+        self.packets = [self.buffer[i * size:(i + 1) * size] for i in range(self.packet_num)]
+
+    def start(self):
+        xyz, intensities = _legacy_decode(self.packets[0])
+        new_xyz, reflectivity, _ = decode_cartesian(self.packets[0])
+        assert np.allclose(xyz, new_xyz, atol=1e-4)
+        assert intensities == reflectivity.astype(np.float64).astype(str).tolist()
+        points = self.packet_num * 96
+        t = self.__measure(lambda: [_legacy_decode(p) for p in self.packets])
+        print(f'[legacy] {self.packet_num} packets: {t * 1e3:.1f} ms, {points / t / 1e6:.3f} M points/s')
+        t = self.__measure(lambda: [decode_cartesian(p) for p in self.packets])
+        print(f'[packet] {self.packet_num} packets: {t * 1e3:.1f} ms, {points / t / 1e6:.3f} M points/s')
+        size = LIVOX_CARTESIAN_PACKET_DTYPE.itemsize
+        view = memoryview(self.buffer)
+        t = self.__measure(lambda: [decode_cartesian_batch(view[i * size:], min(self.batch, self.packet_num - i))
+                                    for i in range(0, self.packet_num, self.batch)])
+        print(f'[batch ] {self.packet_num} packets: {t * 1e3:.1f} ms, {points / t / 1e6:.3f} M points/s, '
+              f'batch: {self.batch}')
+        # 查表解码，同时重建每个点的时间戳
+        t = self.__measure(lambda: [decode_batch(view[i * size:], min(self.batch, self.packet_num - i), size)
+                                    for i in range(0, self.packet_num, self.batch)])
+        print(f'[table ] {self.packet_num} packets: {t * 1e3:.1f} ms, {points / t / 1e6:.3f} M points/s, '
+              f'batch: {self.batch}')
+
+    @staticmethod
+    def __measure(func):
+        t = time.perf_counter()
+        func()
+        return time.perf_counter() - t
+
+
+if __name__ == "__main__":
+    ldm = LivoxDecodeMeasure(packet_num=10000, batch=64)
+    ldm.start()
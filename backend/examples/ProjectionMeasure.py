@@ -0,0 +1,92 @@
+"""
+投影测试，在这个程序中提供了对雷达点云投影为像素深度速度的测试。
+包括：旧版逐包（96点）4x4外参求深度再调用cv2.projectPoints、整批调用cv2.projectPoints、整批float32投影核的对比，
+以及投影结果的一致性检查与整段积分时间一次生成深度图的耗时
+注意：本程序使用配置文件中的相机参数与雷达外参，以及随机生成的点云，不需要连接雷达
+"""
+import time
+
+import cv2
+import numpy as np
+
+from core.hardware.Driver.Projector import Projector
+from core.library.EventBusBase import EventBus
+
+
+def _legacy_xyz2uvd(xyz, extrinsic, r_vec, t_vec, k, dist, width, height):
+    """
+    旧版逐包投影，仅用于对比
+    """
+    depth = (extrinsic @ (np.concatenate([xyz, np.ones((xyz.shape[0], 1))], axis=1).transpose())).transpose()[:, 2]
+    # 相机后方的点可能投影为nan
+    with np.errstate(invalid='ignore'):
+        point_2d = cv2.projectPoints(xyz, r_vec, t_vec, k, dist)[0].reshape(-1, 2).astype(np.int32)
+    inside = np.logical_and(np.logical_and(point_2d[:, 0] >= 0, point_2d[:, 0] < width),
+                            np.logical_and(point_2d[:, 1] >= 0, point_2d[:, 1] < height))
+    return depth[inside], point_2d[inside]
+
+
+class ProjectionMeasure(object):
+    """
+    投影测试程序类
+    """
+
+    def __init__(self, point_num=100000):
+        """
+        :param point_num: 测试的点数，Mid-70约每秒10万点
+        """
+        self.point_num = point_num
+        self.xyz = None
+        self.init()
+
+    def init(self):
+        """
+        程序引导，读取相机参数，在雷达前方生成随机点云
+        """
+        EventBus.read_config_file()
+        rng = np.random.default_rng(0)
+        n = self.point_num
+        self.xyz = np.stack([rng.uniform(1, 30, n), rng.uniform(-8, 8, n), rng.uniform(-2, 3, n)], axis=1) \
+            .astype(np.float32)
+
+    def start(self):
+        image = EventBus.get('image')['data']
+        width, height = image['width'], image['height']
+        extrinsic = np.array(EventBus.get('lidar_extrinsic')['data'], dtype=np.float64)
+        k = np.array(EventBus.get('camera_intrinsic_matrix')['data'], dtype=np.float64)
+        dist = np.array(EventBus.get('camera_dist')['data'], dtype=np.float64)
+        r_vec, t_vec = cv2.Rodrigues(extrinsic[:3, :3])[0], extrinsic[:3, 3]
+        rotation, translation = extrinsic[:3, :3].T.astype(np.float32), extrinsic[:3, 3].astype(np.float32)
+        projector = Projector(k, dist, [height, width])
+        xyz = self.xyz.astype(np.float64)
+
+        t = self.__measure(lambda: [_legacy_xyz2uvd(xyz[i:i + 96], extrinsic, r_vec, t_vec, k, dist, width, height)
+                                    for i in range(0, len(xyz), 96)])
+        print(f'[legacy] {self.point_num} points: {t * 1e3:.1f} ms, {self.point_num / t / 1e6:.3f} M points/s')
+        t = self.__measure(lambda: _legacy_xyz2uvd(xyz, extrinsic, r_vec, t_vec, k, dist, width, height))
+        print(f'[cv2   ] {self.point_num} points: {t * 1e3:.1f} ms, {self.point_num / t / 1e6:.3f} M points/s')
+        t = self.__measure(lambda: projector.project(self.xyz @ rotation + translation))
+        print(f'[kernel] {self.point_num} points: {t * 1e3:.1f} ms, {self.point_num / t / 1e6:.3f} M points/s')
+        t = self.__measure(lambda: projector.render(self.xyz @ rotation + translation))
+        print(f'[render] {self.point_num} points: {t * 1e3:.1f} ms, {self.point_num / t / 1e6:.3f} M points/s')
+
+        # 一致性检查：相机前方的点，float32与float64的取整差异不超过1像素
+        camera = self.xyz @ rotation + translation
+        front = camera[:, 2] > 0
+        depth, point_2d = _legacy_xyz2uvd(xyz[front], extrinsic, r_vec, t_vec, k, dist, width, height)
+        new_depth, new_point_2d = projector.project(camera[front])
+        print(f'points in image: legacy {len(depth)}, kernel {len(new_depth)}')
+        if len(depth) == len(new_depth):
+            print(f'max pixel error: {np.abs(point_2d - new_point_2d).max()}, '
+                  f'max depth error: {np.abs(depth - new_depth).max():.6f} m')
+
+    @staticmethod
+    def __measure(func):
+        t = time.perf_counter()
+        func()
+        return time.perf_counter() - t
+
+
+if __name__ == "__main__":
+    pm = ProjectionMeasure(point_num=100000)
+    pm.start()
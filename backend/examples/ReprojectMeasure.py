@@ -9,7 +9,7 @@ from core.hardware.Lidar.LidarPlugin import LidarPlugin
 from core.library.EasyImportBase import ROOT
 from core.library.Enums import EventBusItemType
 from core.library.EventBusBase import EventBus
-from core.library.Utils import is_none, regen_list_from_keys, pnp, pnp2pose
+from core.library.Utils import regen_list_from_keys, pnp, pnp2pose
 
 
 class ReprojectMeasure(object):
@@ -55,9 +55,10 @@ class ReprojectMeasure(object):
             'y': 0
         }
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(iw, ih))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(iw, ih))
                 x, y = params['x'], params['y']
                 img = cv2.circle(img, (x, y), color=(0, 0, 255), radius=5, thickness=-1)
                 x *= rw
@@ -101,9 +102,10 @@ class ReprojectMeasure(object):
             'time': 0
         }
         while True:
-            img = EventBus.get('camera_view')['data']
-            if not is_none(img):
-                img = cv2.resize(img, dsize=(1200, 600))
+            frame = EventBus.acquire_frame('camera_view')
+            if frame is not None:
+                with frame:
+                    img = cv2.resize(frame.data, dsize=(1200, 600))
                 img = cv2.polylines(img, np.array([regen_list_from_keys(params, [f'p{i + 1}' for i in range(4)])]),
                                     True, thickness=2, color=(0, 0, 255))
                 cv2.imshow("camera_view", img)
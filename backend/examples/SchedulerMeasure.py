@@ -0,0 +1,112 @@
+"""
+插件调度器降级测试，在这个程序中检查调度器只在资源不足时降级。
+包括：事件驱动的高优先级插件输入不足（检测帧率低于目标频率、输入中断）时不降级，
+以及同一插件的单次循环耗时超过目标频率允许的时间时逐级降级
+注意：本程序不需要连接雷达与相机，用一个线程模拟检测结果的发布
+"""
+import threading
+import time
+
+from core.library.Enums import EventBusItemType
+from core.library.EventBusBase import EventBus
+from core.library.PluginManager import PluginManager
+
+
+class _Plugin(object):
+    def __init__(self, plugin_name, priority):
+        self.plugin_name = plugin_name
+        self.priority = priority
+
+
+class SchedulerMeasure(object):
+    """
+    调度器降级测试程序类
+    """
+
+    def __init__(self, rate=30, duration=3.):
+        """
+        :param rate: 高优先级插件的目标频率(Hz)
+        :param duration: 每个场景的运行时间(s)
+        """
+        self.rate = rate
+        self.duration = duration
+        self.scheduler = PluginManager.get_scheduler()
+        self.init()
+
+    def init(self):
+        EventBus.register(None, 'armor_stamp', EventBusItemType.DATA)
+        self.scheduler.set([_Plugin('reproject', 3), _Plugin('websocket', 0)], {
+            'plugins': {
+                'reproject': {'rate': self.rate},
+                'websocket': {'rate': 20, 'min_rate': 2}
+            },
+            'shed_ratio': 0.8,
+            'max_shed_level': 3
+        })
+
+    def start(self):
+        # 检测帧率10fps，低于反投影的目标频率，中途输入中断1s
+        level = self.run(input_rate=10, work=0.002, pause=1.)
+        print(f'starved event-driven plugin: max shed level {level}')
+        assert level == 0, 'Input starved plugin should not raise the shed level.'
+        # 输入充足，但单次循环耗时超过目标频率允许的时间
+        level = self.run(input_rate=self.rate, work=1.5 / self.rate, pause=0.)
+        print(f'overloaded plugin: max shed level {level}')
+        assert level > 0, 'Overloaded plugin should raise the shed level.'
+
+    def run(self, input_rate, work, pause):
+        """
+        运行一个场景 \n
+        :param input_rate: 检测结果的发布频率(Hz)
+        :param work: 反投影单次处理的CPU耗时(s)
+        :param pause: 中途输入中断的时间(s)
+        :return: 运行期间的最大降级级别
+        """
+        stop = threading.Event()
+        threads = [threading.Thread(target=self.__publish_thread, args=(stop, input_rate, pause)),
+                   threading.Thread(target=self.__reproject_thread, args=(stop, work)),
+                   threading.Thread(target=self.__websocket_thread, args=(stop,))]
+        for thread in threads:
+            thread.start()
+        level, end = 0, time.perf_counter() + self.duration
+        while time.perf_counter() < end:
+            level = max(level, self.scheduler.shed_level())
+            time.sleep(0.05)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return level
+
+    @staticmethod
+    def __publish_thread(stop, input_rate, pause):
+        frame_id, start = 0, time.perf_counter()
+        while not stop.is_set():
+            if pause and 1. < time.perf_counter() - start < 1. + pause:
+                time.sleep(0.01)
+                continue
+            EventBus.put('armor_stamp', (frame_id, time.time()))
+            frame_id += 1
+            time.sleep(1. / input_rate)
+
+    @staticmethod
+    def __reproject_thread(stop, work):
+        subscriber = EventBus.subscribe('armor_stamp')
+        while not stop.is_set():
+            if subscriber.wait(timeout=0.5) is None:
+                continue
+            end = time.thread_time() + work
+            while time.thread_time() < end:
+                pass
+            PluginManager.tick('reproject')
+
+    @staticmethod
+    def __websocket_thread(stop):
+        token = PluginManager.register_loop('websocket')
+        while not stop.is_set():
+            PluginManager.tick('websocket', token=token)
+        PluginManager.unregister_loop(token)
+
+
+if __name__ == "__main__":
+    sm = SchedulerMeasure()
+    sm.start()
@@ -0,0 +1,51 @@
+"""
+帧追踪导出工具，读取各进程保存的追踪记录，打印从采集到小地图推送（glass-to-BEV）的延迟构成与分位数。
+用法：python -m examples.TraceDump [trace.npz trace.yolo.npz ...]，不指定文件时读取logs目录下的trace*.npz
+注意：各阶段的时间戳为系统时间，多进程的记录可以直接合并
+"""
+import glob
+import sys
+
+from core.library.Tracer import Tracer
+
+# 流水线顺序，未列出的阶段排在最后
+PIPELINE = ['camera', 'yolo.stage1', 'yolo.stage1.pre', 'yolo.stage1.infer', 'yolo.stage1.nms',
+            'yolo.stage2', 'yolo.stage2.pre', 'yolo.stage2.infer', 'yolo.stage2.nms',
+            'sync', 'reproject', 'depth', 'bev_draw', 'websocket']
+
+
+class TraceDump(object):
+    """
+    帧追踪导出程序类
+    """
+
+    def __init__(self, paths, percentiles=(50, 90, 99)):
+        """
+        :param paths: 追踪记录文件
+        :param percentiles: 统计的分位数
+        """
+        self.paths = paths
+        self.percentiles = percentiles
+
+    def start(self):
+        records, stages = Tracer.load(*self.paths)
+        print(f'files: {self.paths}, records: {len(records)}, frames: {len(set(records["frame_id"].tolist()))}')
+        stats = Tracer.breakdown(records, stages, origin='camera', percentiles=self.percentiles)
+        order = [s for s in PIPELINE if s in stats] + sorted(s for s in stats if s not in PIPELINE)
+        head = ' '.join(f'p{p:<6}' for p in self.percentiles)
+        print(f'{"stage":<20} {"count":>7}   duration(ms) {head}   latency(ms) {head}')
+        for name in order:
+            s = stats[name]
+            duration = ' '.join(f'{s["duration"][p]:<7.2f}' for p in self.percentiles)
+            latency = ' '.join(f'{s["latency"][p]:<7.2f}' if s['latency'] else f'{"-":<7}' for p in self.percentiles)
+            print(f'{name:<20} {s["count"]:>7}   {"":12} {duration}   {"":11} {latency}')
+        # 最后一个阶段的延迟即为端到端延迟
+        end = next((s for s in reversed(PIPELINE) if s in stats and stats[s]['latency']), None)
+        if end is not None:
+            total = ', '.join(f'p{p}: {stats[end]["latency"][p]:.2f}ms' for p in self.percentiles)
+            print(f'glass-to-{end}: {total}')
+
+
+if __name__ == "__main__":
+    td = TraceDump(sys.argv[1:] or sorted(glob.glob('logs/trace*.npz')))
+    td.start()
@@ -13,11 +13,15 @@ if __name__ == "__main__":
     BEVHandler.init()
     EventBus.install_plugin([LidarPlugin, AlertPlugin, CameraPlugin, YoloPlugin, WebsocketPlugin, ReprojectPlugin])
     CameraPlugin.register(CameraPlugin.camera_view, 'camera_view', EventBusItemType.DATA)
+    CameraPlugin.register(CameraPlugin.camera_ring, 'camera_ring', EventBusItemType.DATA)
     YoloPlugin.register(YoloPlugin.annotator_result, 'annotator_result', EventBusItemType.DATA)
+    YoloPlugin.register(YoloPlugin.annotator_clip, 'annotator_clip', EventBusItemType.DATA)
     YoloPlugin.register(YoloPlugin.armor_car_index, 'armor_car_index', EventBusItemType.DATA)
     YoloPlugin.register(YoloPlugin.armor_bbox, 'armor_bbox', EventBusItemType.DATA)
+    YoloPlugin.register(YoloPlugin.armor_stamp, 'armor_stamp', EventBusItemType.DATA)
     AlertPlugin.register(AlertPlugin.alert_msg, 'alert_msg', EventBusItemType.DATA)
     LidarPlugin.register(LidarPlugin.depth_queue, 'depth_queue', EventBusItemType.DATA)
+    LidarPlugin.register(LidarPlugin.lidar_sync, 'lidar_sync', EventBusItemType.DATA)
     ReprojectPlugin.register(ReprojectPlugin.cam2world, 'cam2world', EventBusItemType.DATA)
     ReprojectPlugin.register(ReprojectPlugin.cam_in_world, 'cam_in_world', EventBusItemType.DATA)
     ReprojectPlugin.register(ReprojectPlugin.bev_points, 'bev_points', EventBusItemType.DATA)
@@ -4,18 +4,19 @@ import time
 from core.library.PluginBase import PluginBase
 from core.library.Utils import Singleton
 from core.utils.logger import Logger
-from radar_websocket.views import VideoStreamView, DataView, ReprojectView, LogView, CalibrateView, CalibrationDataView
+from radar_websocket.views import VideoStreamView, DataView, ReprojectView, LogView, CalibrateView, CalibrationDataView, \
+    MonitorView
 
 
 class WebsocketPlugin(PluginBase, Singleton):
     plugin_name = 'websocket'
+    priority = 0
     # Register Start
     label_points = []
     # Register End
 
     def __init__(self):
         super().__init__()
-        self.priority = 1
 
     @classmethod
     def start(cls):
@@ -36,12 +37,14 @@ class WebsocketPlugin(PluginBase, Singleton):
         t3 = threading.Thread(target=cls.t4, daemon=False)
         t4 = threading.Thread(target=cls.t5, daemon=False)
         t5 = threading.Thread(target=cls.t6, daemon=False)
+        t6 = threading.Thread(target=cls.t7, daemon=False)
         t.start()
         t1.start()
         t2.start()
         t3.start()
         t4.start()
         t5.start()
+        t6.start()
 
     @staticmethod
     def t1():
@@ -65,4 +68,8 @@ class WebsocketPlugin(PluginBase, Singleton):
 
     @staticmethod
     def t6():
-        view6 = CalibrationDataView()
\ No newline at end of file
+        view6 = CalibrationDataView()
+
+    @staticmethod
+    def t7():
+        view7 = MonitorView()
\ No newline at end of file
@@ -8,7 +8,9 @@ import numpy as np
 
 from core.library.EasyImportBase import ROOT
 from core.library.EventBusBase import EventBus
+from core.library.PluginManager import PluginManager
 from core.library.RadarWebsocketBase import RadarWebsocketViewBase
+from core.library.Tracer import Tracer
 from core.library.Utils import pnp, pnp2pose, numpy2list_in_dict, is_none
 from core.utils.logger import Logger
 
@@ -20,15 +22,25 @@ class VideoStreamView(RadarWebsocketViewBase):
         super().__init__()
 
     async def enter(self, websocket):
-        while True:
-            result, img_encode = cv2.imencode('.jpg', EventBus.get('annotator_result')['data'])
-            data = np.array(img_encode)
-            img = data.tobytes()
-            img = base64.b64encode(img).decode()
-            ws_buffer = {
-                'img': "data:image/jpeg;base64," + img
-            }
-            await websocket.send(json.dumps(ws_buffer))
+        # 每个连接各自计算推流频率，同一事件循环线程中的连接互不影响
+        token = PluginManager.register_loop('websocket')
+        try:
+            while True:
+                frame = EventBus.acquire_frame('annotator_result')
+                if frame is not None:
+                    with frame:
+                        result, img_encode = cv2.imencode('.jpg', frame.data)
+                    data = np.array(img_encode)
+                    img = data.tobytes()
+                    img = base64.b64encode(img).decode()
+                    ws_buffer = {
+                        'img': "data:image/jpeg;base64," + img
+                    }
+                    await websocket.send(json.dumps(ws_buffer))
+                # 视频推流优先级最低，资源不足时由调度器降低帧率
+                await asyncio.sleep(PluginManager.tick('websocket', sleep=False, token=token))
+        finally:
+            PluginManager.unregister_loop(token)
 
 
 class DataView(RadarWebsocketViewBase):
@@ -50,38 +62,43 @@ class ReprojectView(RadarWebsocketViewBase):
         super().__init__()
 
     async def enter(self, websocket):
-        pass
+        subscriber = EventBus.subscribe('bev_points', version=-1)
+        loop = asyncio.get_event_loop()
         while True:
-            if is_none(EventBus.get('bev_points')['data']):
+            # 在线程池中阻塞等待，不占用事件循环
+            item = await loop.run_in_executor(None, subscriber.wait, 1)
+            if item is None or is_none(item['data']):
                 continue
+            start = time.time_ns()
             ws_buffer = {
-                'data': numpy2list_in_dict(EventBus.get('bev_points')['data'])
+                'data': numpy2list_in_dict(item['data'])
             }
             if websocket.ws_server.is_serving():
                 await websocket.send(json.dumps(ws_buffer))
-            time.sleep(0.2)
+                Tracer.record('websocket', start, time.time_ns(), Tracer.frame_of('bev_points', item['version']))
+            await asyncio.sleep(0.2)
 
 
 class LogView(RadarWebsocketViewBase):
     def __init__(self):
         self.port = 1003
-        self.__index = 0
         super().__init__()
 
     async def enter(self, websocket):
+        # 每个连接持有自己的游标，从最早保留的日志开始推送
+        cursor = 0
         while True:
-            if len(Logger.output_logs()) > self.__index:
-                time.sleep(0.1)
-                try:
+            logs, cursor = Logger.read(cursor)
+            if not logs:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                for log in logs:
                     if websocket.ws_server.is_serving():
-                        await websocket.send(Logger.output_logs()[self.__index])
-                except Exception as e:
-                    Logger.danger(f'Websocket has been closed.ERROR: {e}')
-                    break
-                await asyncio.sleep(0)
-                self.__index += 1
-            else:
-                time.sleep(0.1)
+                        await websocket.send(log)
+            except Exception as e:
+                Logger.danger(f'Websocket has been closed.ERROR: {e}')
+                break
 
 
 class CalibrateView(RadarWebsocketViewBase):
@@ -108,15 +125,23 @@ class CalibrateView(RadarWebsocketViewBase):
             pass
 
     async def calibrate_camera_env(self, ws):
-        while self.__terminate_process:
-            result, img_encode = cv2.imencode('.jpg', EventBus.get('camera_view')['data'])
-            data = np.array(img_encode)
-            img = data.tobytes()
-            img = base64.b64encode(img).decode()
-            ws_buffer = {
-                'img': "data:image/jpeg;base64," + img
-            }
-            await ws.send(json.dumps(ws_buffer))
+        token = PluginManager.register_loop('websocket')
+        try:
+            while self.__terminate_process:
+                frame = EventBus.acquire_frame('camera_view')
+                if frame is not None:
+                    with frame:
+                        result, img_encode = cv2.imencode('.jpg', frame.data)
+                    data = np.array(img_encode)
+                    img = data.tobytes()
+                    img = base64.b64encode(img).decode()
+                    ws_buffer = {
+                        'img': "data:image/jpeg;base64," + img
+                    }
+                    await ws.send(json.dumps(ws_buffer))
+                await asyncio.sleep(PluginManager.tick('websocket', sleep=False, token=token))
+        finally:
+            PluginManager.unregister_loop(token)
 
 
 class CalibrationDataView(RadarWebsocketViewBase):
@@ -150,3 +175,23 @@ class CalibrationDataView(RadarWebsocketViewBase):
             EventBus.put('cam2world', t)
             EventBus.put('cam_in_world', cp)
             self.__terminate = True
+
+
+class MonitorView(RadarWebsocketViewBase):
+    def __init__(self):
+        self.port = 1006
+        super().__init__()
+
+    async def enter(self, websocket):
+        subscriber = EventBus.subscribe('plugin_monitor', version=-1)
+        loop = asyncio.get_event_loop()
+        while True:
+            item = await loop.run_in_executor(None, subscriber.wait, 1)
+            if item is None or item['data'] is None:
+                continue
+            try:
+                if websocket.ws_server.is_serving():
+                    await websocket.send(json.dumps(item['data']))
+            except Exception as e:
+                Logger.danger(f'Websocket has been closed.ERROR: {e}')
+                break